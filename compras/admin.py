@@ -6,8 +6,13 @@ from django.urls import path, reverse
 from django.middleware.csrf import get_token
 from django.shortcuts import redirect
 from django.http import HttpResponseRedirect
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from .models import Compra, Proveedor, CompraProducto, PagoCompra
 from inventario.models import Producto, ProductoNoReconocido
+from inventario.buscador_productos import SCRIPT_BUSCADOR_PRODUCTOS, render_selector_producto
+from inventario.utils import sugerir_productos
+from utils.admin_filters import EstadoPagoFilter
 from .views_pnr import asignar_pnr_view, crear_producto_pnr_view
 
 # Mostrar productos relacionados dentro del proveedor en el admin
@@ -60,7 +65,7 @@ class PagoCompraInline(admin.TabularInline):
 # Personalización del admin de Compra
 class CompraAdmin(admin.ModelAdmin):
     list_display = ("folio", "proveedor", "fecha", "total", "total_pagado_display", "saldo_pendiente_display", "estado_pago_display", "pagado", "fecha_pago_display", "estado_detallado")
-    list_filter = ("requiere_revision_manual", "estado_revision", "pagado", "proveedor")
+    list_filter = (EstadoPagoFilter, "requiere_revision_manual", "estado_revision", "pagado", "proveedor")
     search_fields = ("folio", "uuid", "proveedor__nombre")
     readonly_fields = ("resumen_revision", "info_pagos_display")
     actions = ["marcar_revisado_ok", "marcar_revisado_con_cambios"]
@@ -75,9 +80,26 @@ class CompraAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        """Saldos, líneas con flags, PNR pendientes y último pago anotados en SQL (sin consultas por fila)."""
+        qs = super().get_queryset(request).select_related("proveedor")
+        lineas_con_flags = (
+            CompraProducto.objects.filter(compra=OuterRef("pk"), requiere_revision_manual=True)
+            .order_by().values("compra").annotate(n=Count("id")).values("n")
+        )
+        ultimo_pago = PagoCompra.objects.filter(compra=OuterRef("pk")).order_by("-fecha_pago").values("fecha_pago")[:1]
+        return qs.with_saldos().annotate(
+            lineas_con_flags=Coalesce(Subquery(lineas_con_flags, output_field=IntegerField()), Value(0)),
+            pnr_pendientes=ProductoNoReconocido.pendientes_por_factura(campo_uuid="uuid"),
+            fecha_ultimo_pago=Subquery(ultimo_pago),
+        )
+
     def estado_detallado(self, obj):
         """Muestra estado resumido con conteo de líneas con flags."""
-        lineas_con_flags = obj.productos.filter(requiere_revision_manual=True).count()
+        if hasattr(obj, "lineas_con_flags"):  # anotado en get_queryset
+            lineas_con_flags = obj.lineas_con_flags
+        else:
+            lineas_con_flags = obj.productos.filter(requiere_revision_manual=True).count()
         
         if obj.requiere_revision_manual:
             if obj.estado_revision == "pendiente":
@@ -99,9 +121,13 @@ class CompraAdmin(admin.ModelAdmin):
         if obj.fecha_pago:
             return obj.fecha_pago.strftime('%Y-%m-%d')
         # Si no tiene fecha_pago pero tiene pagos, mostrar la fecha del último pago
-        ultimo_pago = obj.pagos.order_by('-fecha_pago').first()
-        if ultimo_pago:
-            return ultimo_pago.fecha_pago.strftime('%Y-%m-%d')
+        if hasattr(obj, "fecha_ultimo_pago"):  # anotado en get_queryset
+            fecha_ultimo_pago = obj.fecha_ultimo_pago
+        else:
+            ultimo_pago = obj.pagos.order_by('-fecha_pago').first()
+            fecha_ultimo_pago = ultimo_pago.fecha_pago if ultimo_pago else None
+        if fecha_ultimo_pago:
+            return fecha_ultimo_pago.strftime('%Y-%m-%d')
         return '-'
     fecha_pago_display.short_description = "Fecha de pago"
     
@@ -115,7 +141,7 @@ class CompraAdmin(admin.ModelAdmin):
             return format_html('<span style="color: #e74c3c;">{}</span>', total_str)
         return format_html('<span style="color: #95a5a6;">$0.00</span>')
     total_pagado_display.short_description = "Pagado"
-    total_pagado_display.admin_order_field = "total"
+    total_pagado_display.admin_order_field = "total_pagado"
     
     def saldo_pendiente_display(self, obj):
         """Muestra saldo pendiente por pagar."""
@@ -125,6 +151,7 @@ class CompraAdmin(admin.ModelAdmin):
             return format_html('<span style="color: #27ae60;">{}</span>', saldo_str)
         return format_html('<span style="color: #95a5a6;">$0.00</span>')
     saldo_pendiente_display.short_description = "Por Pagar"
+    saldo_pendiente_display.admin_order_field = "saldo_pendiente"
     
     def estado_pago_display(self, obj):
         """Muestra estado de pago sin fondo de color (solo emoji y texto)."""
@@ -206,102 +233,20 @@ class CompraAdmin(admin.ModelAdmin):
     
     def procesar_drive_view(self, request):
         """
-        Vista custom para procesar facturas pendientes desde Google Drive.
+        Encola el procesamiento de facturas pendientes en Google Drive y redirige a
+        la página de progreso. El lote lo ejecuta el worker
+        (`python manage.py procesar_tareas`), fuera del request.
         No requiere selección de items.
         """
-        try:
-            from compras.utils.drive_processor import DriveInvoiceProcessor
-            
-            # Mostrar mensaje de inicio
-            self.message_user(
-                request,
-                "🔄 Iniciando procesamiento de facturas desde Google Drive...",
-                level=messages.INFO
-            )
-            
-            # Crear procesador
-            processor = DriveInvoiceProcessor(validation_mode="lenient")
-            
-            # Procesar todas las facturas
-            resultado = processor.process_all_invoices(move_files=True)
-            
-            # Preparar mensaje de resumen
-            total = resultado["total"]
-            success = resultado["success"]
-            duplicate = resultado["duplicate"]
-            error = resultado["error"]
-            
-            if total == 0:
-                self.message_user(
-                    request,
-                    "⚠️ No se encontraron facturas pendientes en Google Drive.",
-                    level=messages.WARNING
-                )
-            else:
-                # Mensaje principal de éxito
-                if error == 0:
-                    nivel = messages.SUCCESS
-                    icono = "✅"
-                elif success > 0:
-                    nivel = messages.WARNING
-                    icono = "⚠️"
-                else:
-                    nivel = messages.ERROR
-                    icono = "❌"
-                
-                mensaje_principal = (
-                    f"{icono} Procesamiento completado: "
-                    f"{success} registradas, "
-                    f"{duplicate} duplicadas, "
-                    f"{error} errores "
-                    f"(de {total} archivos)"
-                )
-                self.message_user(request, mensaje_principal, level=nivel)
-                
-                # Mensajes detallados de errores
-                if error > 0:
-                    detalles_error = [
-                        d for d in resultado["details"] 
-                        if d["status"] == "error"
-                    ]
-                    for detalle in detalles_error[:5]:  # Mostrar max 5 errores
-                        error_msg = f"❌ Error en {detalle['file']}: {detalle['error'][:100]}"
-                        self.message_user(request, error_msg, level=messages.ERROR)
-                    
-                    if error > 5:
-                        self.message_user(
-                            request,
-                            f"⚠️ ... y {error - 5} errores más. Revisa la carpeta 'Compras_Errores' en Drive.",
-                            level=messages.WARNING
-                        )
-                
-                # Mensaje informativo de duplicadas
-                if duplicate > 0:
-                    self.message_user(
-                        request,
-                        f"ℹ️ {duplicate} factura(s) ya existían en la base de datos (omitidas).",
-                        level=messages.INFO
-                    )
-                    
-        except ImportError as e:
-            self.message_user(
-                request,
-                f"❌ Error: No se pudo importar el módulo drive_processor. {str(e)}",
-                level=messages.ERROR
-            )
-        except Exception as e:
-            import traceback
-            error_trace = traceback.format_exc()
-            self.message_user(
-                request,
-                f"❌ Error inesperado al procesar facturas: {str(e)}",
-                level=messages.ERROR
-            )
-            # Log detallado en consola para debugging
-            print(f"\n{'='*80}\nERROR EN PROCESAR_DRIVE_VIEW:\n{error_trace}\n{'='*80}\n")
-        
-        # Redirigir de vuelta a la lista de compras
-        return HttpResponseRedirect(reverse('admin:compras_compra_changelist'))
+        from inventario.tareas import encolar_tarea
+
+        tarea = encolar_tarea("drive_compras", usuario=request.user, validation_mode="lenient")
+        self.message_user(
+            request,
+            "🔄 Procesamiento de facturas desde Google Drive encolado.",
+            level=messages.INFO
+        )
+        return redirect('admin:inventario_tareasegundoplano_progreso', tarea.pk)
     
     def resumen_revision(self, obj):
         """Widget de resumen de revisión en el detalle de la compra."""
@@ -330,16 +275,22 @@ class CompraAdmin(admin.ModelAdmin):
         if not request:
             return format_html('<p style="color: #c0392b;">Error: No se pudo obtener el request para generar el widget.</p>')
         
-        # Contar líneas con flags y recolectar motivos
-        lineas_con_flags = obj.productos.filter(requiere_revision_manual=True)
-        num_lineas_flags = lineas_con_flags.count()
+        # Líneas con flags (los conteos vienen anotados desde get_queryset)
+        lineas_con_flags = list(
+            obj.productos.filter(requiere_revision_manual=True).select_related("producto")[:10]
+        )
+        num_lineas_flags = getattr(obj, "lineas_con_flags", None)
+        if num_lineas_flags is None:
+            num_lineas_flags = obj.productos.filter(requiere_revision_manual=True).count()
         
-        # Contar PNR asociados por UUID
+        # PNR asociados por UUID
         pnr_pendientes = ProductoNoReconocido.objects.filter(
             uuid_factura=obj.uuid,
             procesado=False
         )
-        num_pnr = pnr_pendientes.count()
+        num_pnr = getattr(obj, "pnr_pendientes", None)
+        if num_pnr is None:
+            num_pnr = pnr_pendientes.count()
         
         # Construir HTML del resumen
         estado_class = "error" if (num_lineas_flags > 0 or num_pnr > 0) else "success"
@@ -355,7 +306,7 @@ class CompraAdmin(admin.ModelAdmin):
         if num_lineas_flags > 0:
             html_parts.append(f'<p style="margin: 8px 0;"><strong>⚠️ Líneas con flags:</strong> {num_lineas_flags}</p>')
             html_parts.append('<ul style="margin: 5px 0; padding-left: 20px;">')
-            for linea in lineas_con_flags[:10]:  # Limitar a 10 para no saturar
+            for linea in lineas_con_flags:  # Limitado a 10 para no saturar
                 motivos_raw = linea.motivo_revision or "sin motivo especificado"
                 # Formatear el motivo para mejor legibilidad
                 if motivos_raw == "toda_factura_requiere_revision_por_contener_licor_ieps_30pct_o_53pct":
@@ -373,9 +324,6 @@ class CompraAdmin(admin.ModelAdmin):
         if num_pnr > 0:
             html_parts.append(f'<p style="margin: 8px 0; margin-top: 15px;"><strong>⚠️ Productos no reconocidos sin procesar:</strong> {num_pnr}</p>')
             
-            # Cargar productos para dropdowns (limitado para performance)
-            productos_disponibles = list(Producto.objects.all().order_by("nombre")[:500])
-            
             for idx, pnr in enumerate(pnr_pendientes[:10], 1):
                 cantidad = pnr.cantidad or 0
                 precio_u = pnr.precio_unitario or 0
@@ -398,16 +346,15 @@ class CompraAdmin(admin.ModelAdmin):
                 html_parts.append(
                     f'<div style="flex: 1; min-width: 250px;">'
                     f'<label style="display: block; font-size: 0.85em; font-weight: bold; margin-bottom: 4px; color: #555;">Asignar a producto existente:</label>'
-                    f'<select id="producto_id_{pnr_id_val}" required style="width: 100%; padding: 6px; font-size: 0.85em; margin-bottom: 6px; border: 1px solid #ccc; border-radius: 3px;">'
-                    f'<option value="">-- Selecciona producto --</option>'
                 )
                 
-                for prod in productos_disponibles:
-                    html_parts.append(f'<option value="{prod.id}">{prod.nombre}</option>')
+                # Sugerencias por similitud con el nombre detectado (índice de catálogo);
+                # el resto del catálogo se busca bajo demanda (api_buscar_productos)
+                sugeridos = sugerir_productos(pnr.nombre_detectado, limite=5)
+                html_parts.append(render_selector_producto(pnr, sugeridos))
                 
                 # Usar atributos data- para evitar problemas de escapado en onclick
                 html_parts.append(
-                    f'</select>'
                     f'<label style="font-size: 0.8em; display: block; margin: 6px 0; color: #666;">'
                     f'<input type="checkbox" id="crear_alias_{pnr_id_val}" checked style="margin-right: 4px;" /> Crear alias automáticamente'
                     f'</label>'
@@ -615,6 +562,7 @@ class CompraAdmin(admin.ModelAdmin):
             )
         
         # Agregar JavaScript para manejar el submit de PNR sin forms anidados
+        html_parts.append(SCRIPT_BUSCADOR_PRODUCTOS)
         html_parts.append(
             "<script>"
             "function asignarPNR(btn) {"
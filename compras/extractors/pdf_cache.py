@@ -0,0 +1,170 @@
+# compras/extractors/pdf_cache.py
+"""
+Caché en disco de extracción de texto de PDFs.
+
+La llave es el SHA-256 de los bytes del PDF + el motor de extracción y su versión
+(PyMuPDF, pdfminer), así que reprocesar la misma factura (reintentos, scripts de
+reproceso, Drive) no vuelve a parsear el PDF. Cada entrada guarda el texto y sus
+líneas por página. El tamaño total está acotado y se desalojan primero las entradas usadas
+hace más tiempo (LRU por mtime, que se refresca en cada acierto).
+
+Configuración por variables de entorno:
+    PDF_CACHE_ENABLED   "0" para desactivarla (default "1")
+    PDF_CACHE_DIR       carpeta de la caché (default <tmp>/novavino_pdf_cache)
+    PDF_CACHE_MAX_MB    tamaño máximo en MB (default 200)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Callable, Dict, List, Optional, Union
+
+# Subir si cambia el formato de las entradas
+CACHE_SCHEMA = 2
+
+_lock = threading.Lock()
+
+
+def cache_enabled() -> bool:
+    return os.getenv("PDF_CACHE_ENABLED", "1") not in ("0", "false", "False")
+
+
+def cache_dir() -> str:
+    return os.getenv("PDF_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "novavino_pdf_cache")
+
+
+def cache_max_bytes() -> int:
+    try:
+        return int(float(os.getenv("PDF_CACHE_MAX_MB", "200")) * 1024 * 1024)
+    except ValueError:
+        return 200 * 1024 * 1024
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _entry_path(digest: str, motor: str, version: str) -> str:
+    safe_version = "".join(c if c.isalnum() or c in ".-_" else "_" for c in str(version))
+    return os.path.join(cache_dir(), f"{digest}-{motor}-{safe_version}-s{CACHE_SCHEMA}.json")
+
+
+def get_entry(digest: str, motor: str, version: str) -> Optional[Dict]:
+    """Devuelve {"texto", "lineas"} si está en caché (y refresca su uso), o None.
+    "lineas" es una lista de líneas por página."""
+    if not cache_enabled():
+        return None
+    path = _entry_path(digest, motor, version)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(path, None)  # marca de uso reciente para el LRU
+        return entry
+    except (OSError, ValueError):
+        return None
+
+
+def _build_entry(paginas: List[str], separador: str) -> Dict:
+    return {"texto": separador.join(paginas), "lineas": [p.splitlines() for p in paginas]}
+
+
+def put_entry(digest: str, motor: str, version: str, entry: Dict) -> None:
+    """Guarda la entrada de forma atómica y aplica el límite de tamaño."""
+    if not cache_enabled():
+        return
+    folder = cache_dir()
+    tmp_path = None
+    try:
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, _entry_path(digest, motor, version))
+    except OSError:
+        # la caché nunca debe romper la extracción
+        if tmp_path:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        return
+    _evict_if_needed()
+
+
+def _evict_if_needed() -> None:
+    limite = cache_max_bytes()
+    folder = cache_dir()
+    with _lock:
+        try:
+            entradas = []
+            total = 0
+            for name in os.listdir(folder):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(folder, name)
+                st = os.stat(path)
+                entradas.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        except OSError:
+            return
+        if total <= limite:
+            return
+        for _, size, path in sorted(entradas):  # más antiguas primero
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= limite:
+                break
+
+
+def cached_text(
+    data: Union[bytes, str],
+    motor: str,
+    version: str,
+    extraer: Callable[[Union[bytes, str]], List[str]],
+    separador: str = "\n",
+    digest: Optional[str] = None,
+) -> Dict:
+    """
+    Texto del PDF `data` con el motor indicado, usando la caché.
+    `data` son los bytes del PDF o su ruta (entonces `digest` es obligatorio).
+    `extraer(data) -> [texto_pagina, ...]` solo se llama en un fallo de caché;
+    el texto completo es `separador.join(paginas)`.
+    Devuelve {"texto": str, "lineas": List[List[str]]} (líneas por página).
+    """
+    digest = digest or sha256_bytes(data)
+    entry = get_entry(digest, motor, version)
+    if entry is not None:
+        return entry
+    entry = _build_entry(extraer(data) or [], separador)
+    put_entry(digest, motor, version, entry)
+    return entry
+
+
+def clear_cache() -> int:
+    """Borra todas las entradas; devuelve cuántas se eliminaron."""
+    folder = cache_dir()
+    borradas = 0
+    try:
+        for name in os.listdir(folder):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(folder, name))
+                    borradas += 1
+                except OSError:
+                    pass
+    except OSError:
+        pass
+    return borradas
+
@@ -1,10 +1,112 @@
 import fitz  # PyMuPDF
+import io
+import os
 import re
 
+from compras.extractors import pdf_cache
+
+
+# Los extractores reciben bytes (PDF en memoria) o una ruta (PDF en disco)
+
+def _pymupdf_paginas(fuente):
+    doc = fitz.open(fuente) if isinstance(fuente, str) else fitz.open(stream=fuente, filetype="pdf")
+    with doc:
+        return [page.get_text("text") for page in doc]
+
+
+def _pdfminer_paginas(fuente):
+    from pdfminer.high_level import extract_text
+    # pdfminer separa páginas con form feed; se conserva para no alterar el texto
+    archivo = fuente if isinstance(fuente, str) else io.BytesIO(fuente)
+    return extract_text(archivo).split("\x0c")
+
+
+class DocumentoPDF:
+    """
+    PDF abierto una sola vez y compartido por todo el pipeline de extracción.
+
+    - texto / lineas_por_pagina: extracción con PyMuPDF.
+    - texto_pdfminer / lineas_pdfminer: extracción con pdfminer (orden de layout
+      distinto, lo usa Vieja Bodega), calculada solo si alguien la pide.
+    Cada extracción se hace como máximo una vez por documento (y además pasa por
+    la caché en disco de pdf_cache, por contenido).
+
+    Con `data` el PDF vive solo en memoria; con `pdf_path` se lee del disco sin
+    cargarlo completo. `temporal=True` indica que pdf_path es un archivo temporal
+    que liberar() debe borrar.
+    """
+
+    def __init__(self, pdf_path=None, data=None, temporal=False):
+        if pdf_path is None and data is None:
+            raise ValueError("DocumentoPDF requiere pdf_path o data.")
+        self.pdf_path = pdf_path
+        self.temporal = temporal
+        self._data = data
+        self._sha256 = None
+        self._extracciones = {}
+
+    @property
+    def data(self):
+        if self._data is None:
+            with open(self.pdf_path, "rb") as f:
+                self._data = f.read()
+        return self._data
+
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            if self._data is not None:
+                self._sha256 = pdf_cache.sha256_bytes(self._data)
+            else:
+                self._sha256 = pdf_cache.sha256_file(self.pdf_path)
+        return self._sha256
+
+    def liberar(self):
+        """Suelta los bytes en memoria y borra el archivo si es temporal."""
+        self._data = None
+        if self.temporal and self.pdf_path:
+            try:
+                os.unlink(self.pdf_path)
+            except OSError:
+                pass
+            self.pdf_path = None
+
+    def _extraccion(self, motor):
+        if motor not in self._extracciones:
+            fuente = self._data if self._data is not None else self.pdf_path
+            if motor == "pdfminer":
+                import pdfminer
+                entry = pdf_cache.cached_text(fuente, "pdfminer", pdfminer.__version__, _pdfminer_paginas, "\x0c", digest=self.sha256)
+            else:
+                entry = pdf_cache.cached_text(fuente, "pymupdf", fitz.VersionBind, _pymupdf_paginas, "\n", digest=self.sha256)
+            self._extracciones[motor] = entry
+        return self._extracciones[motor]
+
+    @property
+    def texto(self):
+        return self._extraccion("pymupdf")["texto"]
+
+    @property
+    def lineas_por_pagina(self):
+        return self._extraccion("pymupdf")["lineas"]
+
+    @property
+    def texto_pdfminer(self):
+        return self._extraccion("pdfminer")["texto"]
+
+    @property
+    def lineas_pdfminer(self):
+        return self._extraccion("pdfminer")["lineas"]
+
+
 def extract_text_from_pdf(pdf_path):
-    """Extrae el texto completo del PDF."""
-    with fitz.open(pdf_path) as doc:
-        return "\n".join([page.get_text("text") for page in doc])
+    """Extrae el texto completo del PDF (PyMuPDF), con caché por contenido."""
+    return DocumentoPDF(pdf_path).texto
+
+
+def extract_text_pdfminer(pdf_path):
+    """Extrae el texto con pdfminer (orden de layout distinto a PyMuPDF), con caché por contenido."""
+    return DocumentoPDF(pdf_path).texto_pdfminer
 
 
 def extract_invoice_data(pdf_path):
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('compras', '0011_saldos_materializados'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['pagado', 'fecha'], name='compra_pagado_fecha_idx'),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.core.exceptions import ValidationError
 from django.utils import timezone
 from decimal import Decimal, ROUND_HALF_UP
 
+from utils.saldos import SaldosPagoMixin, SaldosQuerySet, propiedad_anotable
+
 class Proveedor(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
     costo_transporte_unitario = models.DecimalField(
@@ -23,7 +25,7 @@ class Producto(models.Model):
     def __str__(self):
         return f"{self.nombre} - {self.proveedor.nombre}"
 
-class Compra(models.Model):
+class Compra(SaldosPagoMixin, models.Model):
     uuid = models.CharField(max_length=100, unique=True)
     folio = models.CharField(max_length=20)
     proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, null=True, blank=True)
@@ -49,13 +51,21 @@ class Compra(models.Model):
         help_text="Estado de la revisión manual"
     )
 
+    objects = SaldosQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Compras pendientes por fecha (Compra no tiene vencimiento)
+            models.Index(fields=["pagado", "fecha"], name="compra_pagado_fecha_idx"),
+        ]
+
     @property
     def estado(self):
         return "Viva" if not self.pagado else "Muerta"
     
     # ========== FASE 2: PROPIEDADES PARA PAGOS PARCIALES ==========
     
-    @property
+    @propiedad_anotable
     def total_pagado(self):
         """Total de pagos realizados hasta el momento.
         
@@ -69,13 +79,13 @@ class Compra(models.Model):
         
         return Decimal(total).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
     
-    @property
+    @propiedad_anotable
     def saldo_pendiente(self):
         """Saldo que falta por pagar al proveedor."""
         saldo = self.total - self.total_pagado
         return max(Decimal("0.00"), saldo).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
     
-    @property
+    @propiedad_anotable
     def estado_pago(self):
         """Estado del pago: pendiente, parcial, pagada, vencida.
         
@@ -191,7 +201,9 @@ class PagoCompra(models.Model):
                 self.compra.pagado = True
                 if not self.compra.fecha_pago:
                     self.compra.fecha_pago = self.fecha_pago
-                self.compra.save(update_fields=['pagado', 'fecha_pago'])
+                self.compra.save(update_fields=['pagado', 'fecha_pago'])  # también recalcula saldos
+            else:
+                self.compra.actualizar_saldos()
     
     def __str__(self):
         return f"Pago de ${self.monto} - Compra {self.compra.folio} ({self.fecha_pago})"
@@ -1,10 +1,11 @@
 # compras/signals.py
 """
-Signals para mantener consistencia de stock y PNR al borrar compras.
+Signals para mantener consistencia de stock, saldos y PNR al borrar compras o pagos.
 """
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, post_delete
 from django.dispatch import receiver
-from .models import CompraProducto, Compra
+from inventario.stock import mover_stock
+from .models import CompraProducto, Compra, PagoCompra
 
 
 @receiver(pre_delete, sender=CompraProducto)
@@ -18,14 +19,24 @@ def revertir_stock_al_borrar_compra_producto(sender, instance, **kwargs):
         cantidad = instance.cantidad or 0
         
         if producto and cantidad > 0:
-            # Restar del stock
-            producto.stock = max(0, (producto.stock or 0) - cantidad)
-            producto.save(update_fields=["stock"])
+            # Restar del stock (sin bajar de 0)
+            mover_stock(producto, -cantidad, "cancelacion_compra",
+                        referencia=f"Compra {instance.compra.folio or instance.compra_id}", minimo=0)
     except Exception as e:
         # Log error pero no bloquear el borrado
         print(f"Error al revertir stock en CompraProducto {instance.id}: {e}")
 
 
+@receiver(post_delete, sender=PagoCompra)
+def actualizar_saldos_al_borrar_pago(sender, instance, **kwargs):
+    """Al borrar un pago, recalcula las columnas de saldo de su compra (utils/saldos.py)."""
+    try:
+        compra = Compra.objects.get(pk=instance.compra_id)
+    except Compra.DoesNotExist:
+        return  # Se está borrando la compra completa
+    compra.actualizar_saldos()
+
+
 @receiver(pre_delete, sender=Compra)
 def borrar_pnr_asociados_al_borrar_compra(sender, instance, **kwargs):
     """
@@ -1,3 +1,338 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+
+from compras.extractors import pdf_cache
+from compras.extractors.pdf_reader import DocumentoPDF
+
+
+class PdfCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch.dict(os.environ, {"PDF_CACHE_DIR": self.tmp.name, "PDF_CACHE_ENABLED": "1"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_segunda_extraccion_sale_de_cache(self):
+        llamadas = []
+
+        def extraer(data):
+            llamadas.append(data)
+            return ["linea 1\nlinea 2", "linea 3"]
+
+        primera = pdf_cache.cached_text(b"%PDF-1", "pymupdf", "1.0", extraer)
+        segunda = pdf_cache.cached_text(b"%PDF-1", "pymupdf", "1.0", extraer)
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(segunda, primera)
+        self.assertEqual(segunda["texto"], "linea 1\nlinea 2\nlinea 3")
+        self.assertEqual(segunda["lineas"], [["linea 1", "linea 2"], ["linea 3"]])
+        # Otro motor/versión o contenido distinto no comparten entrada
+        pdf_cache.cached_text(b"%PDF-1", "pdfminer", "1.0", extraer)
+        pdf_cache.cached_text(b"%PDF-2", "pymupdf", "1.0", extraer)
+        self.assertEqual(len(llamadas), 3)
+
+    def test_desaloja_entradas_menos_usadas(self):
+        with mock.patch.dict(os.environ, {"PDF_CACHE_MAX_MB": str(2500 / (1024 * 1024))}):
+            pdf_cache.cached_text(b"a", "pymupdf", "1", lambda d: ["x" * 1000])
+            vieja = pdf_cache._entry_path(pdf_cache.sha256_bytes(b"a"), "pymupdf", "1")
+            os.utime(vieja, (0, 0))
+            pdf_cache.cached_text(b"b", "pymupdf", "1", lambda d: ["y" * 1000])
+            pdf_cache.cached_text(b"c", "pymupdf", "1", lambda d: ["z" * 1000])
+
+        self.assertFalse(os.path.exists(vieja))
+        self.assertIsNotNone(pdf_cache.get_entry(pdf_cache.sha256_bytes(b"c"), "pymupdf", "1"))
+
+    def test_documento_extrae_una_sola_vez_por_motor(self):
+        with mock.patch("compras.extractors.pdf_reader._pdfminer_paginas", return_value=["p1", "p2"]) as extraer:
+            documento = DocumentoPDF(data=b"%PDF-doc")
+            self.assertEqual(documento.texto_pdfminer, "p1\x0cp2")
+            self.assertEqual(documento.lineas_pdfminer, [["p1"], ["p2"]])
+        self.assertEqual(extraer.call_count, 1)
+
+
+class PipelineDriveTests(SimpleTestCase):
+    def test_descarga_en_paralelo_y_entrega_en_orden(self):
+        from compras.utils.drive_pipeline import PipelineDrive
+
+        def descargar(archivo):
+            if archivo == "roto":
+                raise IOError("descarga fallida")
+            return DocumentoPDF(data=archivo.encode())
+
+        with mock.patch("compras.extractors.pdf_reader._pymupdf_paginas", side_effect=lambda d: [d.decode()]):
+            with mock.patch.dict(os.environ, {"PDF_CACHE_ENABLED": "0"}):
+                with PipelineDrive(descargar, hilos=3, procesos=0) as pipeline:
+                    futuros = [pipeline.extraer(a) for a in ("a", "roto", "c")]
+                    self.assertEqual(futuros[0].result().texto, "a")
+                    with self.assertRaises(IOError):
+                        futuros[1].result()
+                    self.assertEqual(futuros[2].result().texto, "c")
+
+    def test_extraer_en_orden_acota_los_encolados(self):
+        from compras.utils.drive_pipeline import PipelineDrive
+
+        archivos = [f"f{i}" for i in range(10)]
+        with PipelineDrive(lambda a: a, preparar=lambda d: d, hilos=2, procesos=0) as pipeline:
+            with mock.patch.object(pipeline, "extraer", wraps=pipeline.extraer) as extraer:
+                entregados = []
+                for futuro in pipeline.extraer_en_orden(archivos):
+                    # Ventana de 2×hilos: el entregado más los 3 siguientes
+                    self.assertLessEqual(extraer.call_count, len(entregados) + 4)
+                    entregados.append(futuro.result())
+        self.assertEqual(entregados, archivos)
+        self.assertEqual(extraer.call_count, 10)
+
+
+class DriveSessionTests(SimpleTestCase):
+    def setUp(self):
+        import sys
+        import types
+
+        self.auths = []
+        test = self
+
+        class RefreshError(Exception):
+            pass
+
+        class FakeGoogleAuth:
+            def __init__(self, settings_file):
+                self.credentials = object()
+                self.access_token_expired = False
+                self.refreshes = 0
+                test.auths.append(self)
+
+            def LoadCredentialsFile(self, path):
+                pass
+
+            def Authorize(self):
+                pass
+
+            def Refresh(self):
+                self.refreshes += 1
+                self.access_token_expired = False
+
+            def SaveCredentialsFile(self, path):
+                pass
+
+        auth = types.ModuleType("pydrive2.auth")
+        auth.GoogleAuth, auth.RefreshError = FakeGoogleAuth, RefreshError
+        drive = types.ModuleType("pydrive2.drive")
+        drive.GoogleDrive = lambda gauth: ("drive", gauth)
+        patcher = mock.patch.dict(sys.modules, {"pydrive2": types.ModuleType("pydrive2"), "pydrive2.auth": auth, "pydrive2.drive": drive})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_autentica_una_vez_y_refresca_al_expirar(self):
+        from compras.utils.drive_session import DriveSession
+
+        session = DriveSession("settings.yaml", os.path.join(tempfile.gettempdir(), "token-test.json"))
+        primero = session.get_drive()
+        self.assertIs(session.get_drive(), primero)
+        self.assertEqual(len(self.auths), 1)
+
+        self.auths[0].access_token_expired = True
+        session.get_drive()
+        self.assertEqual(len(self.auths), 1)
+        self.assertEqual(self.auths[0].refreshes, 1)
+
+
+class ArchivoDriveFalso(dict):
+    """Como GoogleDriveFile de PyDrive2: sin downloadUrl en los metadatos no se puede descargar."""
+
+    class FileNotDownloadableError(Exception):
+        pass
+
+    def _url(self):
+        if not self.get("downloadUrl"):
+            raise self.FileNotDownloadableError("No downloadLink/exportLinks for mimetype found in metadata")
+        return self["downloadUrl"]
+
+    def FetchContent(self):
+        import io
+        self._url()
+        self.content = io.BytesIO(b"%PDF-" + self["id"].encode())
+
+    def GetContentFile(self, path):
+        self._url()
+        with open(path, "wb") as f:
+            f.write(b"%PDF-" + self["id"].encode())
+
+
+def _campos_de_file(fields):
+    """Nombres de primer nivel pedidos dentro de file(...) en un parámetro `fields` de Drive."""
+    nombres, actual, nivel = [], "", 0
+    for ch in fields.split("file(", 1)[1]:
+        if ch == "(":
+            nivel += 1
+        elif ch == ")":
+            if nivel == 0:
+                break
+            nivel -= 1
+        elif ch == "," and nivel == 0:
+            nombres.append(actual)
+            actual = ""
+        elif nivel == 0:
+            actual += ch
+    nombres.append(actual)
+    return {n.split("/")[0] for n in nombres}
+
+
+class FakeDriveCambios:
+    """Stand-in local de Drive con la interfaz de FuenteCambiosDrive."""
+
+    def __init__(self):
+        self.archivos = {}
+        self.log = []  # (token, file_id)
+
+    def agregar(self, file_id, carpeta, mime="application/pdf"):
+        self.archivos[file_id] = {
+            "id": file_id, "title": f"{file_id}.pdf", "mimeType": mime, "parents": [{"id": carpeta}],
+            "downloadUrl": f"https://drive.invalid/{file_id}", "fileSize": "100",
+        }
+        self.log.append(file_id)
+
+    def mover(self, file_id, carpeta):
+        self.archivos[file_id]["parents"] = [{"id": carpeta}]
+        self.log.append(file_id)
+
+    def token_inicial(self):
+        return str(len(self.log))
+
+    def cambios(self, token):
+        ids = self.log[int(token):]
+        return [{"fileId": i, "deleted": False, "file": dict(self.archivos[i])} for i in ids], str(len(self.log))
+
+    def pdfs_en_carpeta(self, folder_id):
+        return [dict(m) for m in self.archivos.values() if m["parents"][0]["id"] == folder_id]
+
+    def archivo(self, metadata):
+        return ArchivoDriveFalso(metadata)
+
+
+class DriveIncrementalTests(TestCase):
+    def test_solo_ve_archivos_nuevos_despues_de_confirmar(self):
+        from compras.utils.drive_changes import SincronizadorDrive
+
+        drive = FakeDriveCambios()
+        drive.agregar("viejo", "nuevas")
+        drive.agregar("otra_carpeta", "procesadas")
+
+        primera = SincronizadorDrive("compras", "nuevas", drive)
+        self.assertEqual([a["id"] for a in primera.pendientes()], ["viejo"])
+        primera.confirmar()
+
+        drive.mover("viejo", "procesadas")
+        drive.agregar("nuevo", "nuevas")
+        drive.agregar("imagen", "nuevas", mime="image/png")
+
+        segunda = SincronizadorDrive("compras", "nuevas", drive)
+        self.assertEqual([a["id"] for a in segunda.pendientes()], ["nuevo"])
+        # Sin confirmar, la siguiente corrida vuelve a ver el mismo cambio
+        self.assertEqual([a["id"] for a in SincronizadorDrive("compras", "nuevas", drive).pendientes()], ["nuevo"])
+        segunda.confirmar()
+        self.assertEqual(SincronizadorDrive("compras", "nuevas", drive).pendientes(), [])
+
+    def test_procesador_incremental_confirma_token_tras_procesar(self):
+        from compras.utils.drive_changes import SincronizadorDrive
+        from compras.utils.drive_processor import DriveInvoiceProcessor
+        from inventario.models import EstadoSincronizacionDrive
+
+        drive = FakeDriveCambios()
+        drive.agregar("f1", "nuevas")
+        processor = DriveInvoiceProcessor(nuevas_folder_id="nuevas", procesadas_folder_id="procesadas", hilos=1)
+        resultado_ok = {"status": "success", "file_title": "f1.pdf", "folio": "1", "proveedor": "X", "error_text": ""}
+        with mock.patch.object(processor, "sincronizador", return_value=SincronizadorDrive("compras", "nuevas", drive)), \
+             mock.patch.object(processor, "get_drive"), \
+             mock.patch.object(processor, "process_pdf_file", return_value=resultado_ok), \
+             mock.patch.object(processor, "move_file", side_effect=lambda f, carpeta: drive.mover(f["id"], carpeta)):
+            resultado = processor.process_all_invoices(incremental=True)
+
+        self.assertEqual((resultado["total"], resultado["success"]), (1, 1))
+        self.assertEqual(EstadoSincronizacionDrive.objects.get(clave="compras").page_token, "1")
+
+    def test_procesador_incremental_no_avanza_token_si_no_movio(self):
+        from compras.utils.drive_changes import SincronizadorDrive
+        from compras.utils.drive_processor import DriveInvoiceProcessor
+        from inventario.models import EstadoSincronizacionDrive
+
+        drive = FakeDriveCambios()
+        drive.agregar("f1", "nuevas")
+        processor = DriveInvoiceProcessor(nuevas_folder_id="nuevas", procesadas_folder_id="procesadas", hilos=1)
+        resultado_ok = {"status": "success", "file_title": "f1.pdf", "folio": "1", "proveedor": "X", "error_text": ""}
+        with mock.patch.object(processor, "sincronizador", return_value=SincronizadorDrive("compras", "nuevas", drive)), \
+             mock.patch.object(processor, "get_drive"), \
+             mock.patch.object(processor, "process_pdf_file", return_value=resultado_ok), \
+             mock.patch.object(processor, "move_file", side_effect=IOError("sin red")):
+            processor.process_all_invoices(incremental=True)
+            # f1 sigue en Nuevas: la próxima corrida debe volver a verlo
+            self.assertEqual(EstadoSincronizacionDrive.objects.get(clave="compras").page_token, "")
+            with self.assertRaises(ValueError):
+                processor.process_all_invoices(move_files=False, incremental=True)
+
+    def test_fuente_pide_metadatos_para_descargar(self):
+        from types import SimpleNamespace
+        from compras.utils.drive_changes import FuenteCambiosDrive, SincronizadorDrive
+        from compras.utils.drive_pipeline import descargar_documento
+        from inventario.models import EstadoSincronizacionDrive
+
+        metadatos = {
+            "id": "grande", "title": "grande.pdf", "mimeType": "application/pdf", "parents": [{"id": "nuevas"}],
+            "labels": {"trashed": False}, "downloadUrl": "https://drive.invalid/grande", "fileSize": "5000",
+            "owners": [{"displayName": "X"}],
+        }
+
+        class Cambios:
+            def getStartPageToken(self):
+                return SimpleNamespace(execute=lambda: {"startPageToken": "1"})
+
+            def list(self, pageToken, maxResults, fields):
+                # Como Drive: solo devuelve los campos pedidos
+                campos = _campos_de_file(fields)
+                archivo = {k: v for k, v in metadatos.items() if k in campos}
+                return SimpleNamespace(execute=lambda: {
+                    "items": [{"fileId": "grande", "deleted": False, "file": archivo}], "newStartPageToken": "2",
+                })
+
+        drive = SimpleNamespace(
+            auth=SimpleNamespace(service=SimpleNamespace(changes=Cambios)),
+            CreateFile=ArchivoDriveFalso,
+        )
+        EstadoSincronizacionDrive.objects.create(clave="compras", page_token="1")
+
+        [archivo] = SincronizadorDrive("compras", "nuevas", FuenteCambiosDrive(drive)).pendientes()
+        self.assertNotIn("owners", archivo)
+        with mock.patch.dict(os.environ, {"DRIVE_PDF_MAX_MEMORIA_MB": "0.001"}):
+            documento = descargar_documento(archivo)
+        # fileSize llegó: el PDF grande va a archivo temporal
+        self.assertTrue(documento.temporal)
+        documento.liberar()
+
+
+class DescargaDocumentoTests(SimpleTestCase):
+    class ArchivoFalso(dict):
+        def FetchContent(self):
+            import io
+            self.content = io.BytesIO(b"%PDF-en-memoria")
+
+        def GetContentFile(self, path):
+            with open(path, "wb") as f:
+                f.write(b"%PDF-en-disco")
+
+    def test_en_memoria_salvo_archivos_grandes(self):
+        from compras.utils.drive_pipeline import descargar_documento
+
+        chico = descargar_documento(self.ArchivoFalso(fileSize="100"))
+        self.assertEqual(chico.data, b"%PDF-en-memoria")
+        self.assertIsNone(chico.pdf_path)
+
+        with mock.patch.dict(os.environ, {"DRIVE_PDF_MAX_MEMORIA_MB": "0.0001"}):
+            grande = descargar_documento(self.ArchivoFalso(fileSize="1000"))
+        self.assertTrue(grande.temporal and os.path.exists(grande.pdf_path))
+        self.assertEqual(grande.sha256, pdf_cache.sha256_bytes(b"%PDF-en-disco"))
+        ruta = grande.pdf_path
+        grande.liberar()
+        self.assertFalse(os.path.exists(ruta))
@@ -5,6 +5,8 @@ from django.apps import apps
 from django.db.models import Q
 import os
 
+from inventario.utils import normalize_text
+
 # ========= Helpers de app/modelo =========
 def _get_model(app_label: str, model_name: str):
     try:
@@ -37,27 +39,33 @@ def _first(*vals):
 # ========= Resolución de alias/nombre =========
 def _resolve_nombre_producto(nombre_o_desc: str) -> Optional[str]:
     """
-    Devuelve el nombre oficial del Producto si hay match por:
-      1) Producto.nombre (iexact)
-      2) AliasProducto.alias (iexact) -> Producto.nombre
+    Devuelve el nombre oficial del Producto si hay match exacto (normalizado) por:
+      1) Producto.nombre_normalizado
+      2) AliasProducto.alias_normalizado -> Producto.nombre
+    Ambas son búsquedas por igualdad sobre columnas indexadas.
     Si no hay match, devuelve None.
     """
     if not nombre_o_desc:
         return None
-    txt = nombre_o_desc.strip()
+    target = normalize_text(nombre_o_desc)
+    if not target:
+        return None
 
     # 1) Match directo por nombre de Producto
     if Producto:
-        p = Producto.objects.filter(nombre__iexact=txt).first()
-        if p:
-            return p.nombre
+        nombre = Producto.objects.filter(nombre_normalizado=target).values_list("nombre", flat=True).first()
+        if nombre:
+            return nombre
 
-    # 2) Match por AliasProducto
+    # 2) Match por AliasProducto -> usamos el nombre oficial del producto destino
     if AliasProducto:
-        alias = AliasProducto.objects.filter(alias__iexact=txt).first()
-        if alias and getattr(alias, "producto", None):
-            # usamos el nombre oficial del producto destino
-            return alias.producto.nombre
+        nombre = (
+            AliasProducto.objects.filter(alias_normalizado=target)
+            .values_list("producto__nombre", flat=True)
+            .first()
+        )
+        if nombre:
+            return nombre
 
     return None
 
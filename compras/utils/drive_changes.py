@@ -0,0 +1,110 @@
+"""
+Modo incremental para las carpetas "Nuevas" de Drive (compras y ventas).
+
+En vez de listar toda la carpeta en cada corrida, se guarda el page token de la
+API de cambios de Drive (EstadoSincronizacionDrive) y solo se piden los cambios
+posteriores: el costo es O(archivos nuevos), no O(carpeta).
+
+- Primera corrida (sin token): se toma el token de inicio *antes* de listar la
+  carpeta completa, así que lo que llegue mientras se procesa aparece la próxima vez.
+- Siguientes corridas: PDFs no borrados cuyo padre actual es la carpeta vigilada.
+  Los que ya se movieron a Procesadas/Errores quedan fuera solos.
+- El token nuevo solo se guarda con confirmar(), después de procesar el lote; si la
+  corrida se cae a medias, la siguiente vuelve a ver los mismos cambios.
+- Por eso el modo incremental exige mover los archivos fuera de la carpeta vigilada,
+  y los procesadores solo confirman si todos se movieron: un archivo que se queda en
+  "Nuevas" detrás del token ya no volvería a aparecer.
+
+FuenteCambiosDrive adapta PyDrive2; los tests usan un stand-in local con la misma interfaz
+(token_inicial, cambios, pdfs_en_carpeta, archivo).
+"""
+from typing import Dict, List, Optional, Tuple
+
+from django.utils import timezone
+
+from inventario.models import EstadoSincronizacionDrive
+
+PDF_MIME = "application/pdf"
+
+
+class FuenteCambiosDrive:
+    """Acceso a la API de cambios (Drive v2) a través de un GoogleDrive de PyDrive2."""
+
+    # downloadUrl/fileSize: el GoogleDriveFile armado en archivo() se descarga con
+    # FetchContent() sin volver a pedir metadatos (ver descargar_documento)
+    CAMPOS = (
+        "items(fileId,deleted,file(id,title,mimeType,labels/trashed,parents(id),downloadUrl,fileSize)),"
+        "nextPageToken,newStartPageToken"
+    )
+
+    def __init__(self, drive):
+        self.drive = drive
+
+    @property
+    def _service(self):
+        return self.drive.auth.service
+
+    def token_inicial(self) -> str:
+        return self._service.changes().getStartPageToken().execute()["startPageToken"]
+
+    def cambios(self, token: str) -> Tuple[List[Dict], str]:
+        """Todos los cambios desde `token` (paginando) y el token para la próxima vez."""
+        items = []
+        while True:
+            resp = self._service.changes().list(pageToken=token, maxResults=1000, fields=self.CAMPOS).execute()
+            items.extend(resp.get("items", []))
+            if resp.get("newStartPageToken"):
+                return items, resp["newStartPageToken"]
+            token = resp["nextPageToken"]
+
+    def pdfs_en_carpeta(self, folder_id: str) -> List:
+        return self.drive.ListFile({
+            "q": f"'{folder_id}' in parents and mimeType='{PDF_MIME}' and trashed=false"
+        }).GetList()
+
+    def archivo(self, metadata: Dict):
+        return self.drive.CreateFile(metadata)
+
+
+def _es_pdf_en_carpeta(metadata: Dict, folder_id: str) -> bool:
+    if metadata.get("mimeType") != PDF_MIME:
+        return False
+    if (metadata.get("labels") or {}).get("trashed"):
+        return False
+    return any(p.get("id") == folder_id for p in metadata.get("parents") or [])
+
+
+class SincronizadorDrive:
+    """Archivos pendientes de una carpeta vigilada, usando el token guardado bajo `clave`."""
+
+    def __init__(self, clave: str, folder_id: str, fuente):
+        self.clave = clave
+        self.folder_id = folder_id
+        self.fuente = fuente
+        self._nuevo_token: Optional[str] = None
+
+    def pendientes(self) -> List:
+        estado, _ = EstadoSincronizacionDrive.objects.get_or_create(clave=self.clave)
+        if not estado.page_token:
+            self._nuevo_token = self.fuente.token_inicial()
+            return self.fuente.pdfs_en_carpeta(self.folder_id)
+
+        items, self._nuevo_token = self.fuente.cambios(estado.page_token)
+        # Un archivo puede aparecer varias veces: vale su último estado
+        ultimos: Dict[str, Dict] = {}
+        for item in items:
+            file_id = item.get("fileId") or (item.get("file") or {}).get("id")
+            if file_id:
+                ultimos[file_id] = item
+        return [
+            self.fuente.archivo(item["file"])
+            for item in ultimos.values()
+            if not item.get("deleted") and _es_pdf_en_carpeta(item.get("file") or {}, self.folder_id)
+        ]
+
+    def confirmar(self) -> None:
+        """Guarda el token nuevo (llamar después de procesar lo que devolvió pendientes())."""
+        if self._nuevo_token:
+            EstadoSincronizacionDrive.objects.filter(clave=self.clave).update(
+                page_token=self._nuevo_token, actualizado_en=timezone.now()
+            )
@@ -0,0 +1,174 @@
+"""
+Pipeline concurrente para procesar lotes de PDFs desde Google Drive.
+Lo usan DriveInvoiceProcessor (compras) y DriveVentasProcessor (ventas).
+
+Etapas:
+  1. Red (ThreadPoolExecutor): descarga de cada archivo y, al final, el movimiento
+     a Procesadas/Errores.
+  2. CPU (ProcessPoolExecutor, opcional): extracción de texto del PDF
+     (PyMuPDF/pdfminer), que no toca la BD.
+  3. BD: el hilo que llama consume los resultados en el orden del listado y es el
+     único que escribe en la BD, así que el estado por archivo queda igual que en
+     el modo secuencial.
+
+PyDrive2 usa un objeto http por hilo, por lo que el mismo GoogleDrive se puede
+compartir entre los hilos de descarga.
+
+Las descargas quedan en memoria (DocumentoPDF con bytes, que PyMuPDF abre con
+fitz.open(stream=...)); solo los PDFs más grandes que DRIVE_PDF_MAX_MEMORIA_MB
+van a un archivo temporal, que se borra con DocumentoPDF.liberar().
+
+Configuración por variables de entorno:
+    DRIVE_HILOS                descargas/movimientos simultáneos (default 4; 1 = secuencial)
+    DRIVE_PROCESOS             procesos para extraer texto (default 2; 0 = en el hilo de descarga)
+    DRIVE_PDF_MAX_MEMORIA_MB   tamaño máximo para descargar en memoria (default 20)
+"""
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from compras.extractors.pdf_reader import DocumentoPDF
+
+
+def _env_int(nombre: str, default: int) -> int:
+    try:
+        return int(os.getenv(nombre, default))
+    except ValueError:
+        return default
+
+
+def hilos_por_defecto() -> int:
+    return max(1, _env_int("DRIVE_HILOS", 4))
+
+
+def procesos_por_defecto() -> int:
+    return max(0, _env_int("DRIVE_PROCESOS", 2))
+
+
+def max_bytes_en_memoria() -> int:
+    try:
+        return int(float(os.getenv("DRIVE_PDF_MAX_MEMORIA_MB", "20")) * 1024 * 1024)
+    except ValueError:
+        return 20 * 1024 * 1024
+
+
+def descargar_documento(archivo) -> DocumentoPDF:
+    """
+    Descarga un GoogleDriveFile de PyDrive2 como DocumentoPDF: en memoria, o en un
+    archivo temporal si su tamaño declarado pasa de DRIVE_PDF_MAX_MEMORIA_MB.
+    """
+    try:
+        tamano = int(archivo.get("fileSize") or 0)
+    except (TypeError, ValueError):
+        tamano = 0
+    if tamano <= max_bytes_en_memoria():
+        archivo.FetchContent()
+        return DocumentoPDF(data=archivo.content.getvalue())
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        tmp_path = tmp.name
+    try:
+        archivo.GetContentFile(tmp_path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    return DocumentoPDF(pdf_path=tmp_path, temporal=True)
+
+
+def _inicializar_proceso():
+    # Los procesos hijos arrancan con "spawn": necesitan su propio django.setup()
+    # para poder importar los extractores (que importan modelos).
+    import django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm_project.settings")
+    django.setup()
+
+
+def precalcular_texto(documento: DocumentoPDF) -> DocumentoPDF:
+    """Preparación por defecto: solo el texto de PyMuPDF."""
+    documento.texto
+    return documento
+
+
+class PipelineDrive:
+    """
+    Uso:
+        with PipelineDrive(descargar, preparar) as pipeline:
+            for archivo, futuro in zip(archivos, pipeline.extraer_en_orden(archivos)):
+                documento = futuro.result()   # registrar en BD aquí
+                pipeline.en_red(mover, archivo, destino)
+
+    - descargar(archivo) -> DocumentoPDF (corre en un hilo; ver descargar_documento).
+    - preparar(DocumentoPDF) -> DocumentoPDF con sus extracciones hechas; debe ser
+      una función de módulo (se envía a otro proceso).
+    """
+
+    def __init__(
+        self,
+        descargar: Callable[[Any], DocumentoPDF],
+        preparar: Callable[[DocumentoPDF], DocumentoPDF] = precalcular_texto,
+        hilos: Optional[int] = None,
+        procesos: Optional[int] = None,
+    ):
+        self.descargar = descargar
+        self.preparar = preparar
+        self.hilos = hilos or hilos_por_defecto()
+        self.procesos = procesos_por_defecto() if procesos is None else procesos
+        self._hilos = None
+        self._procesos = None
+
+    def __enter__(self):
+        self._hilos = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="drive")
+        if self.procesos > 0:
+            try:
+                self._procesos = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_proceso,
+                )
+            except (OSError, ValueError, NotImplementedError):
+                # Sin soporte de multiprocessing: se extrae en los hilos de descarga
+                self._procesos = None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._hilos.shutdown(wait=True)
+        if self._procesos is not None:
+            self._procesos.shutdown(wait=True)
+        return False
+
+    def extraer(self, archivo) -> Future:
+        """Future con el DocumentoPDF del archivo, ya descargado y con su texto extraído."""
+        return self._hilos.submit(self._descargar_y_preparar, archivo)
+
+    def extraer_en_orden(self, archivos: Iterable, ventana: Optional[int] = None) -> Iterator[Future]:
+        """
+        Futures de extraer() en el orden de `archivos`, con a lo más `ventana`
+        (default 2×hilos) encolados a la vez, contando el que se está consumiendo.
+        Al pedir el siguiente se encola uno nuevo, así un lote grande no deja
+        todos sus PDFs en memoria.
+        """
+        ventana = max(1, ventana or 2 * self.hilos)
+        pendientes_por_encolar = iter(archivos)
+        encolados = deque(self.extraer(a) for a in islice(pendientes_por_encolar, ventana))
+        while encolados:
+            yield encolados.popleft()
+            for archivo in islice(pendientes_por_encolar, 1):
+                encolados.append(self.extraer(archivo))
+
+    def _descargar_y_preparar(self, archivo) -> DocumentoPDF:
+        documento = self.descargar(archivo)
+        try:
+            if self._procesos is not None:
+                return self._procesos.submit(self.preparar, documento).result()
+            return self.preparar(documento)
+        except Exception:
+            documento.liberar()
+            raise
+
+    def en_red(self, fn: Callable, *args) -> Future:
+        """Encola trabajo de red (p.ej. mover el archivo) sin bloquear al escritor de BD."""
+        return self._hilos.submit(fn, *args)
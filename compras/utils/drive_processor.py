@@ -4,16 +4,18 @@ Refactorización del script process_drive_invoices.py para uso desde Django Admi
 """
 import os
 import json
-import tempfile
 import traceback
+from concurrent.futures import Future
+from contextlib import nullcontext
+from itertools import repeat
 from typing import Optional, Tuple, Any, Dict, List
 from decimal import Decimal
 from datetime import date, datetime
 
-from pydrive2.auth import GoogleAuth
-from pydrive2.drive import GoogleDrive
-
-from factura_parser import extract_invoice_data
+from factura_parser import extract_invoice_data, preparar_documento
+from compras.utils.drive_pipeline import PipelineDrive, descargar_documento, hilos_por_defecto, procesos_por_defecto
+from compras.utils.drive_session import obtener_drive
+from compras.utils.drive_changes import FuenteCambiosDrive, SincronizadorDrive
 from compras.utils.registrar_compra import registrar_compra_automatizada
 from compras.models import Compra, Proveedor
 from django.db import transaction
@@ -43,7 +45,9 @@ class DriveInvoiceProcessor:
         nuevas_folder_id: str = None,
         procesadas_folder_id: str = None,
         errores_folder_id: str = None,
-        validation_mode: str = "lenient"
+        validation_mode: str = "lenient",
+        hilos: Optional[int] = None,
+        procesos: Optional[int] = None,
     ):
         """
         Args:
@@ -52,30 +56,23 @@ class DriveInvoiceProcessor:
             procesadas_folder_id: ID de carpeta "Compras_Procesadas"
             errores_folder_id: ID de carpeta "Compras_Errores"
             validation_mode: "strict", "lenient" o "off"
+            hilos: descargas simultáneas (default DRIVE_HILOS; 1 = secuencial)
+            procesos: procesos para extraer texto (default DRIVE_PROCESOS)
         """
         self.root_folder_id = root_folder_id or os.getenv("COMPRAS_ROOT_ID", "1o9SkoeJ66qoBEbmyzXXhs1I67PQStTWV")
         self.nuevas_folder_id = nuevas_folder_id or os.getenv("COMPRAS_NUEVAS_ID", "1yQ4Jq2nQuJsKxxdoIJ2VLAjszSx19d4U")
         self.procesadas_folder_id = procesadas_folder_id or os.getenv("COMPRAS_PROCESADAS_ID", "1k_1LT-J4foKRw2-pAYuAWBntmab6Yix7")
         self.errores_folder_id = errores_folder_id or os.getenv("COMPRAS_ERRORES_ID", "1YSo5L2VCoswN-vYr1kOCiTVctGp70ZV2")
         self.validation_mode = validation_mode
+        self.hilos = hilos or hilos_por_defecto()
+        self.procesos = procesos_por_defecto() if procesos is None else procesos
         self.drive = None
         
-    def get_drive(self) -> GoogleDrive:
-        """Obtiene instancia autenticada de Google Drive."""
+    def get_drive(self):
+        """Obtiene instancia autenticada de Google Drive (sesión compartida, ver drive_session)."""
         if self.drive:
             return self.drive
-            
-        gauth = GoogleAuth("settings.yaml")
-        gauth.LoadCredentialsFile("token.json")
-        if gauth.credentials is None:
-            gauth.LocalWebserverAuth()
-        elif gauth.access_token_expired:
-            gauth.Refresh()
-        else:
-            gauth.Authorize()
-        gauth.SaveCredentialsFile("token.json")
-        self.drive = GoogleDrive(gauth)
-        return self.drive
+        return obtener_drive()
     
     def normalize_spaces(self, text):
         """Normaliza espacios en texto."""
@@ -236,9 +233,17 @@ class DriveInvoiceProcessor:
         data["proveedor_nombre"] = nombre_norm or nombre_str or rfc or "DESCONOCIDO"
         return prov
     
-    def process_pdf_file(self, file) -> Dict[str, Any]:
+    def descargar_pdf(self, file):
+        """Descarga el PDF de Drive como DocumentoPDF (en memoria salvo PDFs muy grandes)."""
+        return descargar_documento(file)
+
+    def process_pdf_file(self, file, extraccion=None) -> Dict[str, Any]:
         """
         Procesa un archivo PDF de factura.
+
+        Args:
+            extraccion: Future con el DocumentoPDF ya descargado y extraído (modo
+                concurrente, ver PipelineDrive). Si es None se descarga aquí.
         
         Returns:
             Dict con:
@@ -248,8 +253,8 @@ class DriveInvoiceProcessor:
                 - folio: folio de la factura (si se extrajo)
                 - proveedor: nombre del proveedor (si se extrajo)
         """
-        tmp_path = None
         data = None
+        documento = None
         result = {
             "status": "error",
             "error_text": "",
@@ -259,13 +264,14 @@ class DriveInvoiceProcessor:
         }
         
         try:
-            # Descargar archivo temporal
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp_path = tmp.name
-            file.GetContentFile(tmp_path)
+            # Descargar y extraer texto (o tomarlo del pipeline)
+            if extraccion is not None:
+                documento = extraccion.result()
+            else:
+                documento = self.descargar_pdf(file)
 
             # Extraer datos
-            data = extract_invoice_data(tmp_path) or {}
+            data = extract_invoice_data(None, documento=documento) or {}
 
             # Metadatos
             data["drive_file_id"] = file["id"]
@@ -347,12 +353,30 @@ class DriveInvoiceProcessor:
                 pass
             return result
         finally:
-            if tmp_path:
-                try:
-                    os.unlink(tmp_path)
-                except Exception:
-                    pass
+            if documento is not None:
+                documento.liberar()
     
+    def _mover_con_log(self, archivo, folder_id: str, etiqueta: str):
+        """Mueve el archivo sin propagar errores; devuelve True si quedó en `folder_id`."""
+        if not folder_id:
+            print(f"[DRIVE] ✗ Sin carpeta destino {etiqueta}: {archivo['title']} no se mueve")
+            return False
+        try:
+            print(f"[DRIVE] Moviendo {archivo['title']} {etiqueta}...")
+            self.move_file(archivo, folder_id)
+            print(f"[DRIVE] ✓ Movido exitosamente")
+            return True
+        except Exception as e:
+            print(f"[DRIVE] ✗ Error al mover: {e}")
+            traceback.print_exc()
+            return False
+
+    def _crear_pipeline(self, total: int) -> Optional[PipelineDrive]:
+        """Pipeline concurrente, o None para procesar en secuencia (1 hilo o 1 archivo)."""
+        if self.hilos <= 1 or total <= 1:
+            return None
+        return PipelineDrive(self.descargar_pdf, preparar_documento, hilos=self.hilos, procesos=self.procesos)
+
     def list_pdfs_in_folder(self, folder_id: str) -> List:
         """Lista PDFs en una carpeta de Drive."""
         drive = self.get_drive()
@@ -360,12 +384,22 @@ class DriveInvoiceProcessor:
             "q": f"'{folder_id}' in parents and mimeType='application/pdf' and trashed=false"
         }).GetList()
     
-    def process_all_invoices(self, move_files: bool = True) -> Dict[str, Any]:
+    def sincronizador(self) -> SincronizadorDrive:
+        """Cambios de Drive desde la última corrida incremental (token "compras")."""
+        folder_id = self.nuevas_folder_id or self.root_folder_id
+        return SincronizadorDrive("compras", folder_id, FuenteCambiosDrive(self.get_drive()))
+
+    def process_all_invoices(self, move_files: bool = True, progreso=None, incremental: bool = False) -> Dict[str, Any]:
         """
         Procesa todas las facturas pendientes.
         
         Args:
             move_files: Si True, mueve archivos según resultado
+            progreso: callback opcional progreso(total, details), llamado al listar y
+                después de cada archivo (lo usa la cola de tareas del admin)
+            incremental: Si True, solo procesa los PDFs que llegaron desde la
+                corrida incremental anterior (API de cambios, ver drive_changes).
+                Requiere move_files y carpeta Nuevas; si no, ValueError
             
         Returns:
             Dict con resumen de procesamiento:
@@ -385,7 +419,12 @@ class DriveInvoiceProcessor:
         print(f"  - nuevas_folder_id: {self.nuevas_folder_id[:20] if self.nuevas_folder_id else 'None'}...")
         print(f"  - procesadas_folder_id: {self.procesadas_folder_id[:20] if self.procesadas_folder_id else 'None'}...")
         
-        if use_multi:
+        if incremental and not (move_files and use_multi):
+            raise ValueError("El modo incremental requiere move_files y la carpeta Nuevas (COMPRAS_NUEVAS_ID)")
+        sincronizador = self.sincronizador() if incremental else None
+        if sincronizador:
+            archivos = sincronizador.pendientes()
+        elif use_multi:
             archivos = self.list_pdfs_in_folder(self.nuevas_folder_id)
         else:
             archivos = self.list_pdfs_in_folder(self.root_folder_id)
@@ -395,55 +434,55 @@ class DriveInvoiceProcessor:
         duplicate_count = 0
         error_count = 0
         details = []
+        movimientos = []  # resultado de cada _mover_con_log (bool o Future)
         
         print(f"[DRIVE] Encontrados {total} archivo(s) para procesar")
+        if progreso:
+            progreso(total, details)
         
-        for archivo in archivos:
-            result = self.process_pdf_file(archivo)
-            
-            detail = {
-                "file": result["file_title"],
-                "status": result["status"],
-                "folio": result.get("folio"),
-                "proveedor": result.get("proveedor"),
-                "error": result.get("error_text", "")
-            }
-            details.append(detail)
-            
-            if result["status"] == "success":
-                success_count += 1
-                if move_files and use_multi:
-                    try:
-                        print(f"[DRIVE] Moviendo {archivo['title']} a Procesadas...")
-                        self.move_file(archivo, self.procesadas_folder_id)
-                        print(f"[DRIVE] ✓ Movido exitosamente")
-                    except Exception as e:
-                        print(f"[DRIVE] ✗ Error al mover: {e}")
-                        import traceback
-                        traceback.print_exc()
-            elif result["status"] == "duplicate":
-                duplicate_count += 1
+        pipeline = self._crear_pipeline(total)
+        with pipeline or nullcontext():
+            extracciones = pipeline.extraer_en_orden(archivos) if pipeline else repeat(None)
+
+            for archivo, extraccion in zip(archivos, extracciones):
+                # Único escritor de BD: registra en el orden del listado
+                result = self.process_pdf_file(archivo, extraccion=extraccion)
+
+                detail = {
+                    "file": result["file_title"],
+                    "status": result["status"],
+                    "folio": result.get("folio"),
+                    "proveedor": result.get("proveedor"),
+                    "error": result.get("error_text", "")
+                }
+                details.append(detail)
+                if progreso:
+                    progreso(total, details)
+
+                if result["status"] == "success":
+                    success_count += 1
+                    destino, etiqueta = self.procesadas_folder_id, "a Procesadas"
+                elif result["status"] == "duplicate":
+                    duplicate_count += 1
+                    destino, etiqueta = self.procesadas_folder_id, "(duplicado) a Procesadas"
+                else:
+                    error_count += 1
+                    destino, etiqueta = self.errores_folder_id, "a Errores"
+
                 if move_files and use_multi:
-                    try:
-                        print(f"[DRIVE] Moviendo {archivo['title']} (duplicado) a Procesadas...")
-                        self.move_file(archivo, self.procesadas_folder_id)
-                        print(f"[DRIVE] ✓ Movido exitosamente")
-                    except Exception as e:
-                        print(f"[DRIVE] ✗ Error al mover: {e}")
-                        import traceback
-                        traceback.print_exc()
+                    if pipeline:
+                        movimientos.append(pipeline.en_red(self._mover_con_log, archivo, destino, etiqueta))
+                    else:
+                        movimientos.append(self._mover_con_log(archivo, destino, etiqueta))
+
+        if sincronizador:
+            # Solo se avanza el token si todo el lote salió de "Nuevas"; si no, la
+            # próxima corrida vuelve a ver los mismos cambios
+            if all(m.result() if isinstance(m, Future) else m for m in movimientos):
+                sincronizador.confirmar()
             else:
-                error_count += 1
-                if move_files and use_multi:
-                    try:
-                        print(f"[DRIVE] Moviendo {archivo['title']} a Errores...")
-                        self.move_file(archivo, self.errores_folder_id)
-                        print(f"[DRIVE] ✓ Movido exitosamente")
-                    except Exception as e:
-                        print(f"[DRIVE] ✗ Error al mover: {e}")
-                        import traceback
-                        traceback.print_exc()
-        
+                print(f"[DRIVE] ✗ Hubo archivos sin mover: no se avanza el token incremental")
+
         return {
             "total": total,
             "success": success_count,
@@ -468,3 +507,9 @@ def process_drive_invoices(validation_mode: str = "lenient") -> Dict[str, Any]:
     """
     processor = DriveInvoiceProcessor(validation_mode=validation_mode)
     return processor.process_all_invoices(move_files=True)
+
+
+def ejecutar_tarea_drive(tarea, progreso) -> Dict[str, Any]:
+    """Ejecutor de la tarea en segundo plano "drive_compras" (ver inventario/tareas.py)."""
+    processor = DriveInvoiceProcessor(validation_mode=tarea.parametros.get("validation_mode", "lenient"))
+    return processor.process_all_invoices(move_files=True, progreso=progreso)
@@ -0,0 +1,107 @@
+"""
+Sesión de Google Drive compartida por todo el proceso.
+
+Antes cada llamada a get_drive() creaba un GoogleAuth, leía token.json y volvía a
+autorizar (y a construir el servicio de la API). Ahora la autenticación ocurre una
+vez por proceso: el token queda en memoria y solo se refresca cuando expira.
+Es thread-safe (la usan los hilos de descarga de PipelineDrive) y la comparten
+DriveInvoiceProcessor, DriveVentasProcessor y los scripts process_drive_*.py.
+
+Configuración por variables de entorno:
+    DRIVE_SETTINGS_FILE  settings de PyDrive2 (default "settings.yaml")
+    DRIVE_TOKEN_FILE     credenciales guardadas (default "token.json")
+"""
+import os
+import threading
+from typing import Optional
+
+
+class DriveSession:
+    """Autenticación perezosa de PyDrive2 con el token cacheado en memoria."""
+
+    def __init__(self, settings_file: Optional[str] = None, token_file: Optional[str] = None):
+        self.settings_file = settings_file or os.getenv("DRIVE_SETTINGS_FILE", "settings.yaml")
+        self.token_file = token_file or os.getenv("DRIVE_TOKEN_FILE", "token.json")
+        self._lock = threading.Lock()
+        self._gauth = None
+        self._drive = None
+
+    def get_drive(self):
+        """Devuelve el GoogleDrive autenticado, refrescando el token si ya expiró."""
+        with self._lock:
+            if self._drive is None:
+                self._autenticar()
+            elif self._gauth.access_token_expired:
+                self._refrescar()
+            return self._drive
+
+    def reset(self):
+        """Olvida la sesión (la siguiente llamada vuelve a autenticar)."""
+        with self._lock:
+            self._gauth = None
+            self._drive = None
+
+    def _autenticar(self):
+        from pydrive2.auth import GoogleAuth, RefreshError
+        from pydrive2.drive import GoogleDrive
+
+        gauth = GoogleAuth(self.settings_file)
+        try:
+            gauth.LoadCredentialsFile(self.token_file)
+        except Exception:
+            pass
+
+        try:
+            if gauth.credentials is None:
+                # No hay token -> flujo local con navegador
+                gauth.LocalWebserverAuth()
+            else:
+                try:
+                    if gauth.access_token_expired:
+                        gauth.Refresh()
+                    else:
+                        gauth.Authorize()
+                except RefreshError:
+                    # Token inválido/revocado -> borra y reautentica
+                    try:
+                        os.remove(self.token_file)
+                    except Exception:
+                        pass
+                    gauth.LocalWebserverAuth()
+        except Exception:
+            # Fallback "sin navegador" (por si hay algún bloqueo del puerto localhost)
+            gauth.CommandLineAuth()
+
+        gauth.SaveCredentialsFile(self.token_file)
+        self._gauth = gauth
+        self._drive = GoogleDrive(gauth)
+
+    def _refrescar(self):
+        from pydrive2.auth import RefreshError
+        from pydrive2.drive import GoogleDrive
+
+        try:
+            self._gauth.Refresh()
+        except RefreshError:
+            # Refresh token revocado: autenticación completa de nuevo
+            self._autenticar()
+            return
+        self._gauth.SaveCredentialsFile(self.token_file)
+        self._drive = GoogleDrive(self._gauth)
+
+
+_session: Optional[DriveSession] = None
+_session_lock = threading.Lock()
+
+
+def get_drive_session() -> DriveSession:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = DriveSession()
+        return _session
+
+
+def obtener_drive():
+    """GoogleDrive autenticado de la sesión compartida del proceso."""
+    return get_drive_session().get_drive()
@@ -1,16 +1,22 @@
 # compras/utils/registrar_compra.py
+import logging
+from collections import Counter
 from decimal import Decimal, InvalidOperation
 from datetime import datetime, date
 from typing import Any
 
+from django.db import transaction
 from django.utils.timezone import now
 
 from compras.models import Compra, CompraProducto
 from inventario.models import Producto, ProductoNoReconocido
-from inventario.utils import encontrar_producto_unico
+from inventario.utils import encontrar_productos_unicos
+from inventario.stock import registrar_movimientos
 from utils.utils_validacion import es_producto_valido
 from compras.utils.validation import aplicar_validaciones_a_compra
 
+logger = logging.getLogger(__name__)
+
 def _D(x):
     if x is None or x == "":
         return None
@@ -40,7 +46,16 @@ def _parse_fecha_emision(fecha_raw):
     # Último recurso: ahora
     return now()
 
+
+@transaction.atomic
 def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
+    """
+    Registra la compra con escritura en lote: las líneas y los PNR se arman en
+    memoria (con sus flags de revisión ya calculados) y se insertan con
+    bulk_create; el stock se suma con un solo UPDATE basado en F() y queda en la
+    bitácora MovimientoInventario. Todo en una transacción, así que una factura de
+    30 líneas son unas cuantas consultas y no hay carreras con ventas concurrentes.
+    """
     # ---- Cabecera de compra ----
     fecha = _parse_fecha_emision(datos_extraidos.get("fecha_emision"))
     fecha_compra = fecha.date()
@@ -55,10 +70,18 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
 
     # ---- Recolectar info para validaciones ----
     productos_mapeados = []
-    productos_creados = []  # Lista de instancias CompraProducto creadas
+    productos_creados = []  # Instancias CompraProducto (se insertan al final con bulk_create)
+    pnr_nuevos = []  # Instancias ProductoNoReconocido (bulk_create)
+    incrementos_stock = Counter()  # producto_id -> unidades a sumar
 
     # ---- Detalle / productos ----
-    for item in (datos_extraidos.get("productos") or []):
+    items = datos_extraidos.get("productos") or []
+    # Resolver todos los nombres de la factura en lote (una carga de catálogo)
+    resueltos = encontrar_productos_unicos(
+        (item.get("nombre") or item.get("nombre_detectado") or "").strip() for item in items
+    )
+
+    for item in items:
         nombre = (item.get("nombre") or item.get("nombre_detectado") or "").strip()
         if not nombre:
             continue
@@ -68,8 +91,8 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
         cantidad = _D(item.get("cantidad")) or Decimal("0")
         precio_unitario = _D(item.get("precio_unitario")) or Decimal("0")
 
-        # Resolver producto de forma unificada (nombre/alias/soft match)
-        producto, err = encontrar_producto_unico(nombre)
+        # Producto resuelto de forma unificada (nombre/alias/soft match)
+        producto, err = resueltos[nombre]
 
         if producto:
             # Crea línea de compra
@@ -84,7 +107,7 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
                     det_kwargs["importe"] = (cantidad or 0) * (precio_unitario or 0)
                 except Exception:
                     pass
-            compra_producto = CompraProducto.objects.create(**det_kwargs)
+            compra_producto = CompraProducto(**det_kwargs)
             productos_creados.append(compra_producto)
             
             # Recolectar para validación
@@ -95,27 +118,10 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
                 "compra_producto_instance": compra_producto
             })
 
-            # Suma a stock (tu modelo Producto tiene campo 'stock' entero)
-            try:
-                import logging
-                logger = logging.getLogger(__name__)
-                
-                inc = int(cantidad) if cantidad is not None else 0
-                stock_antes = producto.stock or 0
-                producto.stock = stock_antes + inc
-                
-                logger.warning(
-                    f"[registrar_compra] SUMANDO STOCK: {producto.nombre} "
-                    f"antes={stock_antes} incremento={inc} despues={producto.stock}"
-                )
-                
-                producto.save(update_fields=["stock"])
-            except Exception as e:
-                # No detengas la compra si algo falla al sumar stock
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(f"[registrar_compra] Error sumando stock: {e}")
-                pass
+            # Suma a stock (se aplica al final en un solo UPDATE con F())
+            inc = int(cantidad) if cantidad is not None else 0
+            incrementos_stock[producto.id] += inc
+            logger.warning(f"[registrar_compra] SUMANDO STOCK: {producto.nombre} incremento={inc}")
 
         else:
             # --- No hubo match → crear "Producto no reconocido" con snapshot y prefill ---
@@ -127,7 +133,7 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
                 cantidad = _D(cantidad) or _D(first.get("cantidad")) or Decimal("1")
                 precio_unitario = _D(precio_unitario) or _D(first.get("precio_unitario")) or None
 
-            ProductoNoReconocido.objects.create(
+            pnr_nuevos.append(ProductoNoReconocido(
                 nombre_detectado = nombre or (conceptos and conceptos[0].get("descripcion")) or "POR CLASIFICAR",
                 fecha_detectado  = now(),
                 uuid_factura     = datos_extraidos.get("uuid") or datos_extraidos.get("uuid_sat"),
@@ -136,7 +142,7 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
                 cantidad         = cantidad,
                 precio_unitario  = precio_unitario,
                 raw_conceptos    = _to_json_safe(conceptos) if conceptos else None,  # JSONField: convertir Decimal a str
-            )
+            ))
             
             # Recolectar para validación (sin producto mapeado)
             productos_mapeados.append({
@@ -157,7 +163,6 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
                 if instancia and info_validacion.get("requiere_revision"):
                     instancia.requiere_revision_manual = True
                     instancia.motivo_revision = ";".join(info_validacion.get("motivos", []))
-                    instancia.save(update_fields=["requiere_revision_manual", "motivo_revision"])
                     print(f"[VALIDACIÓN] Línea marcada para revisión: {instancia.producto.nombre} - Motivos: {instancia.motivo_revision}")
         
         # Validación adicional: Comparar suma esperada (BD) vs total factura
@@ -199,7 +204,6 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
         if resultado_validacion.get("requiere_revision_compra") or compra.requiere_revision_manual:
             compra.requiere_revision_manual = True
             compra.estado_revision = "pendiente"
-            compra.save(update_fields=["requiere_revision_manual", "estado_revision"])
             print(f"[VALIDACIÓN] Compra {compra.folio} marcada para revisión - Motivos: {resultado_validacion.get('motivos_compra')}")
             
             # Si es por IEPS especial (licor), marcar TODAS las líneas para revisión
@@ -213,7 +217,6 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
                     if instancia and not instancia.requiere_revision_manual:
                         instancia.requiere_revision_manual = True
                         instancia.motivo_revision = "toda_factura_requiere_revision_por_contener_licor_ieps_30pct_o_53pct"
-                        instancia.save(update_fields=["requiere_revision_manual", "motivo_revision"])
                         print(f"[VALIDACION]   - {instancia.producto.nombre} marcado para revision")
         else:
             print(f"[VALIDACIÓN] Compra {compra.folio} - Sin problemas detectados")
@@ -225,4 +228,11 @@ def registrar_compra_automatizada(datos_extraidos: dict) -> Compra:
         print(traceback.format_exc())
         print(f"[WARNING] Continuando sin validaciones...")
 
+    # ---- Escritura en lote (las flags de revisión ya van en las instancias) ----
+    CompraProducto.objects.bulk_create(productos_creados)
+    ProductoNoReconocido.objects.bulk_create(pnr_nuevos)
+    registrar_movimientos(incrementos_stock, "compra", referencia=f"Compra {compra.folio or compra.pk}")
+    if compra.requiere_revision_manual:
+        compra.save(update_fields=["requiere_revision_manual", "estado_revision"])
+
     return compra
@@ -3,7 +3,7 @@ from django.shortcuts import render
 from .models import Compra
 from compras.models import CompraProducto
 from datetime import datetime
-from utils.reportes import calcular_agregados_periodo_compras
+from reportes.resumen import resumen_periodo
 
 def compras_pagadas_vista(request):
     compras_pagadas = []
@@ -53,19 +53,15 @@ def corte_compras(request):
             
             print(f"DEBUG - Fechas parseadas: {fecha_inicio_dt} a {fecha_fin_dt}")
 
-            # Usar la nueva función abstraída
-            agregados = calcular_agregados_periodo_compras(
-                CompraProducto.objects.all(),
-                fecha_inicio_dt,
-                fecha_fin_dt
-            )
-            
-            print(f"DEBUG - Agregados: {agregados}")
+            compras = CompraProducto.objects.filter(
+                compra__fecha__range=(fecha_inicio_dt, fecha_fin_dt)
+            ).select_related('producto', 'compra')
             
-            compras = agregados['queryset']
-            total_gastado = agregados['total_gastado']
-            productos_personalizados = agregados['productos_personalizados']
-            productos_no_personalizados = agregados['productos_no_personalizados']
+            # Totales desde el resumen diario (una fila por día, ver reportes/resumen.py)
+            resumen = resumen_periodo("contable", fecha_inicio_dt.date(), fecha_fin_dt.date())
+            total_gastado = float(resumen['compras_total'])
+            productos_personalizados = resumen['compras_unidades_personalizadas']
+            productos_no_personalizados = resumen['compras_unidades_no_personalizadas']
             
             print(f"DEBUG - Compras encontradas: {len(compras)}")
             
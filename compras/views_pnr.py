@@ -10,6 +10,7 @@ import logging
 
 from .models import Compra, CompraProducto
 from inventario.models import Producto, ProductoNoReconocido, AliasProducto
+from inventario.stock import mover_stock
 
 logger = logging.getLogger(__name__)
 
@@ -51,25 +52,17 @@ def asignar_pnr_view(request, object_id):
             )
             print(f"→ CompraProducto {'creado' if created else 'ya existía'} (ID: {compra_producto.id})")
             
-            # Actualizar stock
+            # Actualizar stock (movimiento atómico en la bitácora)
             cantidad_pnr = int(pnr.cantidad or 0)
-            if created:
-                # Nuevo CompraProducto: sumar stock
-                stock_anterior = producto.stock or 0
-                producto.stock = stock_anterior + cantidad_pnr
-                producto.save(update_fields=["stock"])
-                print(f"→ Stock actualizado: {stock_anterior} + {cantidad_pnr} = {producto.stock}")
-            else:
+            if not created:
                 # CompraProducto ya existía: SUMAR cantidades
                 cantidad_anterior = compra_producto.cantidad
                 compra_producto.cantidad += cantidad_pnr
                 compra_producto.save(update_fields=["cantidad"])
-                
-                stock_anterior = producto.stock or 0
-                producto.stock = stock_anterior + cantidad_pnr
-                producto.save(update_fields=["stock"])
                 print(f"→ CompraProducto actualizado: cantidad {cantidad_anterior} + {cantidad_pnr} = {compra_producto.cantidad}")
-                print(f"→ Stock actualizado: {stock_anterior} + {cantidad_pnr} = {producto.stock}")
+            stock_anterior = producto.stock or 0
+            mover_stock(producto, cantidad_pnr, "pnr", referencia=f"Compra {compra.folio or compra.pk}")
+            print(f"→ Stock actualizado: {stock_anterior} + {cantidad_pnr} = {producto.stock}")
         
         print("✓ Transacción atómica completada exitosamente\n")
         
@@ -143,8 +136,8 @@ def crear_producto_pnr_view(request, object_id):
                 precio_compra=Decimal(precio_compra),
                 costo_transporte=costo_transporte_final,
                 precio_venta=Decimal(precio_venta),
-                stock=int(pnr.cantidad or 0),
             )
+            mover_stock(producto, int(pnr.cantidad or 0), "pnr", referencia=f"Compra {compra.folio or compra.pk}")
             
             CompraProducto.objects.create(
                 compra=compra,
@@ -93,6 +93,16 @@ DATABASES = {
     }
 }
 
+# Caché compartido entre procesos (web y `worker: procesar_tareas`): las métricas
+# de reportes se invalidan desde cualquiera de los dos. La tabla la crea la
+# migración reportes/0002 (equivale a `manage.py createcachetable`).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_compartido',
+    }
+}
+
 # Validación de contraseñas
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -1,7 +1,9 @@
 class ExtractorBase:
-    def __init__(self, text, pdf_path):
+    def __init__(self, text, pdf_path, documento=None):
         self.text = text
         self.pdf_path = pdf_path
+        # DocumentoPDF compartido (compras.extractors.pdf_reader) para no volver a abrir el PDF
+        self.documento = documento
 
     def parse(self):
         raise NotImplementedError("Cada extractor debe implementar el método parse()")
@@ -2,7 +2,7 @@
 import os
 import re
 from decimal import Decimal, InvalidOperation
-from pdfminer.high_level import extract_text
+from compras.extractors.pdf_reader import DocumentoPDF
 
 VERSION = "VB-2025-11-12b"
 DEBUG = os.getenv("NV_DEBUG") in {"1", "true", "True"}
@@ -25,13 +25,15 @@ class ExtractorViejaBodega:
 
     _TAX_RATES = {Decimal("16.00"), Decimal("26.50")}  # tasas a ignorar en qty/tokens
 
-    def __init__(self, text: str = None, pdf_path: str = None):
+    def __init__(self, text: str = None, pdf_path: str = None, documento: DocumentoPDF = None):
         """
         Inicializa el extractor.
         Args:
             text: Texto extraído del PDF (no se usa, se mantiene por compatibilidad)
             pdf_path: Ruta al archivo PDF
+            documento: DocumentoPDF ya abierto (evita volver a leer/parsear el archivo)
         """
+        self.documento = documento
         # Soportar ambas firmas: (pdf_path) y (text, pdf_path)
         if text is not None and pdf_path is None:
             # Llamada antigua: ExtractorViejaBodega(pdf_path)
@@ -47,7 +49,9 @@ class ExtractorViejaBodega:
         return None
 
     def parse(self) -> dict:
-        text = extract_text(self.pdf_path) or ""
+        # Este extractor necesita el orden de layout de pdfminer (no el texto de PyMuPDF)
+        documento = self.documento or DocumentoPDF(self.pdf_path)
+        text = documento.texto_pdfminer or ""
         raw_lines = text.splitlines()
         lines = [re.sub(r"\s+", " ", l).strip() for l in raw_lines]
         lines = [l for l in lines if l]
@@ -1,6 +1,6 @@
 import dotenv
 dotenv.load_dotenv()
-from compras.extractors.pdf_reader import extract_text_from_pdf
+from compras.extractors.pdf_reader import DocumentoPDF
 from extractors.secretos_delavid import ExtractorSecretosDeLaVid
 from extractors.vieja_bodega import ExtractorViejaBodega
 from extractors.distribuidora_secocha import ExtractorDistribuidoraSecocha
@@ -9,18 +9,35 @@ from extractors.extractor_base import ExtractorBase
 
 
 
-def extract_invoice_data(pdf_path):
-    text = extract_text_from_pdf(pdf_path)
+def _es_vieja_bodega(text):
+    return "VBM041202DD1" in text or "VIEJA BODEGA" in text
+
+
+def preparar_documento(documento):
+    """
+    Calcula por adelantado las extracciones de texto que usará extract_invoice_data
+    (PyMuPDF siempre; pdfminer solo para Vieja Bodega). Es la parte pesada en CPU
+    y no toca la BD, así que puede correr en otro proceso (ver compras.utils.drive_pipeline).
+    """
+    if _es_vieja_bodega(documento.texto):
+        documento.texto_pdfminer
+    return documento
+
+
+def extract_invoice_data(pdf_path, documento=None):
+    # El PDF se abre una sola vez; el extractor que gane recibe el mismo documento
+    documento = documento or DocumentoPDF(pdf_path)
+    text = documento.texto
 
     # Despachador por RFC o nombre clave
     if "SVI180726AHA" in text or "SECRETOS DE LA VID" in text:
-        extractor = ExtractorSecretosDeLaVid(text, pdf_path)
-    elif "VBM041202DD1" in text or "VIEJA BODEGA" in text:
-        extractor = ExtractorViejaBodega(text, pdf_path)
+        extractor = ExtractorSecretosDeLaVid(text, pdf_path, documento=documento)
+    elif _es_vieja_bodega(text):
+        extractor = ExtractorViejaBodega(text, pdf_path, documento=documento)
     elif "DSE190423J82" in text or "DISTRIBUIDORA SECOCHA" in text:
-        extractor = ExtractorDistribuidoraSecocha(text, pdf_path)
+        extractor = ExtractorDistribuidoraSecocha(text, pdf_path, documento=documento)
     elif "CDO200903RR1" in text or "OLI CORP" in text:
-        extractor = ExtractorOliCorp(text, pdf_path)
+        extractor = ExtractorOliCorp(text, pdf_path, documento=documento)
     else:
         # Mensaje claro indicando que debe registrarse manualmente
         raise ValueError(
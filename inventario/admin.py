@@ -1,11 +1,12 @@
 from django.contrib import admin, messages
 from django.db import transaction
-from django.shortcuts import render, redirect
-from django.http import HttpResponseRedirect
+from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import path, reverse
 from django import forms
 from django.utils.html import format_html, format_html_join
-from .models import Producto, AliasProducto, ProductoNoReconocido, LogFusionProductos
+from .models import Producto, AliasProducto, ProductoNoReconocido, LogFusionProductos, TareaSegundoPlano, MovimientoInventario
+from .tareas import TIPOS_TAREA
 from .fusion import fusionar_productos_suave, fusionar_multiples_productos, deshacer_fusion, validar_fusion
 import json
 
@@ -584,3 +585,90 @@ class LogFusionProductosAdmin(admin.ModelAdmin):
     def has_module_permission(self, request):
         # Ocultar del menú lateral, pero mantener accesible por URL
         return False
+
+
+@admin.register(MovimientoInventario)
+class MovimientoInventarioAdmin(admin.ModelAdmin):
+    """Bitácora de stock: solo lectura (los movimientos se registran vía inventario/stock.py)."""
+    list_display = ('fecha', 'producto', 'tipo', 'cantidad', 'referencia')
+    list_filter = ('tipo', 'fecha')
+    search_fields = ('producto__nombre', 'referencia')
+    list_select_related = ('producto',)
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TareaSegundoPlano)
+class TareaSegundoPlanoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo_display', 'estado', 'progreso_display', 'creada_por', 'creada_en', 'terminada_en')
+    list_filter = ('estado', 'tipo')
+    readonly_fields = (
+        'tipo', 'parametros', 'estado', 'total', 'procesados', 'exitosos', 'duplicados', 'errores',
+        'resultado', 'mensaje_error', 'worker', 'creada_por', 'creada_en', 'iniciada_en', 'latido_en', 'terminada_en',
+    )
+
+    def tipo_display(self, obj):
+        return obj.get_tipo_display()
+    tipo_display.short_description = "Tipo"
+
+    def progreso_display(self, obj):
+        return format_html(
+            '<a href="{}">{} / {} ({}%)</a>',
+            reverse('admin:inventario_tareasegundoplano_progreso', args=[obj.pk]),
+            obj.procesados, obj.total, obj.porcentaje,
+        )
+    progreso_display.short_description = "Progreso"
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:tarea_id>/progreso/', self.admin_site.admin_view(self.progreso_view), name='inventario_tareasegundoplano_progreso'),
+            path('<int:tarea_id>/estado/', self.admin_site.admin_view(self.estado_view), name='inventario_tareasegundoplano_estado'),
+        ]
+        return custom_urls + urls
+
+    def progreso_view(self, request, tarea_id):
+        """Página de progreso; se actualiza sola consultando estado_view."""
+        tarea = get_object_or_404(TareaSegundoPlano, pk=tarea_id)
+        volver = TIPOS_TAREA.get(tarea.tipo, {}).get('volver')
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f"{tarea.get_tipo_display()} #{tarea.pk}",
+            'tarea': tarea,
+            'estado_url': reverse('admin:inventario_tareasegundoplano_estado', args=[tarea.pk]),
+            'volver_url': reverse(volver) if volver else reverse('admin:index'),
+        }
+        return render(request, 'admin/inventario/tarea_progreso.html', context)
+
+    def estado_view(self, request, tarea_id):
+        """Estado de la tarea en JSON (lo consulta la página de progreso)."""
+        tarea = get_object_or_404(TareaSegundoPlano, pk=tarea_id)
+        details = (tarea.resultado or {}).get('details', []) if isinstance(tarea.resultado, dict) else []
+        return JsonResponse({
+            'estado': tarea.estado,
+            'estado_display': tarea.get_estado_display(),
+            'terminada': tarea.terminada,
+            'total': tarea.total,
+            'procesados': tarea.procesados,
+            'exitosos': tarea.exitosos,
+            'duplicados': tarea.duplicados,
+            'errores': tarea.errores,
+            'porcentaje': tarea.porcentaje,
+            'detalles_error': [
+                {'file': d.get('file'), 'error': (d.get('error') or '')[:200]}
+                for d in details if d.get('status') == 'error'
+            ][:20],
+            'mensaje_error': tarea.mensaje_error.split('\n')[0] if tarea.mensaje_error else '',
+        })
+
+    def has_add_permission(self, request):
+        # Las tareas se crean desde los botones "Procesar Drive"
+        return False
@@ -0,0 +1,69 @@
+# inventario/buscador_productos.py
+"""
+Selector de producto con búsqueda bajo demanda para los widgets de revisión de
+PNR (compras y ventas).
+
+El <select> se siembra con las sugerencias del índice de catálogo para el
+nombre detectado; al teclear en el buscador se piden las opciones a
+`api_buscar_productos` (JSON) en lugar de incrustar el catálogo en la página.
+"""
+from html import escape
+
+from django.urls import reverse
+
+
+def _texto_opcion(prod, score, mostrar_stock: bool) -> str:
+    texto = prod.nombre
+    if mostrar_stock:
+        texto += f" (Stock: {prod.stock})"
+    return escape(f"{texto} - {score:.0%}")
+
+
+def render_selector_producto(pnr, sugeridos, mostrar_stock: bool = False) -> str:
+    """HTML del buscador + <select id="producto_id_<pnr.id>"> sembrado con `sugeridos` [(Producto, score)]."""
+    partes = [
+        f'<input type="search" placeholder="Buscar producto..." autocomplete="off" '
+        f'data-select-id="producto_id_{pnr.id}" data-pnr-id="{pnr.id}" '
+        f'data-url="{reverse("api_buscar_productos")}" data-stock="{1 if mostrar_stock else 0}" '
+        f'oninput="buscarProductosPNR(this)" '
+        f'style="width: 100%; padding: 6px; font-size: 0.85em; margin-bottom: 4px; border: 1px solid #ccc; border-radius: 3px;" />'
+        f'<select id="producto_id_{pnr.id}" required style="width: 100%; padding: 6px; font-size: 0.85em; margin-bottom: 6px; border: 1px solid #ccc; border-radius: 3px;">'
+        f'<option value="">-- Selecciona producto --</option>'
+    ]
+    if sugeridos:
+        partes.append('<optgroup label="Sugeridos">')
+        for prod, score in sugeridos:
+            partes.append(f'<option value="{prod.id}">{_texto_opcion(prod, score, mostrar_stock)}</option>')
+        partes.append('</optgroup>')
+    partes.append('</select>')
+    return "".join(partes)
+
+
+# Una sola vez por widget. Espera 250 ms tras la última tecla; con el buscador
+# vacío vuelve a pedir las sugerencias del PNR.
+SCRIPT_BUSCADOR_PRODUCTOS = (
+    "<script>"
+    "function buscarProductosPNR(input) {"
+        "clearTimeout(input._timer);"
+        "input._timer = setTimeout(function () {"
+            "const q = input.value.trim();"
+            "const params = new URLSearchParams(q ? {q: q} : {pnr: input.dataset.pnrId});"
+            "fetch(input.dataset.url + '?' + params, {credentials: 'same-origin'})"
+                ".then(function (r) { return r.json(); })"
+                ".then(function (data) {"
+                    "if (input.value.trim() !== q) { return; }"
+                    "const select = document.getElementById(input.dataset.selectId);"
+                    "while (select.children.length > 1) { select.removeChild(select.lastChild); }"
+                    "const grupo = document.createElement('optgroup');"
+                    "grupo.label = q ? 'Resultados' : 'Sugeridos';"
+                    "data.resultados.forEach(function (p) {"
+                        "let texto = p.nombre;"
+                        "if (input.dataset.stock === '1') { texto += ' (Stock: ' + p.stock + ')'; }"
+                        "grupo.appendChild(new Option(texto + ' - ' + Math.round(p.score * 100) + '%', p.id));"
+                    "});"
+                    "select.appendChild(grupo);"
+                "});"
+        "}, 250);"
+    "}"
+    "</script>"
+)
@@ -6,6 +6,7 @@ from django.db import transaction
 from django.utils import timezone
 from decimal import Decimal
 from .models import Producto, AliasProducto, LogFusionProductos
+from .stock import registrar_movimientos
 
 
 def validar_fusion(producto_principal, producto_secundario):
@@ -103,15 +104,21 @@ def fusionar_productos_suave(producto_principal, producto_secundario, usuario,
     
     try:
         with transaction.atomic():
-            # 1. Transferir stock
+            # 1. Transferir stock (dos movimientos en la bitácora, un solo UPDATE)
             stock_transferido = producto_secundario.stock or 0
-            producto_principal.stock = (producto_principal.stock or 0) + stock_transferido
+            referencia = f"Fusión {producto_secundario.nombre} → {producto_principal.nombre}"
+            registrar_movimientos(
+                {producto_principal.pk: stock_transferido, producto_secundario.pk: -stock_transferido},
+                "fusion", referencia=referencia,
+            )
+            for producto, delta in ((producto_principal, stock_transferido), (producto_secundario, -stock_transferido)):
+                producto.stock = (producto.stock or 0) + delta
+                producto._stock_cargado = producto.stock
             
             # 2. Marcar secundario como fusionado
             producto_secundario.activo = False
             producto_secundario.fusionado_en = producto_principal
             producto_secundario.fecha_fusion = timezone.now()
-            producto_secundario.stock = 0  # Stock se transfirió
             
             # 3. Crear alias del nombre secundario
             alias_creado = False
@@ -212,9 +219,12 @@ def deshacer_fusion(producto_fusionado, restaurar_stock=True, usuario=None):
             # Restaurar stock si se solicita
             if restaurar_stock and stock_a_restaurar > 0:
                 if producto_principal.stock >= stock_a_restaurar:
-                    producto_principal.stock -= stock_a_restaurar
-                    producto_fusionado.stock = stock_a_restaurar
-                    producto_principal.save()
+                    registrar_movimientos(
+                        {producto_principal.pk: -stock_a_restaurar, producto_fusionado.pk: stock_a_restaurar},
+                        "fusion", referencia=f"Deshacer fusión {producto_fusionado.nombre}",
+                    )
+                    producto_fusionado.stock = (producto_fusionado.stock or 0) + stock_a_restaurar
+                    producto_fusionado._stock_cargado = producto_fusionado.stock
                 else:
                     return {
                         'success': False,
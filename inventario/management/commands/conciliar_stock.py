@@ -0,0 +1,37 @@
+"""
+Concilia Producto.stock contra la bitácora MovimientoInventario.
+
+El stock esperado de cada producto es la suma de sus movimientos; se calcula en
+una sola consulta agregada (subconsulta con SUM por producto).
+
+Uso:
+    python manage.py conciliar_stock              # solo reporta los descuadres
+    python manage.py conciliar_stock --aplicar    # fija stock = suma de la bitácora
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventario.stock import productos_descuadrados, recalcular_stock_desde_movimientos
+
+
+class Command(BaseCommand):
+    help = "Compara el stock de cada producto con la suma de su bitácora de movimientos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--aplicar", action="store_true",
+                            help="Recalcula el stock de todos los productos desde la bitácora")
+
+    def handle(self, *args, **options):
+        descuadrados = list(productos_descuadrados().values_list("id", "nombre", "stock", "stock_bitacora"))
+        for pid, nombre, stock, esperado in descuadrados:
+            self.stdout.write(f"  {nombre} (id {pid}): stock={stock} bitácora={esperado} diferencia={stock - esperado:+d}")
+
+        if not descuadrados:
+            self.stdout.write(self.style.SUCCESS("✓ El stock cuadra con la bitácora"))
+            return
+
+        self.stdout.write(self.style.WARNING(f"{len(descuadrados)} producto(s) descuadrado(s)"))
+        if options["aplicar"]:
+            with transaction.atomic():
+                recalcular_stock_desde_movimientos()
+            self.stdout.write(self.style.SUCCESS("✓ Stock recalculado desde la bitácora"))
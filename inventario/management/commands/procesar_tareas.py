@@ -0,0 +1,40 @@
+"""
+Worker de la cola de tareas en segundo plano (TareaSegundoPlano).
+
+Uso:
+    python manage.py procesar_tareas              # corre indefinidamente
+    python manage.py procesar_tareas --una-vez    # vacía la cola y termina (cron)
+    python manage.py procesar_tareas --intervalo 10
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventario.tareas import nombre_worker, procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = "Ejecuta las tareas en segundo plano pendientes (p.ej. Procesar Drive desde el admin)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--una-vez", action="store_true", help="Procesa lo pendiente y termina")
+        parser.add_argument("--intervalo", type=float, default=5.0, help="Segundos entre consultas a la cola (default 5)")
+        parser.add_argument("--max-tareas", type=int, default=None, help="Termina después de N tareas")
+
+    def handle(self, *args, **options):
+        worker = nombre_worker()
+        max_tareas = options["max_tareas"]
+        total = 0
+        self.stdout.write(f"Worker {worker} esperando tareas...")
+        while True:
+            close_old_connections()
+            restantes = None if max_tareas is None else max_tareas - total
+            ejecutadas = procesar_pendientes(worker, max_tareas=restantes)
+            total += ejecutadas
+            if ejecutadas:
+                self.stdout.write(self.style.SUCCESS(f"✓ {ejecutadas} tarea(s) ejecutada(s)"))
+            if options["una_vez"] or (max_tareas is not None and total >= max_tareas):
+                break
+            time.sleep(options["intervalo"])
+        self.stdout.write(f"Worker {worker} terminó ({total} tarea(s)).")
@@ -0,0 +1,32 @@
+"""
+Recalcula las columnas de saldo materializadas (total_pagado_cache, saldo_cache,
+estado_pago_cache) de facturas de venta y compras. Las migraciones que las agregan
+ya las llenan; esto es para repararlas si quedaron desfasadas (p.ej. tras cargar
+pagos con SQL directo). Ver utils/saldos.py.
+
+Uso:
+    python manage.py recalcular_saldos
+    python manage.py recalcular_saldos --solo ventas
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from compras.models import Compra
+from utils.saldos import recalcular_saldos_en_lote
+from ventas.models import Factura
+
+
+class Command(BaseCommand):
+    help = "Recalcula total pagado, saldo y estado de pago materializados de facturas y compras"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--solo", choices=["ventas", "compras"], help="Recalcular solo un tipo")
+        parser.add_argument("--lote", type=int, default=500, help="Filas por bulk_update (default 500)")
+
+    def handle(self, *args, **options):
+        modelos = {"ventas": Factura, "compras": Compra}
+        claves = [options["solo"]] if options["solo"] else list(modelos)
+        for clave in claves:
+            with transaction.atomic():
+                cambiadas = recalcular_saldos_en_lote(modelos[clave].objects.all(), batch_size=options["lote"])
+            self.stdout.write(self.style.SUCCESS(f"✓ {clave}: {cambiadas} registro(s) actualizado(s)"))
@@ -0,0 +1,51 @@
+"""
+Sondeo incremental de las carpetas "Nuevas" de Google Drive.
+
+Solo procesa los PDFs que llegaron desde la corrida anterior (API de cambios de
+Drive, ver compras/utils/drive_changes.py). Pensado para correr desde cron o como
+proceso aparte.
+
+Uso:
+    python manage.py sondear_drive                    # compras y ventas, una vez
+    python manage.py sondear_drive --solo compras
+    python manage.py sondear_drive --intervalo 300    # repite cada 5 minutos
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+def _procesador(clave):
+    if clave == "compras":
+        from compras.utils.drive_processor import DriveInvoiceProcessor
+        return DriveInvoiceProcessor(validation_mode="lenient")
+    from ventas.utils.drive_processor import DriveVentasProcessor
+    return DriveVentasProcessor()
+
+
+class Command(BaseCommand):
+    help = "Procesa solo las facturas nuevas en Drive desde la última corrida (modo incremental)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--solo", choices=["compras", "ventas"], help="Sondear solo una carpeta")
+        parser.add_argument("--intervalo", type=float, default=None,
+                            help="Segundos entre sondeos; sin esta opción corre una sola vez")
+
+    def handle(self, *args, **options):
+        claves = [options["solo"]] if options["solo"] else ["compras", "ventas"]
+        while True:
+            close_old_connections()
+            for clave in claves:
+                try:
+                    resultado = _procesador(clave).process_all_invoices(move_files=True, incremental=True)
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"✗ {clave}: {type(e).__name__}: {e}"))
+                    continue
+                self.stdout.write(
+                    f"{clave}: {resultado['total']} nuevo(s), {resultado['success']} registrada(s), "
+                    f"{resultado.get('duplicate', 0)} duplicada(s), {resultado['error']} error(es)"
+                )
+            if options["intervalo"] is None:
+                break
+            time.sleep(options["intervalo"])
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.2 on 2026-10-18 10:12
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Copia congelada de inventario.utils.normalize_text al crear esta migración:
+# si el normalizador cambia después, esta migración debe seguir dando lo mismo.
+_SPACES_RE = re.compile(r"\s+")
+_PUNCT_SOFT_RE = re.compile(r"[.\u00B7\u2022•·]+$")
+
+
+def normalize_text(s):
+    if not s:
+        return ""
+    s = s.strip()
+    s = _PUNCT_SOFT_RE.sub("", s)
+    s = _SPACES_RE.sub(" ", s)
+    s = "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+    s = s.lower()
+    s = re.sub(r"\b(\d+)\s*mes(?:es)?\b", r"\1m", s, flags=re.IGNORECASE)
+    s = re.sub(r"\b(\d+)\s*m\b", r"\1m", s, flags=re.IGNORECASE)
+    return s
+
+
+def poblar_normalizados(apps, schema_editor):
+    """Calcula nombre_normalizado / alias_normalizado para las filas existentes."""
+    Producto = apps.get_model('inventario', 'Producto')
+    AliasProducto = apps.get_model('inventario', 'AliasProducto')
+
+    productos = list(Producto.objects.only('id', 'nombre'))
+    for p in productos:
+        p.nombre_normalizado = normalize_text(p.nombre or '')
+    Producto.objects.bulk_update(productos, ['nombre_normalizado'], batch_size=500)
+
+    aliases = list(AliasProducto.objects.only('id', 'alias'))
+    for a in aliases:
+        a.alias_normalizado = normalize_text(a.alias or '')
+    AliasProducto.objects.bulk_update(aliases, ['alias_normalizado'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0014_modificar_log_fusion_productos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aliasproducto',
+            name='alias_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='nombre_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(poblar_normalizados, migrations.RunPython.noop),
+    ]
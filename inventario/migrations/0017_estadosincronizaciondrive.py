@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_tareasegundoplano'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoSincronizacionDrive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=50, unique=True)),
+                ('page_token', models.CharField(blank=True, default='', max_length=255)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estado de sincronización de Drive',
+                'verbose_name_plural': 'Estados de sincronización de Drive',
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def crear_saldos_iniciales(apps, schema_editor):
+    """Un movimiento 'saldo_inicial' por producto con stock, para que la bitácora cuadre desde hoy."""
+    Producto = apps.get_model("inventario", "Producto")
+    MovimientoInventario = apps.get_model("inventario", "MovimientoInventario")
+    MovimientoInventario.objects.bulk_create(
+        (
+            MovimientoInventario(producto_id=pid, cantidad=stock, tipo="saldo_inicial",
+                                 referencia="Stock al crear la bitácora")
+            for pid, stock in Producto.objects.exclude(stock=0).values_list("id", "stock").iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0017_estadosincronizaciondrive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField(help_text='Positivo = entrada, negativo = salida')),
+                ('tipo', models.CharField(choices=[('saldo_inicial', 'Saldo inicial'), ('compra', 'Compra'), ('venta', 'Venta'), ('cancelacion_compra', 'Cancelación de compra'), ('cancelacion_venta', 'Cancelación de venta'), ('pnr', 'Asignación de PNR'), ('fusion', 'Fusión de productos'), ('ajuste', 'Ajuste manual / conteo físico')], max_length=20)),
+                ('referencia', models.CharField(blank=True, default='', help_text='Folio o descripción del origen', max_length=100)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventario.producto')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de inventario',
+                'verbose_name_plural': 'Movimientos de inventario',
+                'ordering': ['-fecha', '-id'],
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='inventario__product_fadacf_idx')],
+            },
+        ),
+        migrations.RunPython(crear_saldos_iniciales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0018_movimientoinventario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productonoreconocido',
+            index=models.Index(fields=['uuid_factura', 'origen', 'procesado'], name='pnr_uuid_origen_proc_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0019_pnr_uuid_origen_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tareasegundoplano',
+            name='latido_en',
+            field=models.DateTimeField(blank=True, help_text='Última señal de vida del worker (se renueva con cada avance)', null=True),
+        ),
+    ]
@@ -1,11 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from compras.models import Proveedor  # Importamos el modelo de Proveedor
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.db.models.functions import Lower
+from django.db.models.functions import Coalesce, Lower
 from django.apps import apps
 from decimal import Decimal
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 
 # Manager personalizado para productos activos
 class ProductoActivoManager(models.Manager):
@@ -15,6 +16,8 @@ class ProductoActivoManager(models.Manager):
 
 class Producto(models.Model):
     nombre = models.CharField(max_length=100)
+    # normalize_text(nombre), mantenido en save(); permite match exacto indexado en BD
+    nombre_normalizado = models.CharField(max_length=255, blank=True, default="", editable=False, db_index=True)
     uva = models.CharField(max_length=100, null=True, blank=True)  # Tipo de uva (puede ser opcional)
     tipo = models.CharField(max_length=50, choices=[('tinto', 'Tinto'), ('blanco', 'Blanco'), ('rosado', 'Rosado')], null=True, blank=True)
     descripcion = models.TextField(null=True, blank=True)
@@ -55,6 +58,48 @@ class Producto(models.Model):
     
     def __str__(self):
         return self.nombre
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Stock leído de la BD: save() lo usa para no pisar movimientos hechos con F()
+        instancia._stock_cargado = instancia.__dict__.get("stock")
+        return instancia
+
+    def save(self, *args, **kwargs):
+        from inventario.utils import normalize_text
+        self.nombre_normalizado = normalize_text(self.nombre or "")
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "nombre" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "nombre_normalizado"}
+
+        # Stock: en un UPDATE nunca se escribe el valor absoluto (otro proceso pudo
+        # moverlo con F() desde que se leyó). Si cambió a mano (admin, CSV), la
+        # diferencia se aplica con mover_stock como ajuste; en el alta se escribe tal
+        # cual y queda en la bitácora.
+        insertando = self._state.adding or kwargs.get("force_insert")
+        cargado = None if insertando else getattr(self, "_stock_cargado", None)
+        delta = 0
+        if (update_fields is None or "stock" in update_fields) and (insertando or cargado is not None):
+            delta = (self.stock or 0) - (cargado or 0)
+            if not insertando:
+                if update_fields is None:
+                    kwargs["update_fields"] = [
+                        f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != "stock"
+                    ]
+                else:
+                    kwargs["update_fields"] = [f for f in kwargs["update_fields"] if f != "stock"]
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if delta and insertando:
+                MovimientoInventario.objects.create(
+                    producto=self, cantidad=delta, tipo="ajuste", referencia="Edición de producto"
+                )
+            elif delta:
+                from inventario.stock import mover_stock
+                self.stock = cargado
+                mover_stock(self, delta, "ajuste", referencia="Edición de producto")
+        self._stock_cargado = self.stock
     
     # Métodos para gestión de fusiones
     @property
@@ -81,8 +126,18 @@ class Producto(models.Model):
 
 class AliasProducto(models.Model):
     alias = models.CharField(max_length=255, unique=False)  # dejamos unique=False y ponemos UniqueConstraint CI abajo
+    # normalize_text(alias), mantenido en save(); permite match exacto indexado en BD
+    alias_normalizado = models.CharField(max_length=255, blank=True, default="", editable=False, db_index=True)
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="aliases")
 
+    def save(self, *args, **kwargs):
+        from inventario.utils import normalize_text
+        self.alias_normalizado = normalize_text(self.alias or "")
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "alias" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "alias_normalizado"}
+        super().save(*args, **kwargs)
+
     def clean(self):
         """Evita cruces: alias igual a nombre de otro producto distinto."""
         texto = (self.alias or "").strip()
@@ -144,9 +199,33 @@ class ProductoNoReconocido(models.Model):
     precio_unitario = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
     movimiento_generado = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Conteo de pendientes por factura en los listados del admin
+            models.Index(fields=["uuid_factura", "origen", "procesado"], name="pnr_uuid_origen_proc_idx"),
+        ]
+
     def __str__(self):
         return f"{self.nombre_detectado} ({'Procesado' if self.procesado else 'Pendiente'})"
 
+    @classmethod
+    def pendientes_por_factura(cls, campo_uuid: str = "uuid_factura", origen=None):
+        """
+        Expresión con el número de PNR sin procesar de cada factura/compra (su UUID
+        está en `campo_uuid`), para anotar querysets: evita un count() por fila.
+        """
+        filtro = {"uuid_factura": models.OuterRef(campo_uuid), "procesado": False}
+        if origen:
+            filtro["origen"] = origen
+        conteo = (
+            cls.objects.filter(**filtro)
+            .order_by()
+            .values("uuid_factura")
+            .annotate(n=models.Count("id"))
+            .values("n")
+        )
+        return Coalesce(models.Subquery(conteo, output_field=models.IntegerField()), models.Value(0))
+
     def procesar_a_stock(self):
         """
         - Si hay producto y está marcado como procesado, ingresa a stock.
@@ -172,10 +251,11 @@ class ProductoNoReconocido(models.Model):
             cant = Decimal("1")
         costo = self.precio_unitario or Decimal("0")
 
-        # 1) Aumentar stock del producto (tu modelo Producto tiene campo 'stock')
+        # 1) Aumentar stock del producto (movimiento atómico en la bitácora)
+        from inventario.stock import mover_stock
         prod = self.producto
         stock_antes = prod.stock or 0
-        prod.stock = stock_antes + int(cant)
+        mover_stock(prod, int(cant), "pnr", referencia=f"PNR {self.id} {self.nombre_detectado}")
         logger.warning(
             f"[procesar_a_stock] SUMANDO STOCK: {prod.nombre} "
             f"antes={stock_antes} cantidad={int(cant)} despues={prod.stock}"
@@ -186,11 +266,9 @@ class ProductoNoReconocido(models.Model):
             prov_name = (getattr(prod.proveedor, "nombre", "") or "").strip().lower()
             if prov_name.startswith("vieja bodega") and (prod.costo_transporte is None or prod.costo_transporte == Decimal("0")):
                 prod.costo_transporte = Decimal("28")
-                prod.save(update_fields=["stock", "costo_transporte"])
-            else:
-                prod.save(update_fields=["stock"])
+                prod.save(update_fields=["costo_transporte"])
         except Exception:
-            prod.save(update_fields=["stock"])
+            pass
 
         # 2) Crear detalle de compra si existe una Compra ligada por UUID
         Compra = apps.get_model("compras", "Compra")
@@ -290,4 +368,122 @@ class LogFusionProductos(models.Model):
             f"{self.producto_secundario_nombre} → "
             f"{principal_nombre} "
             f"({self.fecha_fusion.strftime('%Y-%m-%d')})"
-        )
\ No newline at end of file
+        )
+
+class TareaSegundoPlano(models.Model):
+    """
+    Trabajo largo (p.ej. procesar las facturas de Drive) que corre fuera del request.
+    El admin la encola y un worker (`manage.py procesar_tareas`) la ejecuta;
+    la página de progreso consulta los contadores mientras avanza.
+    Los tipos disponibles y su ejecutor están en inventario/tareas.py.
+    """
+    ESTADO_PENDIENTE = "pendiente"
+    ESTADO_EN_PROCESO = "en_proceso"
+    ESTADO_COMPLETADA = "completada"
+    ESTADO_ERROR = "error"
+    ESTADOS = [
+        (ESTADO_PENDIENTE, "Pendiente"),
+        (ESTADO_EN_PROCESO, "En proceso"),
+        (ESTADO_COMPLETADA, "Completada"),
+        (ESTADO_ERROR, "Error"),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=ESTADO_PENDIENTE, db_index=True)
+
+    # Progreso (se actualiza archivo por archivo)
+    total = models.PositiveIntegerField(default=0)
+    procesados = models.PositiveIntegerField(default=0)
+    exitosos = models.PositiveIntegerField(default=0)
+    duplicados = models.PositiveIntegerField(default=0)
+    errores = models.PositiveIntegerField(default=0)
+
+    resultado = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    mensaje_error = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True, help_text="Worker que tomó la tarea")
+
+    creada_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    creada_en = models.DateTimeField(auto_now_add=True)
+    iniciada_en = models.DateTimeField(null=True, blank=True)
+    latido_en = models.DateTimeField(null=True, blank=True, help_text="Última señal de vida del worker (se renueva con cada avance)")
+    terminada_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creada_en"]
+        verbose_name = "Tarea en segundo plano"
+        verbose_name_plural = "Tareas en segundo plano"
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.get_estado_display()})"
+
+    def get_tipo_display(self):
+        from inventario.tareas import TIPOS_TAREA
+        return TIPOS_TAREA.get(self.tipo, {}).get("nombre", self.tipo)
+
+    @property
+    def terminada(self):
+        return self.estado in (self.ESTADO_COMPLETADA, self.ESTADO_ERROR)
+
+    @property
+    def porcentaje(self):
+        if not self.total:
+            return 100 if self.terminada else 0
+        return int(self.procesados * 100 / self.total)
+
+
+class EstadoSincronizacionDrive(models.Model):
+    """
+    Último page token de la API de cambios de Google Drive por carpeta vigilada
+    ("compras", "ventas"). El modo incremental solo pide los cambios posteriores
+    a este token en lugar de listar toda la carpeta (ver compras/utils/drive_changes.py).
+    """
+    clave = models.CharField(max_length=50, unique=True)
+    page_token = models.CharField(max_length=255, blank=True, default="")
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Estado de sincronización de Drive"
+        verbose_name_plural = "Estados de sincronización de Drive"
+
+    def __str__(self):
+        return f"{self.clave}: {self.page_token or '(sin token)'}"
+
+
+class MovimientoInventario(models.Model):
+    """
+    Bitácora de solo inserción de los cambios de stock. Cada entrada/salida se
+    registra aquí y se aplica a Producto.stock con un UPDATE atómico (F()); la
+    suma de `cantidad` por producto debe coincidir con su stock (ver
+    inventario/stock.py y `manage.py conciliar_stock`).
+    """
+    TIPOS = [
+        ("saldo_inicial", "Saldo inicial"),
+        ("compra", "Compra"),
+        ("venta", "Venta"),
+        ("cancelacion_compra", "Cancelación de compra"),
+        ("cancelacion_venta", "Cancelación de venta"),
+        ("pnr", "Asignación de PNR"),
+        ("fusion", "Fusión de productos"),
+        ("ajuste", "Ajuste manual / conteo físico"),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="movimientos")
+    cantidad = models.IntegerField(help_text="Positivo = entrada, negativo = salida")
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    referencia = models.CharField(max_length=100, blank=True, default="", help_text="Folio o descripción del origen")
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["-fecha", "-id"]
+        indexes = [models.Index(fields=["producto", "fecha"])]
+        verbose_name = "Movimiento de inventario"
+        verbose_name_plural = "Movimientos de inventario"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError("Los movimientos de inventario no se modifican; registra uno nuevo.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} {self.producto_id}"
@@ -1,12 +1,32 @@
 # inventario/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.apps import apps
 import logging
 
+from inventario.utils import invalidar_catalogo_index
+
 logger = logging.getLogger(__name__)
 
 PNR = apps.get_model("inventario", "ProductoNoReconocido")
+Producto = apps.get_model("inventario", "Producto")
+AliasProducto = apps.get_model("inventario", "AliasProducto")
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=AliasProducto)
+@receiver(post_delete, sender=AliasProducto)
+def invalidar_indice_catalogo(sender, **kwargs):
+    """
+    Cualquier alta/cambio/baja de producto o alias invalida el índice en memoria
+    de encontrar_producto_unico. Se invalida también al confirmar la transacción
+    para no conservar un índice construido con filas que luego hicieron rollback.
+    """
+    invalidar_catalogo_index()
+    transaction.on_commit(invalidar_catalogo_index)
+
 
 @receiver(post_save, sender=PNR)
 def producto_no_reconocido_post_save(sender, instance, created, **kwargs):
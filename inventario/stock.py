@@ -0,0 +1,119 @@
+"""
+Servicio único para mover stock.
+
+Todo cambio de stock pasa por aquí y queda en la bitácora MovimientoInventario
+(solo inserción). En lugar de `producto.stock = producto.stock + n; producto.save()`
+(que pierde movimientos si dos procesos escriben a la vez), cada lote se aplica con
+un UPDATE ... SET stock = stock + n (F()), y sus movimientos se insertan con
+bulk_create en la misma transacción. `manage.py conciliar_stock` compara el stock
+contra la suma de la bitácora.
+
+    mover_stock(producto, -3, "venta", referencia="Factura 1160")
+    registrar_movimientos({prod_a.id: 12, prod_b.id: 6}, "compra", referencia="Compra F-88")
+    fijar_stock(producto, 40, referencia="Conteo físico")
+"""
+from typing import Dict, Optional, Union
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import MovimientoInventario, Producto
+
+
+def _aplicar_deltas(deltas: Dict[int, int]) -> int:
+    """Un solo UPDATE con F() para todo el lote (no dispara signals de Producto)."""
+    if len(deltas) == 1:
+        (pid, delta), = deltas.items()
+        return Producto.objects.filter(pk=pid).update(stock=F("stock") + delta)
+    return Producto.objects.filter(pk__in=deltas).update(
+        stock=Case(
+            *[When(pk=pid, then=F("stock") + delta) for pid, delta in deltas.items()],
+            default=F("stock"),
+            output_field=IntegerField(),
+        )
+    )
+
+
+@transaction.atomic(savepoint=False)
+def registrar_movimientos(
+    deltas: Dict[int, int], tipo: str, referencia: str = "", minimo: Optional[int] = None
+) -> Dict[int, int]:
+    """
+    Suma `deltas[producto_id]` (positivo o negativo) al stock de cada producto y
+    registra un MovimientoInventario por producto.
+
+    Con `minimo` el stock no baja de ese valor (las ventas usan 0): las filas se
+    bloquean con select_for_update y se registra la cantidad realmente aplicada,
+    para que la bitácora siga cuadrando con el stock.
+    Devuelve los deltas aplicados (sin los que quedaron en 0).
+    """
+    deltas = {pid: int(d) for pid, d in deltas.items() if pid and d}
+    if deltas and minimo is not None:
+        actuales = dict(
+            Producto.objects.select_for_update().filter(pk__in=deltas).values_list("id", "stock")
+        )
+        deltas = {
+            pid: max(minimo, actuales[pid] + d) - actuales[pid]
+            for pid, d in deltas.items() if pid in actuales
+        }
+        deltas = {pid: d for pid, d in deltas.items() if d}
+    if not deltas:
+        return {}
+
+    MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(producto_id=pid, cantidad=d, tipo=tipo, referencia=referencia[:100])
+        for pid, d in deltas.items()
+    ])
+    _aplicar_deltas(deltas)
+    return deltas
+
+
+def mover_stock(
+    producto: Union[Producto, int], cantidad: int, tipo: str, referencia: str = "", minimo: Optional[int] = None
+) -> int:
+    """
+    Un movimiento para un solo producto. Si se pasa la instancia, su `stock` en
+    memoria se ajusta con lo aplicado (sin volver a leerla). Devuelve lo aplicado.
+    """
+    pid = producto.pk if isinstance(producto, Producto) else producto
+    aplicado = registrar_movimientos({pid: cantidad}, tipo, referencia, minimo=minimo).get(pid, 0)
+    if isinstance(producto, Producto) and aplicado:
+        producto.stock = (producto.stock or 0) + aplicado
+        producto._stock_cargado = producto.stock
+    return aplicado
+
+
+@transaction.atomic
+def fijar_stock(producto: Producto, nuevo: int, tipo: str = "ajuste", referencia: str = "") -> int:
+    """Lleva el stock a `nuevo` (p.ej. conteo físico) registrando la diferencia. Devuelve el delta."""
+    actual = Producto.objects.select_for_update().filter(pk=producto.pk).values_list("stock", flat=True).first() or 0
+    producto.stock = actual
+    producto._stock_cargado = actual
+    return mover_stock(producto, int(nuevo) - actual, tipo, referencia)
+
+
+def stock_segun_movimientos():
+    """Expresión con la suma de la bitácora de cada producto (0 si no tiene movimientos)."""
+    suma = (
+        MovimientoInventario.objects.filter(producto=OuterRef("pk"))
+        .order_by()
+        .values("producto")
+        .annotate(total=Sum("cantidad"))
+        .values("total")
+    )
+    return Coalesce(Subquery(suma, output_field=IntegerField()), Value(0))
+
+
+def productos_descuadrados():
+    """Productos cuyo stock no coincide con su bitácora (una sola consulta agregada)."""
+    return (
+        Producto.objects.annotate(stock_bitacora=stock_segun_movimientos())
+        .exclude(stock=F("stock_bitacora"))
+        .order_by("nombre")
+    )
+
+
+def recalcular_stock_desde_movimientos() -> int:
+    """Fija el stock de todos los productos a la suma de su bitácora en un solo UPDATE."""
+    return Producto.objects.update(stock=stock_segun_movimientos())
@@ -0,0 +1,178 @@
+"""
+Cola de tareas en segundo plano respaldada por la BD (modelo TareaSegundoPlano).
+
+- El admin llama a encolar_tarea() y redirige a la página de progreso.
+- Un worker (`python manage.py procesar_tareas`) toma las tareas pendientes una a
+  una y ejecuta la función registrada en TIPOS_TAREA.
+- Tomar una tarea es un UPDATE condicional (estado=pendiente -> en_proceso), así que
+  varios workers pueden correr a la vez sin ejecutar dos veces la misma tarea.
+- El worker renueva latido_en al tomar la tarea y con cada avance. Si muere a
+  media tarea, ésta queda en_proceso sin latido; pasado MINUTOS_TAREA_ABANDONADA
+  se marca como error para que la cola no quede bloqueada (ver
+  liberar_tareas_abandonadas). El cierre y el progreso solo se escriben si la
+  tarea sigue tomada por ese worker, así una tarea liberada no se "revive".
+- encolar_tarea() no duplica: si ya hay una tarea del mismo tipo pendiente o en
+  proceso, devuelve ésa.
+
+Un ejecutor recibe (tarea, progreso) y devuelve un dict JSON-serializable con el
+resultado. `progreso(total, details)` actualiza los contadores de la tarea; `details`
+es la lista de resultados por archivo con la llave "status" ("success",
+"duplicate" o "error"), el mismo formato que devuelven los procesadores de Drive.
+"""
+import logging
+import os
+import socket
+import traceback
+from typing import Callable, Dict, List, Optional
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import TareaSegundoPlano
+
+logger = logging.getLogger(__name__)
+
+TIPOS_TAREA: Dict[str, Dict[str, str]] = {
+    "drive_compras": {
+        "nombre": "Procesar facturas de compras (Drive)",
+        "ejecutor": "compras.utils.drive_processor.ejecutar_tarea_drive",
+        "volver": "admin:compras_compra_changelist",
+    },
+    "drive_ventas": {
+        "nombre": "Procesar facturas de ventas (Drive)",
+        "ejecutor": "ventas.utils.drive_processor.ejecutar_tarea_drive",
+        "volver": "admin:ventas_factura_changelist",
+    },
+}
+
+
+# Una tarea en_proceso sin latido desde hace más que esto se da por abandonada
+# (worker caído o reiniciado). El latido se renueva con cada archivo procesado,
+# así que una corrida larga de Drive no cuenta como abandonada.
+MINUTOS_TAREA_ABANDONADA = 30
+
+ESTADOS_ACTIVOS = (TareaSegundoPlano.ESTADO_PENDIENTE, TareaSegundoPlano.ESTADO_EN_PROCESO)
+
+
+def nombre_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def encolar_tarea(tipo: str, usuario=None, **parametros) -> TareaSegundoPlano:
+    if tipo not in TIPOS_TAREA:
+        raise ValueError(f"Tipo de tarea desconocido: {tipo}")
+    if usuario is not None and not getattr(usuario, "is_authenticated", False):
+        usuario = None
+    liberar_tareas_abandonadas()
+    with transaction.atomic():
+        existente = (
+            TareaSegundoPlano.objects.select_for_update()
+            .filter(tipo=tipo, estado__in=ESTADOS_ACTIVOS)
+            .order_by("creada_en", "pk")
+            .first()
+        )
+        if existente is not None:
+            return existente
+        return TareaSegundoPlano.objects.create(tipo=tipo, parametros=parametros, creada_por=usuario)
+
+
+def liberar_tareas_abandonadas(minutos: int = MINUTOS_TAREA_ABANDONADA) -> int:
+    """Marca como error las tareas en_proceso sin latido desde hace más de `minutos`. Devuelve cuántas."""
+    ahora = timezone.now()
+    limite = ahora - timedelta(minutes=minutos)
+    abandonadas = TareaSegundoPlano.objects.filter(
+        Q(latido_en__lt=limite) | Q(latido_en__isnull=True, iniciada_en__lt=limite),
+        estado=TareaSegundoPlano.ESTADO_EN_PROCESO,
+    )
+    liberadas = abandonadas.update(
+        estado=TareaSegundoPlano.ESTADO_ERROR,
+        mensaje_error=f"Tarea abandonada: sin avance del worker en {minutos} minutos (¿worker caído?).",
+        terminada_en=ahora,
+    )
+    if liberadas:
+        logger.warning(f"{liberadas} tarea(s) abandonada(s) marcadas como error")
+    return liberadas
+
+
+def tomar_siguiente_tarea(worker: Optional[str] = None) -> Optional[TareaSegundoPlano]:
+    """Reserva la tarea pendiente más antigua para este worker (o None si no hay)."""
+    worker = worker or nombre_worker()
+    pendientes = TareaSegundoPlano.objects.filter(
+        estado=TareaSegundoPlano.ESTADO_PENDIENTE
+    ).order_by("creada_en", "pk").values_list("pk", flat=True)
+    ahora = timezone.now()
+    for pk in pendientes[:10]:
+        tomada = TareaSegundoPlano.objects.filter(
+            pk=pk, estado=TareaSegundoPlano.ESTADO_PENDIENTE
+        ).update(estado=TareaSegundoPlano.ESTADO_EN_PROCESO, worker=worker, iniciada_en=ahora, latido_en=ahora)
+        if tomada:
+            return TareaSegundoPlano.objects.get(pk=pk)
+    return None
+
+
+def _tomada_por_mi(tarea: TareaSegundoPlano):
+    """La tarea, solo si sigue en_proceso a nombre del worker que la tomó."""
+    return TareaSegundoPlano.objects.filter(
+        pk=tarea.pk, estado=TareaSegundoPlano.ESTADO_EN_PROCESO, worker=tarea.worker
+    )
+
+
+def _actualizador_progreso(tarea: TareaSegundoPlano) -> Callable[[int, List[dict]], None]:
+    def progreso(total: int, details: List[dict]) -> None:
+        estados = [d.get("status") for d in details]
+        _tomada_por_mi(tarea).update(
+            latido_en=timezone.now(),
+            total=total,
+            procesados=len(details),
+            exitosos=estados.count("success"),
+            duplicados=estados.count("duplicate"),
+            errores=estados.count("error"),
+        )
+    return progreso
+
+
+def ejecutar_tarea(tarea: TareaSegundoPlano) -> TareaSegundoPlano:
+    """
+    Ejecuta una tarea ya tomada y guarda su estado final, salvo que mientras
+    corría se haya dado por abandonada (entonces se deja como quedó).
+    """
+    campos = {}
+    try:
+        ejecutor = import_string(TIPOS_TAREA[tarea.tipo]["ejecutor"])
+        resultado = ejecutor(tarea, _actualizador_progreso(tarea))
+    except Exception as e:
+        logger.error(f"Tarea {tarea.pk} ({tarea.tipo}) falló: {e}", exc_info=True)
+        campos["estado"] = TareaSegundoPlano.ESTADO_ERROR
+        campos["mensaje_error"] = f"{type(e).__name__}: {e}\n\n{traceback.format_exc()}"
+    else:
+        campos["estado"] = TareaSegundoPlano.ESTADO_COMPLETADA
+        campos["resultado"] = resultado
+        if isinstance(resultado, dict) and "total" in resultado:
+            # Conteos finales del resultado (por si el ejecutor no reportó progreso)
+            campos["total"] = resultado.get("total") or 0
+            campos["procesados"] = campos["total"]
+            campos["exitosos"] = resultado.get("success") or 0
+            campos["duplicados"] = resultado.get("duplicate") or 0
+            campos["errores"] = resultado.get("error") or 0
+    campos["terminada_en"] = timezone.now()
+    if not _tomada_por_mi(tarea).update(**campos):
+        logger.warning(f"Tarea {tarea.pk} ({tarea.tipo}) ya no estaba tomada por {tarea.worker}; no se guarda su cierre")
+    tarea.refresh_from_db()
+    return tarea
+
+
+def procesar_pendientes(worker: Optional[str] = None, max_tareas: Optional[int] = None) -> int:
+    """Ejecuta tareas pendientes hasta vaciar la cola (o llegar a max_tareas). Devuelve cuántas corrió."""
+    liberar_tareas_abandonadas()
+    ejecutadas = 0
+    while max_tareas is None or ejecutadas < max_tareas:
+        tarea = tomar_siguiente_tarea(worker)
+        if tarea is None:
+            break
+        ejecutar_tarea(tarea)
+        ejecutadas += 1
+    return ejecutadas
@@ -213,4 +213,212 @@ class UploadCSVTests(TestCase):
         self.assertEqual(resp.status_code, 200)
 
         self.assertFalse(Producto.objects.filter(proveedor__nombre="P1").exists())
-        self.assertTrue(Producto.objects.filter(nombre="Con Nombre", proveedor__nombre="P2").exists())
\ No newline at end of file
+        self.assertTrue(Producto.objects.filter(nombre="Con Nombre", proveedor__nombre="P2").exists())
+
+class CatalogoIndexTests(TestCase):
+    def setUp(self):
+        from inventario.utils import invalidar_catalogo_index
+        invalidar_catalogo_index()
+        self.proveedor = Proveedor.objects.create(nombre="Vieja Bodega")
+        self.producto = Producto.objects.create(
+            nombre="VT ANÉCDOTA BLEND",
+            proveedor=self.proveedor,
+            precio_compra="207.85",
+            precio_venta="305.00",
+        )
+        AliasProducto.objects.create(alias="ANECDOTA 6 MESES", producto=self.producto)
+
+    def test_match_exacto_por_nombre_y_alias(self):
+        from inventario.utils import encontrar_producto_unico
+        self.assertEqual(encontrar_producto_unico("vt anecdota blend."), (self.producto, None))
+        self.assertEqual(encontrar_producto_unico("Anécdota 6m"), (self.producto, None))
+
+    def test_busquedas_repetidas_no_recargan_catalogo(self):
+        from inventario.utils import encontrar_producto_unico
+        encontrar_producto_unico("VT ANÉCDOTA BLEND")  # construye el índice
+        # Solo la lectura del Producto encontrado
+        with self.assertNumQueries(1):
+            encontrar_producto_unico("VT ANÉCDOTA BLEND")
+        with self.assertNumQueries(0):
+            self.assertEqual(encontrar_producto_unico("INEXISTENTE XYZ"), (None, "not_found"))
+
+    def test_signals_invalidan_indice(self):
+        from inventario.utils import encontrar_producto_unico
+        encontrar_producto_unico("VT ANÉCDOTA BLEND")
+        otro = Producto.objects.create(
+            nombre="VT ANÉCDOTA RESERVA",
+            proveedor=self.proveedor,
+            precio_compra="100.00",
+            precio_venta="200.00",
+        )
+        self.assertEqual(encontrar_producto_unico("anecdota"), (None, "ambiguous"))
+        otro.delete()
+        self.assertEqual(encontrar_producto_unico("anecdota"), (self.producto, None))
+
+    def test_resolucion_en_lote_una_consulta(self):
+        from inventario.utils import encontrar_productos_unicos
+        otro = Producto.objects.create(
+            nombre="TINTO RESERVA 750",
+            proveedor=self.proveedor,
+            precio_compra="100.00",
+            precio_venta="200.00",
+        )
+        encontrar_productos_unicos([])  # construye el índice
+        nombres = ["VT ANÉCDOTA BLEND", "anecdota 6 m", "Tinto Reserva 750", "NO EXISTE"]
+        with self.assertNumQueries(1):
+            resultado = encontrar_productos_unicos(nombres)
+        self.assertEqual(resultado["VT ANÉCDOTA BLEND"], (self.producto, None))
+        self.assertEqual(resultado["anecdota 6 m"], (self.producto, None))
+        self.assertEqual(resultado["Tinto Reserva 750"], (otro, None))
+        self.assertEqual(resultado["NO EXISTE"], (None, "not_found"))
+        # Nombres que resuelven al mismo producto comparten la instancia
+        self.assertIs(resultado["VT ANÉCDOTA BLEND"][0], resultado["anecdota 6 m"][0])
+
+    def test_normalizados_persistidos_en_save(self):
+        self.assertEqual(self.producto.nombre_normalizado, "vt anecdota blend")
+        self.assertTrue(AliasProducto.objects.filter(alias_normalizado="anecdota 6m").exists())
+
+        self.producto.nombre = "VT Anécdota  Blend 6 Meses."
+        self.producto.save(update_fields=["nombre"])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.nombre_normalizado, "vt anecdota blend 6m")
+
+    def test_resolve_nombre_producto_por_columna_normalizada(self):
+        from compras.utils.catalogo import _resolve_nombre_producto
+        with self.assertNumQueries(1):
+            self.assertEqual(_resolve_nombre_producto("vt anecdota blend"), "VT ANÉCDOTA BLEND")
+        self.assertEqual(_resolve_nombre_producto("Anécdota 6 mes"), "VT ANÉCDOTA BLEND")
+        self.assertIsNone(_resolve_nombre_producto("OTRO VINO"))
+
+    def test_similitud_para_lineas_reordenadas_o_truncadas(self):
+        from inventario.utils import encontrar_producto_unico, sugerir_productos
+        reserva = Producto.objects.create(
+            nombre="CARLOS MONTES TANNAT RESERVA",
+            proveedor=self.proveedor,
+            precio_compra="100.00",
+            precio_venta="200.00",
+        )
+        # Parecidos pero no idénticos: no se asignan solos (quedan como PNR)...
+        for texto in ("Blend VT Anécdota", "TANNAT CARLOS MONTES RESERV", "CARLOS MONTES TANNAT ROSADO", "MONTES RSV"):
+            self.assertEqual(encontrar_producto_unico(texto), (None, "not_found"), texto)
+        # ...pero sí aparecen como sugerencias rankeadas para la revisión
+        self.assertEqual(sugerir_productos("Blend VT Anécdota")[0][0], self.producto)
+        sugerencias = sugerir_productos("TANNAT CARLOS MONTES RESERV")
+        self.assertEqual(sugerencias[0][0], reserva)
+        self.assertTrue(0 < sugerencias[0][1] < 1)
+
+    def test_entradas_normalizadas_vacias_no_coinciden_con_todo(self):
+        from inventario.utils import encontrar_producto_unico, invalidar_catalogo_index
+        # "..." normaliza a "": antes quedaba contenido en cualquier nombre buscado
+        AliasProducto.objects.create(alias="...", producto=self.producto)
+        invalidar_catalogo_index()
+        self.assertEqual(AliasProducto.objects.get(alias="...").alias_normalizado, "")
+        self.assertEqual(encontrar_producto_unico("OTRO VINO"), (None, "not_found"))
+        self.assertEqual(encontrar_producto_unico("anecdota blend"), (self.producto, None))
+
+
+def _ejecutor_falso(tarea, progreso):
+    details = [{"file": "a.pdf", "status": "success"}, {"file": "b.pdf", "status": "error", "error": "sin folio"}]
+    progreso(2, details[:1])
+    return {"total": 2, "success": 1, "duplicate": 0, "error": 1, "details": details}
+
+
+class TareasSegundoPlanoTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from unittest import mock
+        from inventario import tareas
+
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "x")
+        tipos = {
+            "drive_compras": {**tareas.TIPOS_TAREA["drive_compras"], "ejecutor": "inventario.tests._ejecutor_falso"},
+            "roto": {"nombre": "Roto", "ejecutor": "inventario.tests.no_existe", "volver": "admin:index"},
+        }
+        patcher = mock.patch.dict(tareas.TIPOS_TAREA, tipos)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_admin_encola_y_redirige_a_progreso(self):
+        from inventario.models import TareaSegundoPlano
+
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse("admin:compras_compra_procesar_drive"))
+        tarea = TareaSegundoPlano.objects.get()
+        self.assertRedirects(resp, reverse("admin:inventario_tareasegundoplano_progreso", args=[tarea.pk]))
+        self.assertEqual(tarea.estado, TareaSegundoPlano.ESTADO_PENDIENTE)
+        self.assertEqual(tarea.creada_por, self.user)
+
+        resp = self.client.get(reverse("admin:inventario_tareasegundoplano_progreso", args=[tarea.pk]))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_worker_ejecuta_y_guarda_progreso(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from inventario.models import TareaSegundoPlano
+        from inventario.tareas import encolar_tarea, tomar_siguiente_tarea
+
+        tarea = encolar_tarea("drive_compras", usuario=self.user)
+        fallida = encolar_tarea("roto")
+        call_command("procesar_tareas", "--una-vez", stdout=StringIO())
+
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, TareaSegundoPlano.ESTADO_COMPLETADA)
+        self.assertEqual((tarea.total, tarea.procesados, tarea.exitosos, tarea.errores), (2, 2, 1, 1))
+        fallida.refresh_from_db()
+        self.assertEqual(fallida.estado, TareaSegundoPlano.ESTADO_ERROR)
+        self.assertIn("ImportError", fallida.mensaje_error)
+        # Nada queda pendiente ni se toma dos veces
+        self.assertIsNone(tomar_siguiente_tarea())
+
+        self.client.force_login(self.user)
+        estado = self.client.get(reverse("admin:inventario_tareasegundoplano_estado", args=[tarea.pk])).json()
+        self.assertTrue(estado["terminada"])
+        self.assertEqual(estado["detalles_error"], [{"file": "b.pdf", "error": "sin folio"}])
+
+    def test_encolar_no_duplica_tareas_activas(self):
+        from inventario.models import TareaSegundoPlano
+        from inventario.tareas import encolar_tarea, tomar_siguiente_tarea
+
+        tarea = encolar_tarea("drive_compras", usuario=self.user)
+        self.assertEqual(encolar_tarea("drive_compras"), tarea)
+        tomar_siguiente_tarea()
+        self.assertEqual(encolar_tarea("drive_compras"), tarea)
+        self.assertEqual(TareaSegundoPlano.objects.count(), 1)
+
+        # Otro tipo, o una vez terminada, sí crea una nueva
+        self.assertNotEqual(encolar_tarea("roto"), tarea)
+        TareaSegundoPlano.objects.filter(pk=tarea.pk).update(estado=TareaSegundoPlano.ESTADO_COMPLETADA)
+        self.assertNotEqual(encolar_tarea("drive_compras"), tarea)
+
+    def test_worker_libera_tareas_sin_latido(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from inventario.models import TareaSegundoPlano
+        from inventario.tareas import (
+            MINUTOS_TAREA_ABANDONADA, _actualizador_progreso, encolar_tarea, ejecutar_tarea,
+            procesar_pendientes, tomar_siguiente_tarea,
+        )
+
+        hace_mucho = timezone.now() - timedelta(minutes=MINUTOS_TAREA_ABANDONADA + 1)
+        encolar_tarea("drive_compras")
+        caida = tomar_siguiente_tarea("worker-caido")
+        encolar_tarea("roto")
+        larga = tomar_siguiente_tarea("worker-vivo")
+        TareaSegundoPlano.objects.update(iniciada_en=hace_mucho, latido_en=hace_mucho)
+        _actualizador_progreso(larga)(10, [{"status": "success"}])  # sigue avanzando
+
+        self.assertEqual(procesar_pendientes(), 0)
+        caida.refresh_from_db()
+        self.assertEqual(caida.estado, TareaSegundoPlano.ESTADO_ERROR)
+        self.assertIn("abandonada", caida.mensaje_error)
+        self.assertIsNotNone(caida.terminada_en)
+        larga.refresh_from_db()
+        self.assertEqual(larga.estado, TareaSegundoPlano.ESTADO_EN_PROCESO)
+        # Ya no bloquea: se puede volver a encolar
+        self.assertNotEqual(encolar_tarea("drive_compras"), caida)
+
+        # Si el worker "caído" termina después, no pisa la liberación
+        ejecutar_tarea(caida)
+        caida.refresh_from_db()
+        self.assertEqual(caida.estado, TareaSegundoPlano.ESTADO_ERROR)
+        self.assertIn("abandonada", caida.mensaje_error)
@@ -0,0 +1,68 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from compras.models import Compra, CompraProducto, PagoCompra, Proveedor
+from inventario.models import Producto, ProductoNoReconocido
+from ventas.models import Factura, PagoFactura
+
+pytestmark = pytest.mark.django_db
+
+def _facturas(inicio, n):
+    for i in range(inicio, inicio + n):
+        factura = Factura.objects.create(folio_factura=f"L-{i}", cliente="Bar", uuid_factura=f"UUID-L{i}",
+                                         fecha_facturacion=date(2025, 1, 1), total=Decimal("100"))
+        PagoFactura.objects.create(factura=factura, fecha_pago=date(2025, 1, 5), monto=Decimal("30"))
+        ProductoNoReconocido.objects.create(nombre_detectado=f"Vino {i}", uuid_factura=factura.uuid_factura,
+                                            origen="venta")
+
+def _consultas_listado(client, url):
+    with CaptureQueriesContext(connection) as ctx:
+        resp = client.get(url)
+    assert resp.status_code == 200
+    return resp, len(ctx.captured_queries)
+
+def test_listado_facturas_con_presupuesto_fijo_de_consultas(admin_client):
+    url = reverse("admin:ventas_factura_changelist")
+    _facturas(0, 2)
+    _, pocas = _consultas_listado(admin_client, url)
+    _facturas(2, 30)
+    resp, muchas = _consultas_listado(admin_client, url)
+    assert pocas == muchas <= 12
+
+    html = resp.content.decode()
+    assert "Pendiente (1 PNR)" in html and "$70.00" in html
+    resp = admin_client.get(url, {"o": "6"})  # ordena por saldo (anotación)
+    assert resp.status_code == 200
+
+def _compras(inicio, n):
+    prov = Proveedor.objects.create(nombre=f"Casa {inicio}")
+    prod = Producto.objects.create(nombre=f"Malbec {inicio}", proveedor=prov, precio_compra=Decimal("10"),
+                                   precio_venta=Decimal("20"), stock=0)
+    for i in range(inicio, inicio + n):
+        compra = Compra.objects.create(uuid=f"UUID-C{i}", folio=f"C-{i}", proveedor=prov, fecha=date(2025, 1, 1),
+                                       total=Decimal("100"), requiere_revision_manual=True)
+        CompraProducto.objects.create(compra=compra, producto=prod, cantidad=1, precio_unitario=Decimal("10"),
+                                      requiere_revision_manual=True, motivo_revision="precio_distinto")
+        PagoCompra.objects.create(compra=compra, fecha_pago=date(2025, 1, 9), monto=Decimal("40"))
+        ProductoNoReconocido.objects.create(nombre_detectado=f"Vino C{i}", uuid_factura=compra.uuid)
+    return compra
+
+def test_listado_compras_con_presupuesto_fijo_de_consultas(admin_client, django_assert_max_num_queries):
+    url = reverse("admin:compras_compra_changelist")
+    _compras(0, 2)
+    _, pocas = _consultas_listado(admin_client, url)
+    compra = _compras(2, 30)
+    resp, muchas = _consultas_listado(admin_client, url)
+    assert pocas == muchas <= 12
+
+    html = resp.content.decode()
+    assert "Pendiente (1 líneas)" in html and "2025-01-09" in html and "$60.00" in html
+
+    with django_assert_max_num_queries(20):
+        resp = admin_client.get(reverse("admin:compras_compra_change", args=[compra.pk]))
+    html = resp.content.decode()
+    assert "Líneas con flags:</strong> 1" in html and "sin procesar:</strong> 1" in html
@@ -0,0 +1,51 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+from django.urls import reverse
+
+from compras.models import Compra, Proveedor
+from inventario.models import Producto, ProductoNoReconocido
+
+pytestmark = pytest.mark.django_db
+
+@pytest.fixture
+def catalogo():
+    prov = Proveedor.objects.create(nombre="Casa Buscador")
+    for nombre in ("Montes Alpha Cabernet", "Malbec Reserva", "Cabernet Sauvignon Gran Reserva", "Merlot Joven"):
+        Producto.objects.create(nombre=nombre, proveedor=prov, precio_compra=Decimal("10"),
+                                precio_venta=Decimal("20"), stock=3)
+    return prov
+
+def test_api_buscar_productos_rankea_y_siembra_con_pnr(catalogo, admin_client, client):
+    url = reverse("api_buscar_productos")
+    assert client.get(url, {"q": "cab"}).status_code == 302  # solo staff
+
+    nombres = [r["nombre"] for r in admin_client.get(url, {"q": "cabernet"}).json()["resultados"]]
+    assert set(nombres[:2]) == {"Montes Alpha Cabernet", "Cabernet Sauvignon Gran Reserva"}
+
+    primero = admin_client.get(url, {"q": "malb", "limite": 1}).json()["resultados"]
+    assert [(r["nombre"], r["stock"]) for r in primero] == [("Malbec Reserva", 3)]
+
+    pnr = ProductoNoReconocido.objects.create(nombre_detectado="MERLOT JOVEN 750ML", uuid_factura="U-B1")
+    sugeridos = admin_client.get(url, {"pnr": pnr.pk}).json()["resultados"]
+    assert sugeridos[0]["nombre"] == "Merlot Joven"
+    for params in ({}, {"pnr": "abc"}, {"pnr": "²"}, {"pnr": "-1"}, {"pnr": "999999"}):
+        assert admin_client.get(url, params).json() == {"resultados": []}
+
+def test_widget_compra_no_incrusta_catalogo(catalogo, admin_client):
+    compra = Compra.objects.create(uuid="U-B2", folio="CB-2", proveedor=catalogo, fecha=date(2025, 1, 1),
+                                   total=Decimal("10"),
+                                   requiere_revision_manual=True)
+    ProductoNoReconocido.objects.create(nombre_detectado="Merlot Joven", uuid_factura=compra.uuid)
+    html = admin_client.get(reverse("admin:compras_compra_change", args=[compra.pk])).content.decode()
+    assert reverse("api_buscar_productos") in html and "buscarProductosPNR" in html
+    assert "Merlot Joven - 100%" in html and "Malbec Reserva" not in html
+
+def test_widget_factura_no_incrusta_catalogo(catalogo, admin_client):
+    from ventas.models import Factura
+    factura = Factura.objects.create(folio_factura="VB-1", cliente="Bar", uuid_factura="U-B3",
+                                     fecha_facturacion=date(2025, 1, 1), requiere_revision_manual=True)
+    ProductoNoReconocido.objects.create(nombre_detectado="Merlot Joven", uuid_factura="U-B3", origen="venta")
+    html = admin_client.get(reverse("admin:ventas_factura_change", args=[factura.pk])).content.decode()
+    assert "buscarProductosPNR" in html and "Merlot Joven (Stock: 3) - 100%" in html
+    assert "Malbec Reserva (Stock: 3)" not in html  # el inline de detalles sí lista el catálogo
@@ -0,0 +1,53 @@
+import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+from django.urls import reverse
+
+from ventas.models import Factura, PagoFactura
+
+pytestmark = pytest.mark.django_db
+
+def _factura(folio, cliente, total, dias_vencida):
+    hoy = date.today()
+    return Factura.objects.create(folio_factura=folio, cliente=cliente, total=Decimal(total),
+                                  fecha_facturacion=hoy - timedelta(days=dias_vencida + 15),
+                                  vencimiento=hoy - timedelta(days=dias_vencida))
+
+def test_cuentas_por_cobrar_agrupa_en_sql(admin_client, django_assert_max_num_queries):
+    parcial = _factura("C-1", "Bar Uno", "1000", dias_vencida=-5)      # al corriente
+    PagoFactura.objects.create(factura=parcial, fecha_pago=date.today(), monto=Decimal("400"))
+    _factura("C-2", "Bar Uno", "200", dias_vencida=45)
+    _factura("C-3", "Bar Dos", "300", dias_vencida=75)
+    _factura("C-4", "Bar Dos", "50", dias_vencida=120)
+    _factura("C-5", "Bar Tres", "10", dias_vencida=30)
+
+    with django_assert_max_num_queries(8):
+        resp = admin_client.get(reverse("reportes:cuentas_por_cobrar"))
+    ctx = resp.context
+    assert (ctx["total_por_cobrar"], ctx["num_facturas"]) == (Decimal("1160.00"), 5)
+    assert (ctx["num_vencidas"], ctx["monto_vencido"]) == (4, Decimal("560.00"))
+    assert {k: (v["facturas"], v["monto"]) for k, v in ctx["antiguedad"].items()} == {
+        "dias_0_30": (2, Decimal("610.00")),
+        "dias_31_60": (1, Decimal("200.00")),
+        "dias_61_90": (1, Decimal("300.00")),
+        "dias_mas_90": (1, Decimal("50.00")),
+    }
+    assert [(c["cliente"], c["num_facturas"], c["total_saldo"], c["vencidas"]) for c in ctx["por_cliente"]] == [
+        ("Bar Uno", 2, Decimal("800.00"), 1),
+        ("Bar Dos", 2, Decimal("350.00"), 2),
+        ("Bar Tres", 1, Decimal("10.00"), 1),
+    ]
+    assert [f.folio_factura for f in ctx["facturas"]] == ["C-4", "C-3", "C-2", "C-5", "C-1"]
+
+def test_cuentas_por_cobrar_detalle_paginado_y_por_cliente(admin_client, monkeypatch):
+    from reportes.views import CuentasPorCobrarView
+    monkeypatch.setattr(CuentasPorCobrarView, "facturas_por_pagina", 2)
+    for i in range(5):
+        _factura(f"P-{i}", "Bar Uno" if i % 2 else "Bar Dos", "100", dias_vencida=i)
+
+    pagina = admin_client.get(reverse("reportes:cuentas_por_cobrar"), {"page": 3}).context["facturas"]
+    assert (pagina.number, pagina.paginator.num_pages, len(pagina)) == (3, 3, 1)
+
+    resp = admin_client.get(reverse("reportes:cuentas_por_cobrar"), {"cliente": "Bar Uno"})
+    assert {f.cliente for f in resp.context["facturas"]} == {"Bar Uno"}
+    assert resp.context["num_facturas"] == 5  # los totales no dependen del filtro de detalle
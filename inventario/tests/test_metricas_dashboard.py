@@ -0,0 +1,54 @@
+import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.cache import cache, caches
+from django.urls import reverse
+
+from compras.models import Compra, Proveedor
+from inventario.models import Producto
+from reportes.metricas import CLAVE_CACHE, calcular_metricas, metricas_dashboard
+from ventas.models import DetalleFactura, Factura, PagoFactura
+
+pytestmark = pytest.mark.django_db
+
+@pytest.fixture(autouse=True)
+def _cache_limpio():
+    cache.clear()
+    yield
+    cache.clear()
+
+def test_metricas_en_cache_se_invalidan_con_cada_escritura(django_assert_num_queries):
+    hoy = date.today()
+    prov = Proveedor.objects.create(nombre="Casa Métricas")
+    prod = Producto.objects.create(nombre="Cabernet Métricas", proveedor=prov, precio_compra=Decimal("40"),
+                                   costo_transporte=Decimal("10"), precio_venta=Decimal("100"), stock=20)
+    factura = Factura.objects.create(folio_factura="M-1", cliente="Bar", fecha_facturacion=hoy,
+                                     vencimiento=hoy + timedelta(days=8))
+    DetalleFactura.objects.create(factura=factura, producto=prod, cantidad=4, precio_unitario=Decimal("100"))
+    compra = Compra.objects.create(uuid="U-M1", folio="CM-1", proveedor=prov, fecha=hoy, total=Decimal("150"))
+
+    metricas = metricas_dashboard()
+    assert (metricas["total_por_cobrar"], metricas["total_por_pagar"]) == (Decimal("400.00"), Decimal("150.00"))
+    assert (metricas["costos_por_recuperar"], metricas["ganancia_por_recibir"]) == (Decimal("200.00"), Decimal("200.00"))
+    assert [s["entradas"] for s in metricas["semanas"]][:2] == [Decimal("0.00"), Decimal("400.00")]
+    with django_assert_num_queries(1):  # solo la lectura del caché
+        assert metricas_dashboard() == metricas
+    # El caché es compartido: otra conexión (p.ej. el worker) ve lo mismo
+    otro_proceso = caches.create_connection("default")
+    assert otro_proceso.get(CLAVE_CACHE) == metricas
+
+    PagoFactura.objects.create(factura=factura, fecha_pago=hoy, monto=Decimal("100"))
+    assert otro_proceso.get(CLAVE_CACHE) is None
+    assert metricas_dashboard()["total_por_cobrar"] == Decimal("300.00")
+
+    compra.delete()
+    assert metricas_dashboard() == calcular_metricas()
+    assert metricas_dashboard()["dinero_comprometido"] == Decimal("0.00")
+
+def test_dashboards_usan_metricas(admin_client):
+    Factura.objects.create(folio_factura="M-2", cliente="Bar", fecha_facturacion=date.today(), total=Decimal("80"))
+    for nombre, clave in (("dashboard", "total_por_cobrar"), ("flujo_caja", "entradas_proyectadas"),
+                          ("distribucion_fondos", "total_pendiente_cobro")):
+        resp = admin_client.get(reverse(f"reportes:{nombre}"))
+        assert resp.status_code == 200
+        assert resp.context[clave] == Decimal("80.00")
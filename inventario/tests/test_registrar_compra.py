@@ -126,4 +126,29 @@ def test_pu_faltante_se_prefillea_desde_conceptos_en_pnr():
     registrar_compra_automatizada(datos)
     pnr = ProductoNoReconocido.objects.get(uuid_factura="U-005")
     assert pnr.cantidad == Decimal("2")
-    assert pnr.precio_unitario == Decimal("30")
\ No newline at end of file
+    assert pnr.precio_unitario == Decimal("30")
+
+def test_escritura_en_lote_con_pocas_consultas(django_assert_max_num_queries):
+    prov = Proveedor.objects.create(nombre="Casa Lote")
+    productos = [
+        Producto.objects.create(nombre=f"Tinto Lote {i}", proveedor=prov, precio_compra=Decimal("100"),
+                                precio_venta=Decimal("150"), stock=10)
+        for i in range(8)
+    ]
+    lineas = [{"nombre": p.nombre, "cantidad": "2", "precio_unitario": "100"} for p in productos]
+    lineas.append({"nombre": "Vino inexistente", "cantidad": "1", "precio_unitario": "80"})
+    datos = _base_datos_extraidos(prov, productos=lineas, folio="C-LOTE", uuid="U-LOTE", total="1680.00")
+
+    # Otro proceso vende mientras tanto: el UPDATE con F() no pisa su movimiento
+    Producto.objects.filter(pk=productos[0].pk).update(stock=7)
+
+    # Incluye el INSERT de la bitácora de movimientos y la invalidación del caché
+    # compartido de métricas (DatabaseCache)
+    with django_assert_max_num_queries(13):
+        compra = registrar_compra_automatizada(datos)
+
+    assert CompraProducto.objects.filter(compra=compra).count() == 8
+    assert ProductoNoReconocido.objects.filter(uuid_factura="U-LOTE").count() == 1
+    stocks = dict(Producto.objects.filter(proveedor=prov).values_list("nombre", "stock"))
+    assert stocks["Tinto Lote 0"] == 9
+    assert all(stocks[f"Tinto Lote {i}"] == 12 for i in range(1, 8))
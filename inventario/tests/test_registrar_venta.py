@@ -0,0 +1,139 @@
+import pytest
+from decimal import Decimal
+from django.utils.timezone import now
+
+from compras.models import Proveedor
+from inventario.models import Producto, ProductoNoReconocido
+from ventas.models import Factura, DetalleFactura
+from ventas.utils.registrar_venta import registrar_venta_automatizada
+
+pytestmark = pytest.mark.django_db
+
+def _datos_venta(productos, folio="V-1", uuid="UV-1", subtotal="0", total="100.00"):
+    return {
+        "folio": folio,
+        "uuid": uuid,
+        "cliente": "Restaurante Z",
+        "fecha_emision": now().date().isoformat(),
+        "metodo_pago": "PUE",
+        "subtotal": subtotal,
+        "descuento": "0",
+        "total": total,
+        "productos": productos,
+    }
+
+def _productos(prov, n, stock=10):
+    return [
+        Producto.objects.create(nombre=f"Rosado Venta {i}", proveedor=prov, precio_compra=Decimal("80"),
+                                costo_transporte=Decimal("5"), precio_venta=Decimal("150"), stock=stock)
+        for i in range(n)
+    ]
+
+def test_venta_en_lote_con_pocas_consultas(django_assert_max_num_queries):
+    prov = Proveedor.objects.create(nombre="Casa Venta")
+    productos = _productos(prov, 8)
+    lineas = [{"nombre": p.nombre, "cantidad": "3", "precio_unitario": "150"} for p in productos]
+    lineas.append({"nombre": productos[1].nombre, "cantidad": "1", "precio_unitario": "150"})  # repetido
+    lineas.append({"nombre": "Vino inexistente", "cantidad": "1", "precio_unitario": "90"})
+    datos = _datos_venta(lineas, folio="V-LOTE", uuid="UV-LOTE", total="4200.00")
+
+    # Antes: ~10 consultas por línea (signals de stock y total por detalle).
+    # Incluye el bloqueo de filas, el INSERT de la bitácora de movimientos y la
+    # invalidación del caché compartido de métricas (DatabaseCache).
+    with django_assert_max_num_queries(17):
+        factura = registrar_venta_automatizada(datos)
+
+    factura.refresh_from_db()
+    assert factura.total == Decimal("4200.00")
+    assert factura.subtotal == Decimal("3750.00")  # suma de detalles (el PDF no trae subtotal)
+    assert factura.requiere_revision_manual
+    assert DetalleFactura.objects.filter(factura=factura).count() == 8
+    det = DetalleFactura.objects.get(factura=factura, producto=productos[1])
+    assert det.cantidad == 4
+    assert det.precio_compra == Decimal("85.00")
+    assert det.subtotal == Decimal("600.00")
+    assert ProductoNoReconocido.objects.filter(uuid_factura="UV-LOTE").count() == 1
+    stocks = dict(Producto.objects.filter(proveedor=prov).values_list("nombre", "stock"))
+    assert stocks["Rosado Venta 1"] == 6
+    assert stocks["Rosado Venta 0"] == 7
+
+def test_reemplazo_restaura_stock_previo_y_no_baja_de_cero():
+    prov = Proveedor.objects.create(nombre="Casa Reemplazo")
+    a, b, c = _productos(prov, 3, stock=5)
+    registrar_venta_automatizada(_datos_venta([
+        {"nombre": a.nombre, "cantidad": "2", "precio_unitario": "150"},
+        {"nombre": b.nombre, "cantidad": "4", "precio_unitario": "150"},
+    ], folio="V-REP", subtotal="900", total="1044.00"))
+
+    # Re-importación: b cambia de cantidad, a desaparece, c aparece y vende más que su stock
+    factura = registrar_venta_automatizada(_datos_venta([
+        {"nombre": b.nombre, "cantidad": "1", "precio_unitario": "150"},
+        {"nombre": c.nombre, "cantidad": "9", "precio_unitario": "150"},
+    ], folio="V-REP", subtotal="1500", total="1740.00"), replace_if_exists=True)
+
+    assert Factura.objects.filter(folio_factura="V-REP").count() == 1
+    assert set(factura.detalles.values_list("producto_id", "cantidad")) == {(b.id, 1), (c.id, 9)}
+    factura.refresh_from_db()
+    assert (factura.subtotal, factura.total) == (Decimal("1500.00"), Decimal("1740.00"))
+    stocks = dict(Producto.objects.filter(proveedor=prov).values_list("id", "stock"))
+    assert stocks == {a.id: 5, b.id: 4, c.id: 0}
+
+def test_folio_existente_sin_reemplazo_lanza_error():
+    prov = Proveedor.objects.create(nombre="Casa Dup")
+    (p,) = _productos(prov, 1)
+    datos = _datos_venta([{"nombre": p.nombre, "cantidad": "1", "precio_unitario": "150"}], folio="V-DUP")
+    registrar_venta_automatizada(datos)
+    with pytest.raises(ValueError):
+        registrar_venta_automatizada(datos)
+    p.refresh_from_db()
+    assert p.stock == 9
+
+def test_reimportacion_aplica_solo_diferencias_y_salta_sin_cambios(django_assert_max_num_queries):
+    prov = Proveedor.objects.create(nombre="Casa Diff")
+    a, b, c = _productos(prov, 3, stock=20)
+    lineas = [{"nombre": p.nombre, "cantidad": "2", "precio_unitario": "150"} for p in (a, b, c)]
+    factura = registrar_venta_automatizada(_datos_venta(lineas, folio="V-DIFF", total="1044.00"))
+    ids_previos = dict(factura.detalles.values_list("producto_id", "id"))
+
+    # Mismos datos: no se escribe nada
+    with django_assert_max_num_queries(3):
+        repetida = registrar_venta_automatizada(_datos_venta(lineas, folio="V-DIFF", total="1044.00"),
+                                                replace_if_exists=True)
+    assert repetida.sin_cambios
+
+    # Solo b cambia de cantidad: a y c conservan su fila
+    lineas[1]["cantidad"] = "5"
+    factura = registrar_venta_automatizada(_datos_venta(lineas, folio="V-DIFF", total="1392.00"),
+                                           replace_if_exists=True)
+    assert not factura.sin_cambios
+    assert dict(factura.detalles.values_list("producto_id", "id")) == ids_previos
+    det_b = factura.detalles.get(producto=b)
+    assert (det_b.cantidad, det_b.subtotal) == (5, Decimal("750.00"))
+    stocks = dict(Producto.objects.filter(proveedor=prov).values_list("id", "stock"))
+    assert stocks == {a.id: 18, b.id: 15, c.id: 18}
+
+def test_importar_facturas_csv_diff_y_saltadas(tmp_path):
+    from io import StringIO
+    from django.core.management import call_command
+
+    prov = Proveedor.objects.create(nombre="Casa CSV")
+    a, b = _productos(prov, 2, stock=10)
+    encabezado = "folio_factura,cliente,fecha_facturacion,producto,cantidad,precio_unitario\n"
+    csv_path = tmp_path / "ventas.csv"
+
+    csv_path.write_text(encabezado + f"C-1,Bar Y,2025-01-10,{a.nombre},2,150\nC-1,Bar Y,2025-01-10,{b.nombre},1,150\n")
+    call_command("importar_facturas", str(csv_path), stdout=StringIO())
+    factura = Factura.objects.get(folio_factura="C-1")
+    assert (factura.subtotal, factura.total) == (Decimal("450.00"), Decimal("450.00"))
+
+    out = StringIO()
+    call_command("importar_facturas", str(csv_path), stdout=out)
+    assert "Saltadas (sin cambios): 1" in out.getvalue()
+
+    csv_path.write_text(encabezado + f"C-1,Bar Y,2025-01-10,{a.nombre},3,150\n")
+    call_command("importar_facturas", str(csv_path), stdout=StringIO())
+    factura.refresh_from_db()
+    assert list(factura.detalles.values_list("producto_id", "cantidad")) == [(a.id, 3)]
+    assert factura.total == Decimal("450.00")
+    stocks = dict(Producto.objects.filter(proveedor=prov).values_list("id", "stock"))
+    assert stocks == {a.id: 7, b.id: 10}
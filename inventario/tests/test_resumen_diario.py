@@ -0,0 +1,122 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+from django.urls import reverse
+
+from compras.models import Compra, CompraProducto, Proveedor
+from inventario.models import Producto
+from reportes.models import ResumenDiario
+from reportes.resumen import reconstruir_resumen, resumen_periodo
+from ventas.models import DetalleFactura, Factura, PagoFactura
+
+pytestmark = pytest.mark.django_db
+
+D1, D2, D3 = date(2025, 3, 3), date(2025, 3, 10), date(2025, 3, 17)
+
+def _filas():
+    return {
+        (r.modo, r.fecha): (r.num_facturas, r.venta_total, r.costo_total, r.transporte_total, r.pagado_total,
+                            r.unidades_personalizadas, r.unidades_no_personalizadas, r.compras_total)
+        for r in ResumenDiario.objects.all()
+    }
+
+@pytest.fixture
+def datos(django_capture_on_commit_callbacks):
+    prov = Proveedor.objects.create(nombre="Casa Resumen")
+    normal = Producto.objects.create(nombre="Rioja Resumen", proveedor=prov, precio_compra=Decimal("50"),
+                                     costo_transporte=Decimal("10"), precio_venta=Decimal("100"), stock=100)
+    perso = Producto.objects.create(nombre="Etiqueta Resumen", proveedor=prov, precio_compra=Decimal("20"),
+                                    costo_transporte=Decimal("0"), precio_venta=Decimal("40"), stock=100,
+                                    es_personalizado=True)
+    with django_capture_on_commit_callbacks(execute=True):
+        factura = Factura.objects.create(folio_factura="R-1", cliente="Bar", fecha_facturacion=D1)
+        DetalleFactura.objects.create(factura=factura, producto=normal, cantidad=4, precio_unitario=Decimal("100"))
+        DetalleFactura.objects.create(factura=factura, producto=perso, cantidad=5, precio_unitario=Decimal("40"))
+        PagoFactura.objects.create(factura=factura, fecha_pago=D2, monto=Decimal("150"))
+        PagoFactura.objects.create(factura=factura, fecha_pago=D3, monto=Decimal("450"))
+        Factura.objects.create(folio_factura="R-2", cliente="Bar", fecha_facturacion=D1, total=Decimal("80"),
+                               pagado=True, fecha_pago=D2)  # sistema antiguo
+        compra = Compra.objects.create(uuid="U-R1", folio="CR-1", proveedor=prov, fecha=D2, total=Decimal("300"))
+        CompraProducto.objects.create(compra=compra, producto=perso, cantidad=10, precio_unitario=Decimal("20"))
+        CompraProducto.objects.create(compra=compra, producto=normal, cantidad=2, precio_unitario=Decimal("50"))
+    return factura
+
+def test_resumen_incremental_coincide_con_reconstruccion(datos):
+    filas = _filas()
+    # precio_compra del detalle ya incluye transporte (50 + 10)
+    assert filas[("contable", D1)] == (2, Decimal("680.00"), Decimal("340.00"), Decimal("40.00"), Decimal("680.00"), 5, 4, 0)
+    assert filas[("contable", D2)][-1] == Decimal("300.00")
+    # Flujo: 150/600 y 450/600 de la factura R-1; R-2 completa en su fecha_pago
+    assert filas[("flujo", D2)] == (2, Decimal("230.00"), Decimal("85.00"), Decimal("10.00"), Decimal("230.00"), 5, 4, 0)
+    assert filas[("flujo", D3)] == (1, Decimal("450.00"), Decimal("255.00"), Decimal("30.00"), Decimal("450.00"), 0, 0, 0)
+
+    reconstruir_resumen()
+    assert _filas() == filas
+
+    totales = resumen_periodo("flujo", D1, D3)
+    assert (totales["venta_total"], totales["ganancia_total"]) == (Decimal("680.00"), Decimal("340.00"))
+
+def test_resumen_sigue_cambios_de_fecha_y_borrados(datos, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        factura = Factura.objects.get(pk=datos.pk)
+        factura.fecha_facturacion = D3
+        factura.save()
+        PagoFactura.objects.filter(factura=factura, fecha_pago=D3).get().delete()
+    filas = _filas()
+    assert filas[("contable", D1)][:2] == (1, Decimal("80.00"))
+    assert filas[("contable", D3)][:2] == (1, Decimal("600.00"))
+    assert ("flujo", D3) not in filas
+
+    reconstruir_resumen()
+    assert _filas() == filas
+
+def test_cortes_usan_resumen(datos, admin_client, django_assert_max_num_queries):
+    resp = admin_client.get(reverse("corte_contable"), {"fecha_inicio": "2025-03-01", "fecha_fin": "2025-03-31"})
+    assert resp.context["totales"]["total_venta"] == Decimal("680.00")
+    assert resp.context["totales"]["total_ganancia"] == Decimal("340.00")
+    resp = admin_client.get(reverse("corte_flujo"), {"fecha_inicio": "2025-03-10", "fecha_fin": "2025-03-10"})
+    assert resp.context["totales"]["total_venta"] == Decimal("230.00")
+    assert sorted(r["total_venta"] for r in resp.context["reporte"]) == [80, 150.0]
+
+    with django_assert_max_num_queries(10):
+        resp = admin_client.get(reverse("corte_semanal"), {"modo": "flujo", "start_date": "2025-03-15",
+                                                           "end_date": "2025-03-20"})
+    data = resp.json()
+    assert [r["folio"] for r in data["reporte"]] == ["R-1"]
+    assert data["totales"]["total_venta"] == 450.0
+
+    resp = admin_client.get(reverse("corte_compras"), {"fecha_inicio": "2025-03-01", "fecha_fin": "2025-03-31"})
+    assert (resp.context["total_gastado"], resp.context["productos_personalizados"]) == (300.0, 10)
+
+def test_exportar_csv_en_streaming_con_totales_en_sql(datos, admin_client, django_assert_num_queries):
+    with django_assert_num_queries(0):  # la consulta corre al consumir la respuesta
+        resp = admin_client.get(reverse("exportar_csv"), {"fecha_inicio": "2025-03-01", "fecha_fin": "2025-03-31"})
+    assert resp.streaming and resp["Content-Disposition"] == 'attachment; filename="corte_contable.csv"'
+    with django_assert_num_queries(1):
+        filas = [linea.split(",") for linea in b"".join(resp.streaming_content).decode().splitlines()]
+    assert filas[0][:3] == ["Folio", "Cliente", "Fecha"]
+    assert [f[:3] for f in filas[1:]] == [["R-1", "Bar", "03-Mar-2025"], ["R-2", "Bar", "03-Mar-2025"]]
+    montos = [[Decimal(v) for v in f[3:7]] + f[8:] for f in filas[1:]]
+    assert montos == [[600, 340, 40, 260, "5", "4"], [80, 0, 0, 80, "0", "0"]]
+
+def test_resumen_sigue_cambios_de_producto(datos, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        normal = Producto.objects.get(nombre="Rioja Resumen")
+        normal.costo_transporte = Decimal("20")
+        normal.es_personalizado = True
+        normal.save()
+    filas = _filas()
+    # 4 unidades × 20 de transporte; ahora todas las unidades son personalizadas
+    assert filas[("contable", D1)][3] == Decimal("80.00")
+    assert filas[("contable", D1)][5:7] == (9, 0)
+    assert filas[("flujo", D3)][3] == Decimal("60.00")
+
+    reconstruir_resumen()
+    assert _filas() == filas
+    assert resumen_periodo("contable", D2, D2)["compras_unidades_personalizadas"] == 12
+
+def test_corte_flujo_sin_rango_usa_las_filas_del_resumen(datos, admin_client):
+    Factura.objects.create(folio_factura="R-3", cliente="Bar", fecha_facturacion=D1, total=Decimal("999"))
+    resp = admin_client.get(reverse("corte_flujo"))
+    assert sorted(r["folio"] for r in resp.context["reporte"]) == ["R-1", "R-2"]  # R-3 no se ha cobrado
+    assert resp.context["totales"]["total_venta"] == Decimal("680.00")
@@ -0,0 +1,150 @@
+import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.urls import reverse
+
+from compras.models import Compra, PagoCompra, Proveedor
+from inventario.models import Producto
+from ventas.models import DetalleFactura, Factura, PagoFactura
+
+pytestmark = pytest.mark.django_db
+
+def _cache(obj):
+    obj.refresh_from_db()
+    return obj.total_pagado_cache, obj.saldo_cache, obj.estado_pago_cache
+
+def _factura(folio, total="1000.00", **kwargs):
+    return Factura.objects.create(folio_factura=folio, cliente="Bar", fecha_facturacion=date(2025, 1, 10),
+                                  total=Decimal(total), **kwargs)
+
+def test_factura_pagos_mantienen_columnas_de_saldo():
+    factura = _factura("S-1")
+    assert _cache(factura) == (Decimal("0.00"), Decimal("1000.00"), "pendiente")
+
+    pago = PagoFactura.objects.create(factura=factura, fecha_pago=date(2025, 1, 20), monto=Decimal("400"))
+    assert _cache(factura) == (Decimal("400.00"), Decimal("600.00"), "parcial")
+
+    PagoFactura.objects.create(factura=factura, fecha_pago=date(2025, 1, 25), monto=Decimal("600"))
+    assert _cache(factura) == (Decimal("1000.00"), Decimal("0.00"), "pagada")
+
+    pago.delete()
+    factura.refresh_from_db()
+    assert _cache(factura) == (Decimal("600.00"), Decimal("400.00"), "pagada")  # sigue pagado=True
+    assert (factura.total_pagado, factura.saldo_pendiente, factura.estado_pago) == _cache(factura)
+
+    # Cambiar el total (p.ej. re-importación) también recalcula
+    factura.pagado = False
+    factura.total = Decimal("1200.00")
+    factura.save()
+    assert _cache(factura) == (Decimal("600.00"), Decimal("600.00"), "parcial")
+
+def test_compra_pago_parcial_y_legado_pagado_sin_pagos():
+    prov = Proveedor.objects.create(nombre="Casa Saldos")
+    compra = Compra.objects.create(uuid="U-S1", folio="CS-1", proveedor=prov, fecha=date(2025, 1, 5),
+                                   total=Decimal("500.00"))
+    PagoCompra.objects.create(compra=compra, fecha_pago=date(2025, 1, 6), monto=Decimal("100"))
+    assert _cache(compra) == (Decimal("100.00"), Decimal("400.00"), "parcial")
+
+    legado = Compra.objects.create(uuid="U-S2", folio="CS-2", proveedor=prov, fecha=date(2025, 1, 5),
+                                   total=Decimal("300.00"), pagado=True)
+    assert _cache(legado) == (Decimal("300.00"), Decimal("0.00"), "pagada")
+
+def test_recalcular_saldos_corrige_columnas_desfasadas():
+    factura = _factura("S-2")
+    PagoFactura.objects.create(factura=factura, fecha_pago=date(2025, 1, 20), monto=Decimal("250"))
+    otra = _factura("S-3", total="80.00")
+    Factura.objects.update(total_pagado_cache=0, saldo_cache=0, estado_pago_cache="pendiente")
+
+    out = StringIO()
+    call_command("recalcular_saldos", "--solo", "ventas", stdout=out)
+    assert "ventas: 2 registro(s)" in out.getvalue()
+    assert _cache(factura) == (Decimal("250.00"), Decimal("750.00"), "parcial")
+    assert _cache(otra) == (Decimal("0.00"), Decimal("80.00"), "pendiente")
+
+def test_migraciones_llenan_saldos_existentes():
+    from importlib import import_module
+    from django.apps import apps
+
+    factura = _factura("S-4")
+    PagoFactura.objects.create(factura=factura, fecha_pago=date(2025, 1, 20), monto=Decimal("250"))
+    legado = _factura("S-5", total="80.00", pagado=True, fecha_pago=date(2025, 1, 20))
+    prov = Proveedor.objects.create(nombre="Casa Migración")
+    compra = Compra.objects.create(uuid="U-S4", folio="CS-4", proveedor=prov, fecha=date(2025, 1, 5),
+                                   total=Decimal("90.00"))
+    PagoCompra.objects.create(compra=compra, fecha_pago=date(2025, 1, 9), monto=Decimal("90"))
+    # Como quedan las filas existentes al agregar las columnas (valores por defecto)
+    Factura.objects.update(total_pagado_cache=0, saldo_cache=0, estado_pago_cache="pendiente")
+    Compra.objects.update(total_pagado_cache=0, saldo_cache=0, estado_pago_cache="pendiente")
+
+    import_module("ventas.migrations.0017_saldos_materializados").llenar_saldos(apps, None)
+    import_module("compras.migrations.0011_saldos_materializados").llenar_saldos(apps, None)
+    assert _cache(factura) == (Decimal("250.00"), Decimal("750.00"), "parcial")
+    assert _cache(legado) == (Decimal("80.00"), Decimal("0.00"), "pagada")
+    assert _cache(compra) == (Decimal("90.00"), Decimal("0.00"), "pagada")
+
+def test_with_saldos_coincide_con_propiedades(django_assert_num_queries):
+    hoy = date.today()
+    prov = Proveedor.objects.create(nombre="Casa Anotada")
+    prod = Producto.objects.create(nombre="Malbec Anotado", proveedor=prov, precio_compra=Decimal("100"),
+                                   costo_transporte=Decimal("15"), precio_venta=Decimal("180"), stock=50)
+
+    vencida_parcial = _factura("A-1", vencimiento=hoy - timedelta(days=5))
+    DetalleFactura.objects.create(factura=vencida_parcial, producto=prod, cantidad=3, precio_unitario=Decimal("180"))
+    PagoFactura.objects.create(factura=vencida_parcial, fecha_pago=hoy, monto=Decimal("100"))
+    _factura("A-2", vencimiento=hoy - timedelta(days=1))                     # vencida
+    _factura("A-3", vencimiento=hoy + timedelta(days=10))                    # pendiente
+    _factura("A-4", pagado=True, fecha_pago=hoy)                             # legado sin pagos
+    pagada = _factura("A-5", total="50.00")
+    PagoFactura.objects.create(factura=pagada, fecha_pago=hoy, monto=Decimal("50"))
+
+    esperado = {
+        f.folio_factura: (f.total_pagado, f.saldo_pendiente, f.estado_pago, f.costo_total)
+        for f in Factura.objects.all()
+    }
+    with django_assert_num_queries(1):
+        anotado = {
+            f.folio_factura: (f.total_pagado, f.saldo_pendiente, f.estado_pago, f.costo_total)
+            for f in Factura.objects.with_saldos()
+        }
+    assert anotado == esperado
+    assert esperado["A-1"] == (Decimal("100.00"), Decimal("440.00"), "vencida_parcial", Decimal("345.00"))
+    assert esperado["A-4"][:3] == (Decimal("1000.00"), Decimal("0.00"), "pagada")
+    assert set(Factura.objects.with_saldos().filter(saldo_pendiente__gt=0).values_list("folio_factura", flat=True)) == {
+        "A-1", "A-2", "A-3"
+    }
+
+    compra = Compra.objects.create(uuid="U-A1", folio="CA-1", proveedor=prov, fecha=hoy, total=Decimal("90.00"))
+    PagoCompra.objects.create(compra=compra, fecha_pago=hoy, monto=Decimal("30"))
+    c = Compra.objects.with_saldos().get(pk=compra.pk)
+    with django_assert_num_queries(0):
+        assert (c.total_pagado, c.saldo_pendiente, c.estado_pago) == (Decimal("30.00"), Decimal("60.00"), "parcial")
+
+def test_filtro_estado_pago_coincide_con_badges(admin_client):
+    hoy = date.today()
+    vencida_parcial = _factura("E-1", vencimiento=hoy - timedelta(days=5))
+    PagoFactura.objects.create(factura=vencida_parcial, fecha_pago=hoy, monto=Decimal("100"))
+    parcial = _factura("E-2", vencimiento=hoy + timedelta(days=3))
+    PagoFactura.objects.create(factura=parcial, fecha_pago=hoy, monto=Decimal("1"))
+    _factura("E-3", vencimiento=hoy - timedelta(days=1))                     # vencida
+    _factura("E-4", vencimiento=hoy)                                         # pendiente (vence hoy)
+    _factura("E-5", pagado=True, fecha_pago=hoy, vencimiento=hoy - timedelta(days=30))
+    prov = Proveedor.objects.create(nombre="Casa Filtro")
+    compra = Compra.objects.create(uuid="U-E1", folio="CE-1", proveedor=prov, fecha=hoy, total=Decimal("90.00"))
+    PagoCompra.objects.create(compra=compra, fecha_pago=hoy, monto=Decimal("30"))
+    Compra.objects.create(uuid="U-E2", folio="CE-2", proveedor=prov, fecha=hoy, total=Decimal("10.00"))
+
+    badges = {f.folio_factura: f.estado_pago for f in Factura.objects.all()}
+    assert badges == {"E-1": "vencida_parcial", "E-2": "parcial", "E-3": "vencida", "E-4": "pendiente", "E-5": "pagada"}
+    url = reverse("admin:ventas_factura_changelist")
+    for folio, estado in badges.items():
+        assert list(Factura.objects.por_estado_pago(estado).values_list("folio_factura", flat=True)) == [folio]
+        assert [f.folio_factura for f in Factura.objects.with_saldos().filter(estado_pago=estado)] == [folio]
+        resp = admin_client.get(url, {"estado_pago": estado})
+        assert [f.folio_factura for f in resp.context["cl"].result_list] == [folio]
+
+    resp = admin_client.get(reverse("admin:compras_compra_changelist"), {"estado_pago": "parcial"})
+    assert [c.folio for c in resp.context["cl"].result_list] == ["CE-1"]
+    assert [c.folio for c in Compra.objects.por_estado_pago("pendiente")] == ["CE-2"]
+    assert not Compra.objects.por_estado_pago("vencida").exists()
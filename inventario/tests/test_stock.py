@@ -0,0 +1,86 @@
+import pytest
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.db.models import Sum
+from django.utils.timezone import now
+
+from compras.models import Proveedor
+from inventario.models import Producto, MovimientoInventario
+from inventario.stock import mover_stock, registrar_movimientos, fijar_stock, productos_descuadrados
+from inventario.fusion import fusionar_productos_suave
+from ventas.utils.registrar_venta import registrar_venta_automatizada
+
+pytestmark = pytest.mark.django_db
+
+def _producto(prov, nombre, stock=0):
+    return Producto.objects.create(nombre=nombre, proveedor=prov, precio_compra=Decimal("100"),
+                                   precio_venta=Decimal("180"), stock=stock)
+
+def _bitacora(producto):
+    return MovimientoInventario.objects.filter(producto=producto).aggregate(s=Sum("cantidad"))["s"] or 0
+
+def test_alta_con_stock_y_movimientos_quedan_en_bitacora():
+    prov = Proveedor.objects.create(nombre="Casa Bitácora")
+    prod = _producto(prov, "Merlot Bitácora", stock=5)
+    assert MovimientoInventario.objects.get(producto=prod).tipo == "ajuste"
+
+    mover_stock(prod, 7, "compra", referencia="Compra F-1")
+    assert mover_stock(prod, -20, "venta", referencia="Factura 9", minimo=0) == -12
+    fijar_stock(prod, 3, referencia="Conteo físico")
+
+    prod.refresh_from_db()
+    assert prod.stock == 3 == _bitacora(prod)
+    assert list(MovimientoInventario.objects.filter(producto=prod).order_by("id").values_list("tipo", "cantidad")) == [
+        ("ajuste", 5), ("compra", 7), ("venta", -12), ("ajuste", 3),
+    ]
+
+def test_save_con_stock_viejo_no_pisa_movimiento_concurrente():
+    prov = Proveedor.objects.create(nombre="Casa Concurrente")
+    prod = _producto(prov, "Syrah Concurrente", stock=10)
+    vieja = Producto.objects.get(pk=prod.pk)
+
+    registrar_movimientos({prod.pk: -4}, "venta", referencia="Factura 10")  # otro proceso vende
+    vieja.precio_venta = Decimal("199")
+    vieja.save()  # el admin guarda con el stock que leyó antes
+
+    prod.refresh_from_db()
+    assert (prod.stock, prod.precio_venta) == (6, Decimal("199.00"))
+    assert _bitacora(prod) == 6
+
+def test_edicion_manual_de_stock_no_pisa_movimiento_concurrente():
+    prov = Proveedor.objects.create(nombre="Casa Ajuste")
+    prod = _producto(prov, "Malbec Ajuste", stock=10)
+    vieja = Producto.objects.get(pk=prod.pk)
+
+    registrar_movimientos({prod.pk: -4}, "venta", referencia="Factura 11")  # otro proceso vende
+    vieja.stock = 15  # el admin suma 5 sobre el stock que leyó antes
+    vieja.save()
+    otra = Producto.objects.get(pk=prod.pk)
+    otra.stock = 9
+    otra.save(update_fields=["stock"])
+
+    prod.refresh_from_db()
+    assert prod.stock == 9 == _bitacora(prod)
+    assert list(MovimientoInventario.objects.filter(producto=prod).order_by("id").values_list("tipo", "cantidad")) == [
+        ("ajuste", 10), ("venta", -4), ("ajuste", 5), ("ajuste", -2),
+    ]
+
+def test_venta_y_fusion_cuadran_y_conciliar_stock_corrige():
+    prov = Proveedor.objects.create(nombre="Casa Conciliar")
+    a = _producto(prov, "Tempranillo Conciliar", stock=10)
+    b = _producto(prov, "Tempranillo Conciliar Dup", stock=4)
+    registrar_venta_automatizada({
+        "folio": "V-BIT", "uuid": "U-BIT", "cliente": "Bar", "fecha_emision": now().date().isoformat(),
+        "total": "360", "productos": [{"nombre": a.nombre, "cantidad": "2", "precio_unitario": "180"}],
+    })
+    assert fusionar_productos_suave(a, b, usuario=None)["success"]
+    assert not productos_descuadrados().exists()
+
+    Producto.objects.filter(pk=a.pk).update(stock=99)  # escritura fuera del servicio
+    out = StringIO()
+    call_command("conciliar_stock", "--aplicar", stdout=out)
+    assert "1 producto(s) descuadrado(s)" in out.getvalue()
+    a.refresh_from_db()
+    b.refresh_from_db()
+    assert (a.stock, b.stock) == (12, 0)
@@ -1,6 +1,10 @@
+import heapq
 import re
+import threading
+import time
 import unicodedata
-from typing import Tuple, Optional, List
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Tuple, Optional, List, Set
 
 from inventario.models import Producto, AliasProducto
 
@@ -46,14 +50,225 @@ def normalize_text(s: str) -> str:
     return s
 
 
-def _collect_candidates() -> Tuple[List[Producto], List[AliasProducto]]:
+def _trigramas(norm: str) -> Set[str]:
+    """Trigramas de caracteres del texto normalizado (con espacio de relleno en los extremos)."""
+    padded = f" {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _dice(comunes: int, n_a: int, n_b: int) -> float:
+    return (2.0 * comunes / (n_a + n_b)) if (n_a + n_b) else 0.0
+
+
+class CatalogoIndex:
+    """
+    Índice en memoria del catálogo (nombres y alias ya normalizados).
+
+    - Exactos: dict normalizado -> set(producto_id), búsqueda O(1).
+    - Suaves: índice invertido de trigramas de caracteres y de palabras sobre
+      cada entrada (nombre o alias). Sirve para podar la búsqueda "contains" y
+      para rankear sugerencias por similitud (líneas truncadas o reordenadas).
+    Se construye con las columnas persistidas nombre_normalizado/alias_normalizado.
+    Guarda solo IDs: el Producto se lee fresco de BD al devolverlo.
+    """
+
+    def __init__(self, productos, aliases):
+        """productos: pares (id, nombre_normalizado); aliases: pares (alias_normalizado, producto_id)."""
+        self.por_nombre = defaultdict(set)
+        self.por_alias = defaultdict(set)
+        # Entradas para búsqueda suave: (normalizado, producto_id, n_trigramas, n_tokens)
+        self.entradas: List[Tuple[str, int, int, int]] = []
+        self.por_trigrama = defaultdict(list)
+        self.por_token = defaultdict(list)
+        self.cortas: List[int] = []  # entradas con < 3 caracteres (sin trigramas internos útiles)
+        self.creado_en = time.monotonic()
+
+        # Se omiten normalizados vacíos: "" está contenido en cualquier target
+        for pid, norm in productos:
+            if not norm:
+                continue
+            self.por_nombre[norm].add(pid)
+            self._agregar_entrada(norm, pid)
+        for norm, pid in aliases:
+            if not norm:
+                continue
+            self.por_alias[norm].add(pid)
+            self._agregar_entrada(norm, pid)
+
+    def _agregar_entrada(self, norm: str, pid: int) -> None:
+        i = len(self.entradas)
+        trigramas = _trigramas(norm)
+        tokens = set(norm.split())
+        self.entradas.append((norm, pid, len(trigramas), len(tokens)))
+        for t in trigramas:
+            self.por_trigrama[t].append(i)
+        for t in tokens:
+            self.por_token[t].append(i)
+        if len(norm) < 3:
+            self.cortas.append(i)
+
+    @classmethod
+    def desde_bd(cls) -> "CatalogoIndex":
+        # Los normalizados ya vienen persistidos (Producto/AliasProducto.save)
+        productos = Producto.objects.values_list("id", "nombre_normalizado")
+        aliases = AliasProducto.objects.values_list("alias_normalizado", "producto_id")
+        return cls(productos, aliases)
+
+    def alias_exacto(self, target: str) -> Set[int]:
+        return self.por_alias.get(target, set())
+
+    def nombre_exacto(self, target: str) -> Set[int]:
+        return self.por_nombre.get(target, set())
+
+    def _comunes(self, target: str) -> Tuple[Counter, Counter, int, int]:
+        """Cuenta trigramas y tokens compartidos con el target por entrada."""
+        trigramas = _trigramas(target)
+        tokens = set(target.split())
+        tri_comunes = Counter()
+        for t in trigramas:
+            tri_comunes.update(self.por_trigrama.get(t, ()))
+        tok_comunes = Counter()
+        for t in tokens:
+            tok_comunes.update(self.por_token.get(t, ()))
+        return tri_comunes, tok_comunes, len(trigramas), len(tokens)
+
+    def suaves(self, target: str) -> Set[int]:
+        """IDs cuyo nombre/alias contiene al target o está contenido en él."""
+        if len(target) < 3:
+            candidatas = range(len(self.entradas))
+        else:
+            # Si hay contención con >= 3 caracteres, comparten al menos un trigrama
+            tri_comunes, _, _, _ = self._comunes(target)
+            candidatas = set(tri_comunes) | set(self.cortas)
+        hits = set()
+        for i in candidatas:
+            norm, pid = self.entradas[i][0], self.entradas[i][1]
+            if target in norm or norm in target:
+                hits.add(pid)
+        return hits
+
+    def ranking(self, target: str, limite: int = 5) -> List[Tuple[int, float]]:
+        """
+        Candidatos ordenados por similitud con el target: [(producto_id, score)].
+        score = promedio del coeficiente de Dice sobre trigramas y sobre palabras (0..1).
+        Un producto con varios alias toma su mejor score.
+        """
+        if not target:
+            return []
+        return heapq.nlargest(limite, self._scores(target).items(), key=lambda kv: kv[1])
+
+    def autocompletar(self, target: str, limite: int = 20) -> List[Tuple[int, float]]:
+        """
+        Ranking para búsqueda mientras se teclea: primero los productos cuyo
+        nombre/alias contiene el texto o está contenido en él (ver `suaves()`),
+        luego el resto por similitud. Mismo formato que `ranking()`.
+        """
+        if not target:
+            return []
+        scores = self._scores(target)
+        contienen = self.suaves(target)
+        for pid in contienen:
+            scores.setdefault(pid, 0.0)
+        return heapq.nlargest(limite, scores.items(), key=lambda kv: (kv[0] in contienen, kv[1]))
+
+    def _scores(self, target: str) -> Dict[int, float]:
+        """Mejor score por producto entre sus entradas que comparten algún trigrama con el target."""
+        tri_comunes, tok_comunes, n_tri, n_tok = self._comunes(target)
+        mejores: Dict[int, float] = {}
+        for i, comunes in tri_comunes.items():
+            _, pid, e_tri, e_tok = self.entradas[i]
+            score = (_dice(comunes, n_tri, e_tri) + _dice(tok_comunes.get(i, 0), n_tok, e_tok)) / 2
+            if score > mejores.get(pid, 0.0):
+                mejores[pid] = score
+        return mejores
+
+
+# Índice compartido por proceso. Se invalida con las signals de Producto/AliasProducto
+# (ver inventario/signals.py) y se reconstruye perezosamente en la siguiente búsqueda.
+# El TTL es una red de seguridad para cambios hechos por otros procesos (workers).
+CATALOGO_INDEX_TTL = 300  # segundos
+
+_catalogo_index: Optional[CatalogoIndex] = None
+_catalogo_lock = threading.Lock()
+
+
+def get_catalogo_index() -> CatalogoIndex:
+    """Devuelve el índice vigente, reconstruyéndolo si fue invalidado o expiró."""
+    global _catalogo_index
+    idx = _catalogo_index
+    if idx is not None and time.monotonic() - idx.creado_en < CATALOGO_INDEX_TTL:
+        return idx
+    with _catalogo_lock:
+        idx = _catalogo_index
+        if idx is None or time.monotonic() - idx.creado_en >= CATALOGO_INDEX_TTL:
+            idx = CatalogoIndex.desde_bd()
+            _catalogo_index = idx
+        return idx
+
+
+def invalidar_catalogo_index() -> None:
+    """Descarta el índice; la siguiente búsqueda lo reconstruye."""
+    global _catalogo_index
+    _catalogo_index = None
+
+
+def _resolver_en_indice(idx: CatalogoIndex, target: str) -> Tuple[Optional[int], Optional[str]]:
+    """Aplica las prioridades de matching sobre el índice y devuelve (producto_id, error)."""
+    if not target:
+        return None, "not_found"
+    # 1) Alias exacto, 2) nombre exacto, 3) búsqueda "suave"
+    for hits in (idx.alias_exacto(target), idx.nombre_exacto(target), idx.suaves(target)):
+        if len(hits) > 1:
+            return None, "ambiguous"
+        if len(hits) == 1:
+            return next(iter(hits)), None
+    # Sin match por similitud: una línea parecida pero distinta (otra presentación,
+    # añada o variedad) debe quedar como PNR; `sugerir_productos` la propone al revisar
+    return None, "not_found"
+
+
+def encontrar_productos_unicos(nombres: Iterable[str]) -> Dict[str, Tuple[Optional[Producto], Optional[str]]]:
     """
-    Carga productos y aliases. Suficiente para catálogos pequeños/medianos.
-    (Si creciera mucho, podemos cachear normalizados en memoria por corrida.)
+    Versión por lote de encontrar_producto_unico para facturas/CSV completos.
+
+    Devuelve {nombre: (producto, error)} con el mismo contrato por nombre, usando
+    una sola carga del catálogo (índice) y una sola consulta para traer los
+    productos encontrados. Nombres repetidos comparten la misma instancia.
     """
-    productos = list(Producto.objects.all().only("id", "nombre"))
-    aliases = list(AliasProducto.objects.select_related("producto").only("id", "alias", "producto_id"))
-    return productos, aliases
+    nombres = list(dict.fromkeys(n or "" for n in nombres))
+    resultado: Dict[str, Tuple[Optional[Producto], Optional[str]]] = {}
+    pendientes = nombres
+
+    for intento in range(2):
+        idx = get_catalogo_index()
+        ids_por_nombre = {}
+        for nombre in pendientes:
+            pid, err = _resolver_en_indice(idx, normalize_text(nombre))
+            if pid is None:
+                resultado[nombre] = (None, err)
+            else:
+                ids_por_nombre[nombre] = pid
+
+        productos = Producto.objects.in_bulk(set(ids_por_nombre.values())) if ids_por_nombre else {}
+        faltantes = []
+        for nombre, pid in ids_por_nombre.items():
+            producto = productos.get(pid)
+            if producto is not None:
+                resultado[nombre] = (producto, None)
+            else:
+                faltantes.append(nombre)
+
+        if not faltantes:
+            break
+        if intento == 0:
+            # Índice desfasado (p.ej. borrado en otro proceso): reconstruir una vez
+            invalidar_catalogo_index()
+            pendientes = faltantes
+        else:
+            for nombre in faltantes:
+                resultado[nombre] = (None, "not_found")
+
+    return resultado
 
 
 def encontrar_producto_unico(texto_busqueda: str) -> Tuple[Optional[Producto], Optional[str]]:
@@ -69,53 +284,34 @@ def encontrar_producto_unico(texto_busqueda: str) -> Tuple[Optional[Producto], O
       2) Coincidencia EXACTA por nombre de producto normalizado.
       3) Coincidencia "suave" (contains) por nombre/alias normalizados si resulta única.
       En cualquier caso con >1 coincidencias -> 'ambiguous'.
+    La similitud (trigramas/palabras) nunca asigna automáticamente: solo alimenta
+    `sugerir_productos` y el autocompletado de las pantallas de PNR.
+
+    Usa el índice en memoria (get_catalogo_index): solo el texto buscado se normaliza.
+    Para resolver muchas líneas a la vez usar encontrar_productos_unicos.
     """
-    target = normalize_text(texto_busqueda or "")
-    if not target:
-        return None, "not_found"
+    return encontrar_productos_unicos([texto_busqueda])[texto_busqueda or ""]
+
 
-    productos, aliases = _collect_candidates()
-
-    # 1) Alias exacto (normalizado)
-    alias_hits = []
-    for a in aliases:
-        alias_norm = normalize_text(getattr(a, "alias", "") or "")
-        if alias_norm == target:
-            alias_hits.append(a.producto)
-    # deduplicar por id
-    alias_hits = list({p.id: p for p in alias_hits}.values())
-    if len(alias_hits) == 1:
-        return alias_hits[0], None
-    if len(alias_hits) > 1:
-        return None, "ambiguous"
-
-    # 2) Nombre de producto exacto (normalizado)
-    prod_hits = []
-    for p in productos:
-        name_norm = normalize_text(getattr(p, "nombre", "") or "")
-        if name_norm == target:
-            prod_hits.append(p)
-    prod_hits = list({p.id: p for p in prod_hits}.values())
-    if len(prod_hits) == 1:
-        return prod_hits[0], None
-    if len(prod_hits) > 1:
-        return None, "ambiguous"
-
-    # 3) Búsqueda "suave": contener/ser contenido, si resulta única
-    soft_hits = []
-    for p in productos:
-        name_norm = normalize_text(getattr(p, "nombre", "") or "")
-        if target in name_norm or name_norm in target:
-            soft_hits.append(p)
-    for a in aliases:
-        alias_norm = normalize_text(getattr(a, "alias", "") or "")
-        if target in alias_norm or alias_norm in target:
-            soft_hits.append(a.producto)
-
-    soft_hits = list({p.id: p for p in soft_hits}.values())
-    if len(soft_hits) == 1:
-        return soft_hits[0], None
-    if len(soft_hits) > 1:
-        return None, "ambiguous"
-
-    return None, "not_found"
\ No newline at end of file
+def sugerir_productos(texto: str, limite: int = 5, minimo: float = 0.3) -> List[Tuple[Producto, float]]:
+    """
+    Top-N de productos más parecidos a `texto` con su score de similitud (0..1),
+    para las pantallas de revisión de PNR. No decide: solo sugiere.
+    """
+    target = normalize_text(texto or "")
+    ranking = [(pid, score) for pid, score in get_catalogo_index().ranking(target, limite) if score >= minimo]
+    if not ranking:
+        return []
+    productos = Producto.objects.in_bulk([pid for pid, _ in ranking])
+    return [(productos[pid], score) for pid, score in ranking if pid in productos]
+
+
+def autocompletar_productos(texto: str, limite: int = 20) -> List[Tuple[Producto, float]]:
+    """
+    Productos para el buscador de los widgets de PNR mientras se teclea (ver
+    `CatalogoIndex.autocompletar`). Sin umbral mínimo: se muestra lo que haya.
+    """
+    target = normalize_text(texto or "")
+    ranking = get_catalogo_index().autocompletar(target, limite)
+    productos = Producto.objects.in_bulk([pid for pid, _ in ranking])
+    return [(productos[pid], score) for pid, score in ranking if pid in productos]
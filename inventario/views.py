@@ -1,12 +1,15 @@
 import csv
 import io
 from decimal import Decimal, InvalidOperation
-from django.http import HttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
-from .models import Producto
+from django.views.decorators.http import require_GET
+from .models import Producto, ProductoNoReconocido
 from compras.models import Proveedor
 from .forms import CSVUploadForm
-from .utils import encontrar_producto_unico
+from .utils import autocompletar_productos, encontrar_productos_unicos, sugerir_productos
+from .stock import fijar_stock
 
 
 # --- Exportar plantilla CSV con todos los productos ---
@@ -45,13 +48,17 @@ def upload_stock_csv(request):
             procesados = 0
             no_encontrados = []
 
-            for row in reader:
+            filas = list(reader)
+            # Resolver todo el CSV en lote (una carga de catálogo)
+            resueltos = encontrar_productos_unicos((row.get("producto") or "").strip() for row in filas)
+
+            for row in filas:
                 raw_nombre = (row.get("producto") or "").strip()
                 raw_stock = (row.get("stock") or "").strip()
                 if not raw_nombre:
                     continue
 
-                prod, err = encontrar_producto_unico(raw_nombre)
+                prod, err = resueltos[raw_nombre]
                 if err == "not_found":
                     no_encontrados.append(f"{raw_nombre} (no encontrado)")
                     continue
@@ -65,8 +72,7 @@ def upload_stock_csv(request):
                     no_encontrados.append(f"{raw_nombre} (stock inválido: {raw_stock})")
                     continue
 
-                prod.stock = max(0, nuevo_stock)
-                prod.save(update_fields=["stock"])
+                fijar_stock(prod, max(0, nuevo_stock), referencia="Conteo físico (CSV)")
                 procesados += 1
 
             contexto.update({"procesados": procesados, "no_encontrados": no_encontrados, "ok": True})
@@ -141,3 +147,40 @@ def upload_csv(request):
         form = CSVUploadForm()
 
     return render(request, "upload_csv.html", {"form": form})
+
+
+# --- Autocompletado de productos para los widgets de PNR ---
+LIMITE_AUTOCOMPLETAR = 20
+
+
+@staff_member_required
+@require_GET
+def api_buscar_productos(request):
+    """
+    JSON con productos rankeados para el texto `q` (índice de catálogo).
+    Sin `q`, devuelve las sugerencias para el nombre_detectado del PNR `pnr`.
+    """
+    q = (request.GET.get("q") or "").strip()
+    try:
+        limite = min(int(request.GET.get("limite") or LIMITE_AUTOCOMPLETAR), 50)
+    except ValueError:
+        limite = LIMITE_AUTOCOMPLETAR
+
+    encontrados = []
+    if q:
+        encontrados = autocompletar_productos(q, limite=limite)
+    else:
+        try:
+            pnr_id = int(request.GET.get("pnr", ""))
+        except ValueError:
+            pnr_id = None  # pnr ausente o mal formado: sin sugerencias
+        pnr = ProductoNoReconocido.objects.filter(pk=pnr_id).first() if pnr_id else None
+        if pnr:
+            encontrados = sugerir_productos(pnr.nombre_detectado, limite=limite)
+
+    return JsonResponse({
+        "resultados": [
+            {"id": p.id, "nombre": p.nombre, "stock": p.stock, "score": round(score, 3)}
+            for p, score in encontrados
+        ]
+    })
@@ -9,7 +9,6 @@ from decimal import Decimal
 from datetime import date, datetime
 
 import django
-from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
 
 # ============================
@@ -22,6 +21,7 @@ django.setup()
 # Domain imports
 # ============================
 from factura_parser import extract_invoice_data  # parser genérico ya existente
+from compras.utils.drive_session import obtener_drive
 from compras.utils.registrar_compra import registrar_compra_automatizada
 from compras.models import Compra, Proveedor
 from django.db import transaction
@@ -63,16 +63,8 @@ VALIDATION_MODE = os.getenv("VALIDATION_MODE", "lenient").lower()  # strict | le
 # Google Drive auth
 # ============================
 def get_drive() -> GoogleDrive:
-    gauth = GoogleAuth("settings.yaml")
-    gauth.LoadCredentialsFile("token.json")
-    if gauth.credentials is None:
-        gauth.LocalWebserverAuth()
-    elif gauth.access_token_expired:
-        gauth.Refresh()
-    else:
-        gauth.Authorize()
-    gauth.SaveCredentialsFile("token.json")
-    return GoogleDrive(gauth)
+    # Sesión compartida: autentica una vez por corrida y refresca el token al expirar
+    return obtener_drive()
 
 # ============================
 # Helpers
@@ -7,10 +7,7 @@ import django
 import time
 from typing import Optional, Dict
 from decimal import Decimal, InvalidOperation
-from pydrive2.auth import GoogleAuth
-from pydrive2.drive import GoogleDrive
 from django.utils import timezone
-from pydrive2.auth import RefreshError
 
 
 # === Django setup ===
@@ -18,6 +15,7 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm_project.settings")
 django.setup()
 
 from compras.extractors.pdf_reader import extract_text_from_pdf  # 👈 IMPORT NECESARIO
+from compras.utils.drive_session import obtener_drive
 from ventas.extractors.novavino import extraer_factura_novavino
 from ventas.utils.registrar_venta import registrar_venta_automatizada
 from ventas.models import Factura  # para deduplicar por folio
@@ -29,39 +27,8 @@ ERRORES_FOLDER_ID = "1f91IEc8lCW9nZA32qHW1c2L9FpAzWnqA"          # ❌ opcional:
 RENAME_ON_MOVE = True 
 
 def get_drive():
-    gauth = GoogleAuth("settings.yaml")
-
-    # Cargar credenciales previas si existen
-    try:
-        gauth.LoadCredentialsFile("token.json")
-    except Exception:
-        pass
-
-    try:
-        if gauth.credentials is None:
-            # No hay token -> flujo local con navegador
-            gauth.LocalWebserverAuth()
-        else:
-            try:
-                # Hay token -> intenta refrescar
-                if gauth.access_token_expired:
-                    gauth.Refresh()
-                else:
-                    gauth.Authorize()
-            except RefreshError:
-                # Token inválido/revocado -> borra y reautentica
-                try:
-                    os.remove("token.json")
-                except Exception:
-                    pass
-                gauth.LocalWebserverAuth()
-    except Exception:
-        # Fallback “sin navegador” (por si hay algún bloqueo del puerto localhost)
-        gauth.CommandLineAuth()
-
-    # Guarda credenciales buenas
-    gauth.SaveCredentialsFile("token.json")
-    return GoogleDrive(gauth)
+    # Sesión compartida: autentica una vez por corrida y refresca el token al expirar
+    return obtener_drive()
 
 def _move_with_retries(file, target_folder_id: str, new_title: Optional[str] = None,
                        props: Optional[Dict[str, str]] = None, max_retries: int = 3, sleep_base: float = 0.8):
@@ -1,3 +1,17 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ResumenDiario
+
+
+@admin.register(ResumenDiario)
+class ResumenDiarioAdmin(admin.ModelAdmin):
+    """Solo lectura: la tabla la mantienen los signals y `reconstruir_resumen_diario`."""
+    list_display = ("fecha", "modo", "num_facturas", "venta_total", "costo_total", "ganancia_total", "pagado_total", "compras_total")
+    list_filter = ("modo",)
+    date_hierarchy = "fecha"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,35 @@
+"""
+Reconstruye la tabla ResumenDiario (totales por día para los cortes) desde
+facturas, detalles, pagos y compras. Correr una vez después de la migración que
+la crea, y después de cambios que no la actualizan solos (p.ej. editar
+costo_transporte o es_personalizado de productos, o cargas con SQL directo).
+Ver reportes/resumen.py.
+
+Uso:
+    python manage.py reconstruir_resumen_diario
+    python manage.py reconstruir_resumen_diario --desde 2025-01-01 --hasta 2025-03-31
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from reportes.resumen import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el resumen diario de ventas, cobros y compras usado por los cortes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Fecha inicial YYYY-MM-DD (opcional)")
+        parser.add_argument("--hasta", help="Fecha final YYYY-MM-DD (opcional)")
+
+    def handle(self, *args, **options):
+        fechas = {}
+        for clave in ("desde", "hasta"):
+            valor = options[clave]
+            if valor:
+                fechas[clave] = parse_date(valor)
+                if fechas[clave] is None:
+                    raise CommandError(f"Fecha inválida para --{clave}: {valor}")
+
+        filas = reconstruir_resumen(**fechas)
+        self.stdout.write(self.style.SUCCESS(f"✓ Resumen diario reconstruido: {filas} fila(s)"))
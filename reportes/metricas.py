@@ -0,0 +1,100 @@
+# reportes/metricas.py
+"""
+Métricas de los dashboards de reportes (principal, flujo de caja y distribución
+de fondos), calculadas una vez y guardadas en el caché de Django.
+
+Las calcula `calcular_metricas()` con dos consultas sobre `with_saldos()` (una de
+facturas y otra de compras pendientes). `metricas_dashboard()` las sirve desde el
+caché con un TTL corto y las recalcula si cambió el día (las semanas del flujo
+dependen de la fecha). Los signals de reportes/signals.py llaman a
+`invalidar_metricas()` al guardar o borrar facturas, detalles, pagos y compras,
+así que lo servido desde el caché coincide con la BD. El caché es compartido
+(DatabaseCache en settings.CACHES): una escritura del worker de tareas invalida
+también lo que sirve el proceso web. Con un caché local por proceso (LocMemCache)
+eso no se cumpliría.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+CLAVE_CACHE = "reportes:metricas_dashboard"
+TTL_METRICAS = 300  # segundos
+SEMANAS_FLUJO = 5  # hoy + 4 semanas
+
+
+def calcular_metricas(hoy=None) -> Dict[str, Any]:
+    """Calcula todas las métricas de los dashboards (sin caché)."""
+    from compras.models import Compra
+    from ventas.models import Factura
+
+    hoy = hoy or timezone.now().date()
+    cero = Decimal("0.00")
+
+    # Facturas pendientes: una sola consulta con saldo y costo anotados; el reparto
+    # costo/ganancia usa las propiedades del modelo (mismo redondeo que en el admin)
+    entradas = costos_por_recuperar = ganancia_por_recibir = cero
+    num_facturas = num_facturas_con_saldo = 0
+    semanas = [
+        {"label": f"Sem {i + 1}" if i > 0 else "Hoy", "entradas": cero, "salidas": cero}
+        for i in range(SEMANAS_FLUJO)
+    ]
+    for factura in Factura.objects.with_saldos().filter(pagado=False):
+        saldo = factura.saldo_pendiente
+        num_facturas += 1
+        entradas += saldo
+        if saldo > 0:
+            num_facturas_con_saldo += 1
+        costos_por_recuperar += factura.costo_pendiente
+        ganancia_por_recibir += factura.ganancia_pendiente
+        # Facturas que vencen en cada semana (compras no tienen vencimiento)
+        if factura.vencimiento and factura.vencimiento >= hoy:
+            semana = (factura.vencimiento - hoy).days // 7
+            if semana < SEMANAS_FLUJO:
+                semanas[semana]["entradas"] += saldo
+
+    compras = Compra.objects.with_saldos().filter(pagado=False).aggregate(
+        salidas=Sum("saldo_pendiente"),
+        num=Count("id"),
+        num_con_saldo=Count("id", filter=Q(saldo_pendiente__gt=0)),
+    )
+    salidas = compras["salidas"] or cero
+
+    return {
+        "fecha": hoy,
+        # Dashboard principal
+        "total_por_cobrar": entradas,
+        "num_facturas_pendientes": num_facturas_con_saldo,
+        "total_por_pagar": salidas,
+        "num_compras_pendientes": compras["num_con_saldo"],
+        "flujo_neto": entradas - salidas,
+        # Flujo de caja
+        "entradas_proyectadas": entradas,
+        "salidas_proyectadas": salidas,
+        "num_facturas_cobrar": num_facturas,
+        "num_compras_pagar": compras["num"],
+        "semanas": semanas,
+        # Distribución de fondos
+        "costos_por_recuperar": costos_por_recuperar,
+        "ganancia_por_recibir": ganancia_por_recibir,
+        "dinero_comprometido": salidas,
+        "total_pendiente_cobro": costos_por_recuperar + ganancia_por_recibir,
+        "ganancia_neta_proyectada": ganancia_por_recibir - salidas,
+    }
+
+
+def metricas_dashboard(hoy=None) -> Dict[str, Any]:
+    """Métricas desde el caché; las recalcula si no están o son de otro día."""
+    hoy = hoy or timezone.now().date()
+    metricas: Optional[Dict[str, Any]] = cache.get(CLAVE_CACHE)
+    if metricas is None or metricas.get("fecha") != hoy:
+        metricas = calcular_metricas(hoy)
+        cache.set(CLAVE_CACHE, metricas, TTL_METRICAS)
+    return metricas
+
+
+def invalidar_metricas() -> None:
+    cache.delete(CLAVE_CACHE)
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:52
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('modo', models.CharField(choices=[('contable', 'Contable (fecha de factura)'), ('flujo', 'Flujo (fecha de pago)')], max_length=10)),
+                ('num_facturas', models.IntegerField(default=0)),
+                ('venta_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('costo_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('transporte_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('ganancia_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('pagado_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Contable: pagado de las facturas del día; flujo: cobrado en el día', max_digits=14)),
+                ('unidades_personalizadas', models.IntegerField(default=0)),
+                ('unidades_no_personalizadas', models.IntegerField(default=0)),
+                ('compras_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('compras_unidades_personalizadas', models.IntegerField(default=0)),
+                ('compras_unidades_no_personalizadas', models.IntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen diario',
+                'verbose_name_plural': 'Resúmenes diarios',
+                'ordering': ['modo', 'fecha'],
+                'constraints': [models.UniqueConstraint(fields=('modo', 'fecha'), name='unique_resumen_modo_fecha')],
+            },
+        ),
+    ]
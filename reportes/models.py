@@ -1,3 +1,48 @@
+from decimal import Decimal
+
 from django.db import models
 
-# Create your models here.
+
+class ResumenDiario(models.Model):
+    """
+    Totales de un día para los cortes (mantenidos por reportes/resumen.py).
+
+    - modo "contable": facturas por fecha de facturación (y compras por fecha de compra).
+    - modo "flujo": pagos recibidos por fecha de pago; costo, transporte y ganancia
+      se prorratean según lo pagado (mismo criterio que el corte semanal).
+    """
+    MODOS = [
+        ("contable", "Contable (fecha de factura)"),
+        ("flujo", "Flujo (fecha de pago)"),
+    ]
+
+    fecha = models.DateField()
+    modo = models.CharField(max_length=10, choices=MODOS)
+
+    num_facturas = models.IntegerField(default=0)
+    venta_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    costo_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    transporte_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    ganancia_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    pagado_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"),
+                                       help_text="Contable: pagado de las facturas del día; flujo: cobrado en el día")
+    unidades_personalizadas = models.IntegerField(default=0)
+    unidades_no_personalizadas = models.IntegerField(default=0)
+
+    # Compras (solo modo contable, por fecha de la compra)
+    compras_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    compras_unidades_personalizadas = models.IntegerField(default=0)
+    compras_unidades_no_personalizadas = models.IntegerField(default=0)
+
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["modo", "fecha"]
+        verbose_name = "Resumen diario"
+        verbose_name_plural = "Resúmenes diarios"
+        constraints = [
+            models.UniqueConstraint(fields=["modo", "fecha"], name="unique_resumen_modo_fecha"),
+        ]
+
+    def __str__(self):
+        return f"Resumen {self.modo} {self.fecha}: venta ${self.venta_total}"
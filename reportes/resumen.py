@@ -0,0 +1,282 @@
+# reportes/resumen.py
+"""
+Tabla de resumen diario (ResumenDiario) para los cortes por periodo.
+
+Los cortes ya no suman miles de facturas/detalles/pagos: suman una fila por día.
+
+    resumen_periodo("contable", fi, ff)   # por fecha de facturación (+ compras)
+    resumen_periodo("flujo", fi, ff)      # por fecha de pago, prorrateado
+
+Mantenimiento:
+  - Los signals de reportes/signals.py anotan qué días tocó cada escritura
+    (facturas, detalles, pagos, compras y sus líneas) con `programar_recalculo()`;
+    al confirmar la transacción se recalculan solo esos días con consultas
+    agrupadas (`recalcular_dias`). Un import completo recalcula sus días una vez.
+    Cambiar costo_transporte o es_personalizado de un producto recalcula los días
+    de las facturas/compras que lo usan.
+  - `manage.py reconstruir_resumen_diario` lo reconstruye todo (o un rango), p.ej.
+    después de escrituras que no pasan por save() (update(), SQL directo).
+
+Criterios (los mismos que los cortes):
+  - contable: venta = total de las facturas del día; costo = Σ cantidad × precio_compra
+    del detalle; transporte = Σ cantidad × costo_transporte del producto; pagado =
+    total pagado de esas facturas (columna total_pagado_cache).
+  - flujo: cada pago cuenta en su fecha con su monto; costo y transporte de la factura
+    se prorratean por monto / total. Facturas pagadas con el sistema antiguo (pagado=True
+    sin pagos) cuentan completas en su fecha_pago. Las unidades de una factura se
+    cuentan en la fecha de su primer pago.
+"""
+import threading
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, Optional
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Min, Q, Sum
+
+from .models import ResumenDiario
+
+CENTAVO = Decimal("0.01")
+DIAS_POR_LOTE = 200
+
+CAMPOS_ENTEROS = (
+    "num_facturas", "unidades_personalizadas", "unidades_no_personalizadas",
+    "compras_unidades_personalizadas", "compras_unidades_no_personalizadas",
+)
+CAMPOS_DINERO = (
+    "venta_total", "costo_total", "transporte_total", "ganancia_total", "pagado_total", "compras_total",
+)
+
+
+def _dinero(expr):
+    return ExpressionWrapper(expr, output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def _redondear(valor) -> Decimal:
+    return Decimal(valor or 0).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+
+def _fila_vacia(fecha, modo: str) -> Dict:
+    fila = {"fecha": fecha, "modo": modo}
+    fila.update({campo: 0 for campo in CAMPOS_ENTEROS})
+    fila.update({campo: Decimal("0.00") for campo in CAMPOS_DINERO})
+    return fila
+
+
+def _agregados_detalle(filtro: Q, agrupar_por: str):
+    """Costo, transporte y unidades de DetalleFactura agrupados (una consulta)."""
+    from ventas.models import DetalleFactura
+
+    return (
+        DetalleFactura.objects.filter(filtro)
+        .order_by()
+        .values(agrupar_por)
+        .annotate(
+            costo=Sum(_dinero(F("cantidad") * F("precio_compra"))),
+            transporte=Sum(_dinero(F("cantidad") * F("producto__costo_transporte"))),
+            pers=Sum("cantidad", filter=Q(producto__es_personalizado=True)),
+            no_pers=Sum("cantidad", filter=Q(producto__es_personalizado=False)),
+        )
+    )
+
+
+def _filas_contables(dias) -> Dict:
+    from compras.models import CompraProducto
+    from ventas.models import Factura
+
+    filas = {}
+
+    def fila(fecha):
+        if fecha not in filas:
+            filas[fecha] = _fila_vacia(fecha, "contable")
+        return filas[fecha]
+
+    facturas = (
+        Factura.objects.filter(fecha_facturacion__in=dias)
+        .order_by()
+        .values("fecha_facturacion")
+        .annotate(venta=Sum("total"), pagado=Sum("total_pagado_cache"), num=Count("id"))
+    )
+    for r in facturas:
+        f = fila(r["fecha_facturacion"])
+        f["venta_total"], f["pagado_total"], f["num_facturas"] = _redondear(r["venta"]), _redondear(r["pagado"]), r["num"]
+
+    for r in _agregados_detalle(Q(factura__fecha_facturacion__in=dias), "factura__fecha_facturacion"):
+        f = fila(r["factura__fecha_facturacion"])
+        f["costo_total"], f["transporte_total"] = _redondear(r["costo"]), _redondear(r["transporte"])
+        f["unidades_personalizadas"], f["unidades_no_personalizadas"] = r["pers"] or 0, r["no_pers"] or 0
+
+    compras = (
+        CompraProducto.objects.filter(compra__fecha__in=dias)
+        .order_by()
+        .values("compra__fecha")
+        .annotate(
+            total=Sum(_dinero(F("cantidad") * F("precio_unitario"))),
+            pers=Sum("cantidad", filter=Q(producto__es_personalizado=True)),
+            no_pers=Sum("cantidad", filter=Q(producto__es_personalizado=False)),
+        )
+    )
+    for r in compras:
+        f = fila(r["compra__fecha"])
+        f["compras_total"] = _redondear(r["total"])
+        f["compras_unidades_personalizadas"], f["compras_unidades_no_personalizadas"] = r["pers"] or 0, r["no_pers"] or 0
+
+    for f in filas.values():
+        f["ganancia_total"] = f["venta_total"] - f["costo_total"]
+    return filas
+
+
+def _filas_flujo(dias) -> Dict:
+    from ventas.models import Factura, PagoFactura
+
+    # (factura_id, fecha, monto, total de la factura, proporción)
+    cobros = [
+        (fid, fecha, monto, total, (monto / total) if total and total > 0 else Decimal("0"))
+        for fid, fecha, monto, total in PagoFactura.objects.filter(fecha_pago__in=dias)
+        .values_list("factura_id", "fecha_pago", "monto", "factura__total")
+    ]
+    # Sistema antiguo: pagada sin pagos registrados -> completa en su fecha_pago
+    legado = list(
+        Factura.objects.filter(pagado=True, fecha_pago__in=dias, pagos__isnull=True)
+        .values_list("id", "fecha_pago", "total")
+    )
+    cobros += [(fid, fecha, total, total, Decimal("1")) for fid, fecha, total in legado]
+    ids = {c[0] for c in cobros}
+
+    # Unidades: en la fecha del primer pago (o fecha_pago del sistema antiguo)
+    dia_unidades = {
+        r["factura_id"]: r["primer_pago"]
+        for r in PagoFactura.objects.filter(factura_id__in=ids)
+        .order_by().values("factura_id")
+        .annotate(primer_pago=Min("fecha_pago")).filter(primer_pago__in=dias)
+    }
+    dia_unidades.update({fid: fecha for fid, fecha, _ in legado})
+
+    por_factura = {r["factura_id"]: r for r in _agregados_detalle(Q(factura_id__in=ids), "factura_id")}
+
+    filas = {}
+    facturas_por_dia = defaultdict(set)
+    for fid, fecha, monto, total, proporcion in cobros:
+        f = filas.setdefault(fecha, _fila_vacia(fecha, "flujo"))
+        det = por_factura.get(fid, {})
+        f["venta_total"] += _redondear(monto)
+        f["pagado_total"] += _redondear(monto)
+        f["costo_total"] += _redondear((det.get("costo") or 0) * proporcion)
+        f["transporte_total"] += _redondear((det.get("transporte") or 0) * proporcion)
+        facturas_por_dia[fecha].add(fid)
+    for fid, fecha in dia_unidades.items():
+        f = filas.setdefault(fecha, _fila_vacia(fecha, "flujo"))
+        det = por_factura.get(fid, {})
+        f["unidades_personalizadas"] += det.get("pers") or 0
+        f["unidades_no_personalizadas"] += det.get("no_pers") or 0
+
+    for fecha, f in filas.items():
+        f["num_facturas"] = len(facturas_por_dia[fecha])
+        f["ganancia_total"] = f["venta_total"] - f["costo_total"]
+    return filas
+
+
+def _lotes(dias: Iterable):
+    dias = sorted(set(d for d in dias if d))
+    for i in range(0, len(dias), DIAS_POR_LOTE):
+        yield dias[i:i + DIAS_POR_LOTE]
+
+
+@transaction.atomic
+def recalcular_dias(contable: Iterable = (), flujo: Iterable = ()) -> int:
+    """Recalcula (borra y vuelve a insertar) las filas de esos días. Devuelve filas escritas."""
+    escritas = 0
+    for modo, dias, calcular in (("contable", contable, _filas_contables), ("flujo", flujo, _filas_flujo)):
+        for lote in _lotes(dias):
+            filas = calcular(lote)
+            ResumenDiario.objects.filter(modo=modo, fecha__in=lote).delete()
+            ResumenDiario.objects.bulk_create([ResumenDiario(**f) for f in filas.values()])
+            escritas += len(filas)
+    return escritas
+
+
+def reconstruir_resumen(desde=None, hasta=None) -> int:
+    """Reconstruye el resumen de todos los días con movimientos (opcionalmente en un rango)."""
+    from compras.models import Compra
+    from ventas.models import Factura, PagoFactura
+
+    def en_rango(campo):
+        filtro = Q()
+        if desde:
+            filtro &= Q(**{f"{campo}__gte": desde})
+        if hasta:
+            filtro &= Q(**{f"{campo}__lte": hasta})
+        return filtro
+
+    contable = set(Factura.objects.filter(en_rango("fecha_facturacion")).values_list("fecha_facturacion", flat=True).distinct())
+    contable |= set(Compra.objects.filter(en_rango("fecha")).values_list("fecha", flat=True).distinct())
+    flujo = set(PagoFactura.objects.filter(en_rango("fecha_pago")).values_list("fecha_pago", flat=True).distinct())
+    flujo |= set(Factura.objects.filter(en_rango("fecha_pago"), pagado=True).values_list("fecha_pago", flat=True).distinct())
+
+    with transaction.atomic():
+        # Días que quedaron sin movimientos
+        ResumenDiario.objects.filter(en_rango("fecha")).delete()
+        return recalcular_dias(contable, flujo)
+
+
+def resumen_periodo(modo: str, fecha_inicio=None, fecha_fin=None) -> Dict:
+    """Suma las filas de ResumenDiario del periodo (sin fechas: todo el histórico)."""
+    qs = ResumenDiario.objects.filter(modo=modo)
+    if fecha_inicio:
+        qs = qs.filter(fecha__gte=fecha_inicio)
+    if fecha_fin:
+        qs = qs.filter(fecha__lte=fecha_fin)
+    totales = qs.aggregate(**{campo: Sum(campo) for campo in CAMPOS_ENTEROS + CAMPOS_DINERO})
+    for campo in CAMPOS_ENTEROS:
+        totales[campo] = totales[campo] or 0
+    for campo in CAMPOS_DINERO:
+        totales[campo] = totales[campo] or Decimal("0.00")
+    venta = totales["venta_total"]
+    totales["porcentaje_ganancia"] = (totales["ganancia_total"] / venta * 100) if venta > 0 else Decimal("0")
+    return totales
+
+
+# ----------------------------- recálculo diferido -----------------------------
+
+_pendientes = threading.local()
+
+
+def _estado_pendiente() -> Dict[str, set]:
+    if not hasattr(_pendientes, "estado"):
+        _pendientes.estado = {"contable": set(), "flujo": set(), "facturas": set(), "compras": set()}
+    return _pendientes.estado
+
+
+def programar_recalculo(contable=(), flujo=(), facturas=(), compras=()) -> None:
+    """
+    Anota días (o facturas/compras cuyos días se resuelven después) para recalcular
+    al confirmar la transacción actual (de inmediato si no hay transacción).
+    """
+    estado = _estado_pendiente()
+    estado["contable"].update(d for d in contable if d)
+    estado["flujo"].update(d for d in flujo if d)
+    estado["facturas"].update(i for i in facturas if i)
+    estado["compras"].update(i for i in compras if i)
+    transaction.on_commit(aplicar_recalculo_pendiente)
+
+
+def aplicar_recalculo_pendiente() -> Optional[int]:
+    from compras.models import Compra
+    from ventas.models import Factura, PagoFactura
+
+    estado = _estado_pendiente()
+    if not any(estado.values()):
+        return None
+    del _pendientes.estado
+    contable, flujo = set(estado["contable"]), set(estado["flujo"])
+
+    if estado["facturas"]:
+        for ff, fp in Factura.objects.filter(id__in=estado["facturas"]).values_list("fecha_facturacion", "fecha_pago"):
+            contable.add(ff)
+            flujo.add(fp)
+        flujo.update(
+            PagoFactura.objects.filter(factura_id__in=estado["facturas"]).values_list("fecha_pago", flat=True).distinct()
+        )
+    if estado["compras"]:
+        contable.update(Compra.objects.filter(id__in=estado["compras"]).values_list("fecha", flat=True))
+    return recalcular_dias(contable, flujo)
@@ -0,0 +1,126 @@
+# reportes/signals.py
+"""
+Signals de reportes:
+
+1. Invalidan el caché de métricas de los dashboards (reportes/metricas.py) cuando
+   cambia algo que entra en el cálculo: facturas, sus detalles y pagos, compras y
+   sus pagos, y productos (su costo entra en costo_total). Se invalida al momento
+   y otra vez al confirmar la transacción, para que una lectura concurrente no deje
+   en caché datos de antes del commit.
+
+2. Anotan los días del ResumenDiario que toca cada escritura (reportes/resumen.py);
+   se recalculan al confirmar la transacción. Las fechas con las que se cargó cada
+   instancia se guardan en post_init para recalcular también el día anterior
+   cuando una fecha cambia. Igual con costo_transporte y es_personalizado de
+   Producto: si cambian, se recalculan los días de las facturas/compras que lo usan.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+
+from compras.models import Compra, CompraProducto, PagoCompra
+from inventario.models import Producto
+from ventas.models import DetalleFactura, Factura, PagoFactura
+
+from .metricas import invalidar_metricas
+from .resumen import programar_recalculo
+
+MODELOS_METRICAS = (Factura, DetalleFactura, PagoFactura, Compra, PagoCompra, Producto)
+
+# Campos de fecha que ubican cada modelo en el resumen
+FECHAS_RESUMEN = {
+    Factura: ("fecha_facturacion", "fecha_pago"),
+    PagoFactura: ("fecha_pago",),
+    Compra: ("fecha",),
+}
+
+
+def invalidar_metricas_dashboard(sender, **kwargs):
+    invalidar_metricas()
+    transaction.on_commit(invalidar_metricas)
+
+
+for modelo in MODELOS_METRICAS:
+    etiqueta = modelo._meta.label_lower
+    post_save.connect(invalidar_metricas_dashboard, sender=modelo, dispatch_uid=f"metricas_save_{etiqueta}")
+    post_delete.connect(invalidar_metricas_dashboard, sender=modelo, dispatch_uid=f"metricas_delete_{etiqueta}")
+
+
+# ----------------------------- resumen diario -----------------------------
+
+def _guardar_fechas_cargadas(sender, instance, **kwargs):
+    # __dict__ para no disparar consultas con campos diferidos (.only/.defer)
+    instance._fechas_resumen = {campo: instance.__dict__.get(campo) for campo in FECHAS_RESUMEN[sender]}
+
+
+def _fechas(instance, campo):
+    """Fecha actual y la que tenía al cargarse (si cambió)."""
+    return {getattr(instance, campo, None), getattr(instance, "_fechas_resumen", {}).get(campo)}
+
+
+def resumen_factura(sender, instance, **kwargs):
+    programar_recalculo(
+        contable=_fechas(instance, "fecha_facturacion"),
+        flujo=_fechas(instance, "fecha_pago"),
+        facturas=[instance.pk],
+    )
+    _guardar_fechas_cargadas(sender, instance)
+
+
+def resumen_pago_factura(sender, instance, **kwargs):
+    programar_recalculo(flujo=_fechas(instance, "fecha_pago"), facturas=[instance.factura_id])
+    _guardar_fechas_cargadas(sender, instance)
+
+
+def resumen_detalle_factura(sender, instance, **kwargs):
+    programar_recalculo(facturas=[instance.factura_id])
+
+
+def resumen_compra(sender, instance, **kwargs):
+    programar_recalculo(contable=_fechas(instance, "fecha"))
+    _guardar_fechas_cargadas(sender, instance)
+
+
+def resumen_compra_producto(sender, instance, **kwargs):
+    programar_recalculo(compras=[instance.compra_id])
+
+
+# Campos del producto que entran en el resumen (transporte y unidades personalizadas)
+CAMPOS_PRODUCTO_RESUMEN = ("costo_transporte", "es_personalizado")
+
+
+def _guardar_producto_cargado(sender, instance, **kwargs):
+    instance._campos_resumen = {campo: instance.__dict__.get(campo) for campo in CAMPOS_PRODUCTO_RESUMEN}
+
+
+def resumen_producto(sender, instance, created=False, **kwargs):
+    """Si cambió el transporte o es_personalizado, recalcula los días de las facturas/compras que lo usan."""
+    antes = getattr(instance, "_campos_resumen", {})
+    cambiados = {
+        campo for campo in CAMPOS_PRODUCTO_RESUMEN
+        if not created and campo in antes and antes[campo] != getattr(instance, campo)
+    }
+    if cambiados:
+        facturas = DetalleFactura.objects.filter(producto=instance).values_list("factura_id", flat=True).distinct()
+        compras = ()
+        if "es_personalizado" in cambiados:
+            compras = CompraProducto.objects.filter(producto=instance).values_list("compra_id", flat=True).distinct()
+        programar_recalculo(facturas=facturas, compras=compras)
+    _guardar_producto_cargado(sender, instance)
+
+
+post_init.connect(_guardar_producto_cargado, sender=Producto, dispatch_uid="resumen_init_inventario.producto")
+post_save.connect(resumen_producto, sender=Producto, dispatch_uid="resumen_save_inventario.producto")
+
+for modelo in FECHAS_RESUMEN:
+    post_init.connect(_guardar_fechas_cargadas, sender=modelo, dispatch_uid=f"resumen_init_{modelo._meta.label_lower}")
+
+for modelo, receptor in (
+    (Factura, resumen_factura),
+    (PagoFactura, resumen_pago_factura),
+    (DetalleFactura, resumen_detalle_factura),
+    (Compra, resumen_compra),
+    (CompraProducto, resumen_compra_producto),
+):
+    etiqueta = modelo._meta.label_lower
+    post_save.connect(receptor, sender=modelo, dispatch_uid=f"resumen_save_{etiqueta}")
+    post_delete.connect(receptor, sender=modelo, dispatch_uid=f"resumen_delete_{etiqueta}")
@@ -1,6 +1,8 @@
+from django.core.paginator import Paginator
 from django.shortcuts import render
 from django.views.generic import TemplateView
-from django.db.models import Sum, Count, Q, F
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -8,6 +10,8 @@ from decimal import Decimal
 from ventas.models import Factura
 from compras.models import Compra
 
+from .metricas import metricas_dashboard
+
 
 class DashboardPrincipalView(TemplateView):
     """Dashboard principal con resumen de todos los reportes."""
@@ -15,105 +19,104 @@ class DashboardPrincipalView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        metricas = metricas_dashboard()
         
-        # Resumen de cuentas por cobrar
-        # No podemos filtrar por estado_pago (es una propiedad), así que obtenemos todas las no pagadas
-        facturas_pendientes = Factura.objects.filter(pagado=False)
-        # Filtrar las que realmente tienen saldo pendiente
-        facturas_con_saldo = [f for f in facturas_pendientes if f.saldo_pendiente > 0]
-        context['total_por_cobrar'] = sum(f.saldo_pendiente for f in facturas_con_saldo)
-        context['num_facturas_pendientes'] = len(facturas_con_saldo)
-        
-        # Resumen de cuentas por pagar
-        compras_pendientes = Compra.objects.filter(pagado=False)
-        compras_con_saldo = [c for c in compras_pendientes if c.saldo_pendiente > 0]
-        context['total_por_pagar'] = sum(c.saldo_pendiente for c in compras_con_saldo)
-        context['num_compras_pendientes'] = len(compras_con_saldo)
-        
-        # Flujo neto proyectado
-        context['flujo_neto'] = context['total_por_cobrar'] - context['total_por_pagar']
+        # Resumen de cuentas por cobrar / por pagar y flujo neto proyectado
+        for clave in ('total_por_cobrar', 'num_facturas_pendientes',
+                      'total_por_pagar', 'num_compras_pendientes', 'flujo_neto'):
+            context[clave] = metricas[clave]
         
         return context
 
 
 class CuentasPorCobrarView(TemplateView):
-    """Dashboard de cobranza - Cuentas por cobrar."""
+    """Dashboard de cobranza - Cuentas por cobrar.
+
+    Totales, agrupación por cliente y antigüedad salen de consultas agrupadas
+    sobre `with_saldos()`; el detalle de facturas va paginado.
+    """
     template_name = 'reportes/cuentas_por_cobrar.html'
-    
+    facturas_por_pagina = 50
+
+    # (clave, etiqueta, días vencidos mínimo, máximo); las no vencidas caen en 0-30
+    TRAMOS_ANTIGUEDAD = (
+        ('dias_0_30', '0-30', None, 30),
+        ('dias_31_60', '31-60', 31, 60),
+        ('dias_61_90', '61-90', 61, 90),
+        ('dias_mas_90', '+90', 91, None),
+    )
+
+    @staticmethod
+    def _suma_saldo(condicion=None):
+        saldo = F('saldo_pendiente') if condicion is None else Case(When(condicion, then=F('saldo_pendiente')))
+        return Coalesce(
+            Sum(saldo),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        
-        # Facturas pendientes o parciales
-        facturas = Factura.objects.filter(
-            pagado=False
-        ).select_related().prefetch_related('pagos')
-        
-        # Total por cobrar
-        context['total_por_cobrar'] = sum(f.saldo_pendiente for f in facturas)
-        context['num_facturas'] = facturas.count()
-        
-        # Agrupar por cliente
-        por_cliente = {}
-        for factura in facturas:
-            cliente = factura.cliente
-            if cliente not in por_cliente:
-                por_cliente[cliente] = {
-                    'cliente': cliente,
-                    'facturas': [],
-                    'total_saldo': Decimal('0.00'),
-                    'vencidas': 0,
-                    'monto_vencido': Decimal('0.00'),
-                }
-            por_cliente[cliente]['facturas'].append(factura)
-            por_cliente[cliente]['total_saldo'] += factura.saldo_pendiente
-            
-            # Verificar si está vencida
-            if factura.vencimiento and timezone.now().date() > factura.vencimiento:
-                por_cliente[cliente]['vencidas'] += 1
-                por_cliente[cliente]['monto_vencido'] += factura.saldo_pendiente
-        
-        context['por_cliente'] = sorted(
-            por_cliente.values(),
-            key=lambda x: x['total_saldo'],
-            reverse=True
-        )
-        
-        # Antigüedad de saldos
         hoy = timezone.now().date()
-        antiguedad = {
-            'dias_0_30': {'facturas': 0, 'monto': Decimal('0.00'), 'label': '0-30'},
-            'dias_31_60': {'facturas': 0, 'monto': Decimal('0.00'), 'label': '31-60'},
-            'dias_61_90': {'facturas': 0, 'monto': Decimal('0.00'), 'label': '61-90'},
-            'dias_mas_90': {'facturas': 0, 'monto': Decimal('0.00'), 'label': '+90'},
+
+        # Facturas pendientes o parciales
+        facturas = Factura.objects.with_saldos().filter(pagado=False)
+        vencida = Q(vencimiento__lt=hoy)
+
+        # Totales y antigüedad de saldos en un solo aggregate condicional
+        agregados = {
+            'total_por_cobrar': self._suma_saldo(),
+            'num_facturas': Count('id'),
+            'num_vencidas': Count('id', filter=vencida),
+            'monto_vencido': self._suma_saldo(vencida),
         }
-        
-        for factura in facturas:
-            if factura.vencimiento:
-                dias = (hoy - factura.vencimiento).days
-                if dias <= 0:
-                    # No vencida
-                    antiguedad['dias_0_30']['facturas'] += 1
-                    antiguedad['dias_0_30']['monto'] += factura.saldo_pendiente
-                elif dias <= 30:
-                    antiguedad['dias_0_30']['facturas'] += 1
-                    antiguedad['dias_0_30']['monto'] += factura.saldo_pendiente
-                elif dias <= 60:
-                    antiguedad['dias_31_60']['facturas'] += 1
-                    antiguedad['dias_31_60']['monto'] += factura.saldo_pendiente
-                elif dias <= 90:
-                    antiguedad['dias_61_90']['facturas'] += 1
-                    antiguedad['dias_61_90']['monto'] += factura.saldo_pendiente
-                else:
-                    antiguedad['dias_mas_90']['facturas'] += 1
-                    antiguedad['dias_mas_90']['monto'] += factura.saldo_pendiente
-        
-        context['antiguedad'] = antiguedad
-        
-        # Facturas vencidas
-        facturas_vencidas = [f for f in facturas if f.vencimiento and hoy > f.vencimiento]
-        context['num_vencidas'] = len(facturas_vencidas)
-        context['monto_vencido'] = sum(f.saldo_pendiente for f in facturas_vencidas)
-        
+        for clave, _, desde, hasta in self.TRAMOS_ANTIGUEDAD:
+            tramo = Q(vencimiento__isnull=False)
+            if desde is not None:
+                tramo &= Q(vencimiento__lte=hoy - timedelta(days=desde))
+            if hasta is not None:
+                tramo &= Q(vencimiento__gte=hoy - timedelta(days=hasta))
+            agregados[f'{clave}_facturas'] = Count('id', filter=tramo)
+            agregados[f'{clave}_monto'] = self._suma_saldo(tramo)
+        resumen = facturas.aggregate(**agregados)
+
+        context['total_por_cobrar'] = resumen['total_por_cobrar']
+        context['num_facturas'] = resumen['num_facturas']
+        context['num_vencidas'] = resumen['num_vencidas']
+        context['monto_vencido'] = resumen['monto_vencido']
+
+        total = resumen['total_por_cobrar']
+        context['antiguedad'] = {
+            clave: {
+                'facturas': resumen[f'{clave}_facturas'],
+                'monto': resumen[f'{clave}_monto'],
+                'porcentaje': (resumen[f'{clave}_monto'] / total * 100) if total else Decimal('0'),
+                'label': etiqueta,
+            }
+            for clave, etiqueta, _, _ in self.TRAMOS_ANTIGUEDAD
+        }
+
+        # Agrupar por cliente (GROUP BY cliente)
+        context['por_cliente'] = (
+            facturas.order_by()
+            .values('cliente')
+            .annotate(
+                num_facturas=Count('id'),
+                total_saldo=self._suma_saldo(),
+                vencidas=Count('id', filter=vencida),
+                monto_vencido=self._suma_saldo(vencida),
+            )
+            .order_by('-total_saldo', 'cliente')
+        )
+
+        # Detalle de facturas, paginado (opcionalmente de un solo cliente)
+        cliente = self.request.GET.get('cliente', '')
+        detalle = facturas.order_by('vencimiento', 'folio_numero', 'id')
+        if cliente:
+            detalle = detalle.filter(cliente=cliente)
+        context['cliente'] = cliente
+        context['facturas'] = Paginator(detalle, self.facturas_por_pagina).get_page(self.request.GET.get('page'))
+
         return context
 
 
@@ -125,9 +128,9 @@ class CuentasPorPagarView(TemplateView):
         context = super().get_context_data(**kwargs)
         
         # Compras pendientes o parciales
-        compras = Compra.objects.filter(
+        compras = Compra.objects.with_saldos().filter(
             pagado=False
-        ).select_related('proveedor').prefetch_related('pagos')
+        ).select_related('proveedor')
         
         # Total por pagar
         context['total_por_pagar'] = sum(c.saldo_pendiente for c in compras)
@@ -161,48 +164,12 @@ class FlujoCajaView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        metricas = metricas_dashboard()
         
-        # Entradas proyectadas (por cobrar)
-        facturas_pendientes = Factura.objects.filter(pagado=False)
-        entradas = sum(f.saldo_pendiente for f in facturas_pendientes)
-        
-        # Salidas proyectadas (por pagar)
-        compras_pendientes = Compra.objects.filter(pagado=False)
-        salidas = sum(c.saldo_pendiente for c in compras_pendientes)
-        
-        # Flujo neto
-        flujo_neto = entradas - salidas
-        
-        context.update({
-            'entradas_proyectadas': entradas,
-            'salidas_proyectadas': salidas,
-            'flujo_neto': flujo_neto,
-            'num_facturas_cobrar': facturas_pendientes.count(),
-            'num_compras_pagar': compras_pendientes.count(),
-        })
-        
-        # Datos para gráfica (próximas 4 semanas)
-        hoy = timezone.now().date()
-        semanas = []
-        
-        for i in range(5):  # Hoy + 4 semanas
-            fecha_inicio = hoy + timedelta(weeks=i)
-            fecha_fin = fecha_inicio + timedelta(days=6)
-            
-            # Facturas que vencen esta semana
-            facturas_semana = [
-                f for f in facturas_pendientes 
-                if f.vencimiento and fecha_inicio <= f.vencimiento <= fecha_fin
-            ]
-            
-            semana_data = {
-                'label': f"Sem {i+1}" if i > 0 else "Hoy",
-                'entradas': sum(f.saldo_pendiente for f in facturas_semana),
-                'salidas': Decimal('0.00'),  # Por ahora, compras no tienen vencimiento
-            }
-            semanas.append(semana_data)
-        
-        context['semanas'] = semanas
+        # Entradas (por cobrar), salidas (por pagar) y gráfica de las próximas 4 semanas
+        for clave in ('entradas_proyectadas', 'salidas_proyectadas', 'flujo_neto',
+                      'num_facturas_cobrar', 'num_compras_pagar', 'semanas'):
+            context[clave] = metricas[clave]
         
         return context
 
@@ -213,29 +180,12 @@ class DistribucionFondosView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        metricas = metricas_dashboard()
         
-        # Facturas pendientes
-        facturas_pendientes = Factura.objects.filter(pagado=False)
-        
-        # De las facturas pendientes, calcular:
-        # - Costos por recuperar (dinero que debemos a proveedores)
-        # - Ganancia por recibir (ganancia neta)
-        costos_por_recuperar = sum(f.costo_pendiente for f in facturas_pendientes)
-        ganancia_por_recibir = sum(f.ganancia_pendiente for f in facturas_pendientes)
-        
-        # Compras pendientes (dinero comprometido)
-        compras_pendientes = Compra.objects.filter(pagado=False)
-        dinero_comprometido = sum(c.saldo_pendiente for c in compras_pendientes)
-        
-        # Ganancia neta proyectada (ganancia por recibir menos obligaciones pendientes)
-        ganancia_neta_proyectada = ganancia_por_recibir - dinero_comprometido
-        
-        context.update({
-            'costos_por_recuperar': costos_por_recuperar,
-            'ganancia_por_recibir': ganancia_por_recibir,
-            'dinero_comprometido': dinero_comprometido,
-            'total_pendiente_cobro': costos_por_recuperar + ganancia_por_recibir,
-            'ganancia_neta_proyectada': ganancia_neta_proyectada,
-        })
+        # De las facturas pendientes: costos por recuperar y ganancia por recibir;
+        # de las compras pendientes: dinero comprometido
+        for clave in ('costos_por_recuperar', 'ganancia_por_recibir', 'dinero_comprometido',
+                      'total_pendiente_cobro', 'ganancia_neta_proyectada'):
+            context[clave] = metricas[clave]
         
         return context
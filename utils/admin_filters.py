@@ -0,0 +1,27 @@
+# utils/admin_filters.py
+"""
+Filtros del admin compartidos por Factura (ventas) y Compra (compras).
+"""
+from django.contrib import admin
+
+from utils.saldos import ESTADOS_PAGO
+
+
+class EstadoPagoFilter(admin.SimpleListFilter):
+    """
+    Filtro por estado de pago con la misma clasificación que los badges
+    (`SaldosQuerySet.condiciones_estado_pago`). Filtra sobre las columnas
+    materializadas, sin joins a pagos. Los estados vencidos solo aparecen si el
+    modelo tiene vencimiento.
+    """
+    title = 'Estado de Pago'
+    parameter_name = 'estado_pago'
+
+    def lookups(self, request, model_admin):
+        estados = model_admin.model._default_manager.all().condiciones_estado_pago()
+        return [(estado, etiqueta.upper()) for estado, etiqueta in ESTADOS_PAGO if estado in estados]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.por_estado_pago(self.value())
+        return queryset
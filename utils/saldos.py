@@ -0,0 +1,262 @@
+# utils/saldos.py
+"""
+Saldos de pago materializados para Factura (ventas) y Compra (compras).
+
+Las propiedades total_pagado / saldo_pendiente / estado_pago suman `pagos.all()`
+en cada llamada; estas columnas guardan el mismo resultado para que listas,
+filtros y reportes puedan filtrar, ordenar y sumar en SQL.
+
+Se mantienen al día:
+  - al guardar la factura/compra si cambia `total` o `pagado` (SaldosPagoMixin.save),
+  - al guardar o borrar un pago (PagoFactura/PagoCompra y sus signals post_delete),
+  - al migrar (compras/0011 y ventas/0017 las llenan desde los pagos existentes),
+  - en bloque con `manage.py recalcular_saldos` si hace falta repararlas.
+
+Para los valores al día (incluido lo "vencido") sin consultas por fila está
+`Modelo.objects.with_saldos()`, que anota total_pagado / saldo_pendiente /
+estado_pago en SQL; las propiedades del modelo devuelven el valor anotado si existe.
+
+`estado_pago_cache` no depende de la fecha (pendiente / parcial / pagada); lo
+"vencido" se deduce de `vencimiento` al consultar, así la columna no caduca.
+La clasificación completa (con vencida / vencida_parcial) está en un solo lugar,
+`condiciones_estado_pago()`: de ahí salen la anotación `estado_pago` y el filtro
+`por_estado_pago()` del admin (utils/admin_filters.py).
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Optional, Tuple
+
+from django.db import models
+from django.db.models import Case, CharField, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+CENTAVO = Decimal("0.01")
+
+ESTADOS_PAGO_CACHE = [
+    ("pendiente", "Pendiente"),
+    ("parcial", "Parcial"),
+    ("pagada", "Pagada"),
+]
+
+# Estados que ve el usuario (badges, filtros): los del caché más los vencidos
+ESTADOS_PAGO = [
+    ("pagada", "Pagada"),
+    ("parcial", "Parcial"),
+    ("pendiente", "Pendiente"),
+    ("vencida", "Vencida"),
+    ("vencida_parcial", "Vencida parcial"),
+]
+
+CAMPOS_SALDO = ("total_pagado_cache", "saldo_cache", "estado_pago_cache")
+
+
+def calcular_saldos(total, pagado: bool, suma_pagos) -> Tuple[Decimal, Decimal, str]:
+    """
+    (total_pagado, saldo, estado) con las mismas reglas que las propiedades:
+    si `pagado=True` (sistema antiguo) y no hay pagos, se considera pagado el total.
+    """
+    total = Decimal(total or 0)
+    suma = Decimal(suma_pagos or 0).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+    total_pagado = total if (pagado and suma == 0) else suma
+    saldo = max(Decimal("0.00"), total - total_pagado).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+
+    if pagado or (total_pagado and total_pagado >= total):
+        estado = "pagada"
+    elif total_pagado == 0:
+        estado = "pendiente"
+    else:
+        estado = "parcial"
+    return total_pagado, saldo, estado
+
+
+class propiedad_anotable:
+    """
+    Como @property, pero si el queryset anotó un valor con el mismo nombre
+    (p.ej. `with_saldos()`), devuelve ese valor en vez de calcularlo.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        if self.name in obj.__dict__:
+            return obj.__dict__[self.name]
+        return self.func(obj)
+
+    def __set__(self, obj, value):
+        # Django asigna las anotaciones con setattr al construir la instancia
+        obj.__dict__[self.name] = value
+
+
+def _dinero(expr):
+    return Coalesce(expr, Value(Decimal("0.00")), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def suma_relacionada(model, related_name: str, expr):
+    """Subquery con SUM(expr) de los registros relacionados de cada fila (0 si no hay)."""
+    relacion = model._meta.get_field(related_name)
+    fk = relacion.field.name
+    suma = (
+        relacion.related_model._default_manager.filter(**{fk: OuterRef("pk")})
+        .order_by()
+        .values(fk)
+        .annotate(s=Sum(expr))
+        .values("s")
+    )
+    return _dinero(Subquery(suma))
+
+
+def condiciones_estado_pago(pagada: Q, parcial: Q, pendiente: Q, campo_vencimiento: Optional[str] = None,
+                            hoy=None) -> Dict[str, Q]:
+    """
+    Clasificación de estado de pago como Q mutuamente excluyentes (estado -> Q).
+
+    `pagada`/`parcial`/`pendiente` no dependen de la fecha y deben excluirse entre
+    sí; si el modelo vence, parcial y pendiente se parten por `campo_vencimiento < hoy`.
+    La usan tanto la anotación `estado_pago` (ver `expresion_estado_pago`) como los
+    filtros, así una fila siempre cae en el estado que muestra su badge.
+    """
+    if not campo_vencimiento:
+        return {"pagada": pagada, "parcial": parcial, "pendiente": pendiente}
+    vencida = Q(**{f"{campo_vencimiento}__lt": hoy or timezone.now().date()})
+    return {
+        "pagada": pagada,
+        "parcial": parcial & ~vencida,
+        "pendiente": pendiente & ~vencida,
+        "vencida": pendiente & vencida,
+        "vencida_parcial": parcial & vencida,
+    }
+
+
+def expresion_estado_pago(condiciones: Dict[str, Q]) -> Case:
+    """CASE SQL con el estado de pago de cada fila a partir de `condiciones_estado_pago()`."""
+    return Case(
+        *[When(condicion, then=Value(estado)) for estado, condicion in condiciones.items()],
+        default=Value("parcial"),
+        output_field=CharField(),
+    )
+
+
+class SaldosQuerySet(models.QuerySet):
+    """QuerySet para modelos con SaldosPagoMixin. Ver `with_saldos()`."""
+
+    # Campo de fecha límite para "vencida"/"vencida_parcial" (None = el modelo no vence)
+    campo_vencimiento = None
+
+    def condiciones_estado_pago(self, materializado: bool = True, hoy=None) -> Dict[str, Q]:
+        """
+        Q por estado de pago. Con `materializado=True` usa `estado_pago_cache` y el
+        campo de vencimiento (filtrable por índice, sin anotar); si no, requiere las
+        anotaciones de `with_saldos()` y refleja los pagos al momento.
+        """
+        if materializado:
+            base = {estado: Q(estado_pago_cache=estado) for estado, _ in ESTADOS_PAGO_CACHE}
+        else:
+            sin_pagos = Q(total_pagado=0)
+            pagada = Q(pagado=True) | (~sin_pagos & Q(total_pagado__gte=F("total")))
+            base = {
+                "pagada": pagada,
+                "parcial": Q(pagado=False) & ~sin_pagos & Q(total_pagado__lt=F("total")),
+                "pendiente": Q(pagado=False) & sin_pagos,
+            }
+        return condiciones_estado_pago(
+            base["pagada"], base["parcial"], base["pendiente"], self.campo_vencimiento, hoy
+        )
+
+    def por_estado_pago(self, estado: str, hoy=None):
+        """Filtra por estado de pago (ver ESTADOS_PAGO) sobre las columnas materializadas."""
+        condiciones = self.condiciones_estado_pago(materializado=True, hoy=hoy)
+        if estado not in condiciones:
+            return self.none()
+        return self.filter(condiciones[estado])
+
+    def with_saldos(self):
+        """
+        Anota total_pagado, saldo_pendiente y estado_pago con las mismas reglas que
+        las propiedades (incluida la compatibilidad pagado=True sin pagos), sin
+        consultas por fila. Se puede filtrar y ordenar por ellos.
+        """
+        return self.annotate(
+            suma_pagos=suma_relacionada(self.model, "pagos", "monto"),
+        ).annotate(
+            total_pagado=Case(
+                When(pagado=True, suma_pagos=0, then=F("total")),
+                default=F("suma_pagos"),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        ).annotate(
+            saldo_pendiente=Greatest(
+                F("total") - F("total_pagado"), Value(Decimal("0.00")),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+            estado_pago=expresion_estado_pago(self.condiciones_estado_pago(materializado=False)),
+        )
+
+
+class SaldosPagoMixin(models.Model):
+    """Columnas de saldo para modelos con `total`, `pagado` y related_name="pagos"."""
+
+    total_pagado_cache = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00"), editable=False,
+        help_text="Total pagado (materializado; ver utils/saldos.py)",
+    )
+    saldo_cache = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal("0.00"), editable=False,
+        help_text="Saldo pendiente (materializado)",
+    )
+    estado_pago_cache = models.CharField(
+        max_length=10, choices=ESTADOS_PAGO_CACHE, default="pendiente", editable=False, db_index=True,
+        help_text="Estado de pago sin considerar vencimiento (materializado)",
+    )
+
+    class Meta:
+        abstract = True
+
+    def _asignar_saldos(self, suma_pagos) -> None:
+        self.total_pagado_cache, self.saldo_cache, self.estado_pago_cache = calcular_saldos(
+            self.total, self.pagado, suma_pagos
+        )
+
+    def _suma_pagos(self):
+        return self.pagos.aggregate(s=Sum("monto"))["s"] or Decimal("0")
+
+    def actualizar_saldos(self) -> None:
+        """Recalcula las columnas desde los pagos y las guarda con un UPDATE (sin save() ni signals)."""
+        self._asignar_saldos(self._suma_pagos())
+        type(self)._default_manager.filter(pk=self.pk).update(
+            **{campo: getattr(self, campo) for campo in CAMPOS_SALDO}
+        )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"total", "pagado"} & set(update_fields):
+            self._asignar_saldos(Decimal("0") if self._state.adding else self._suma_pagos())
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *CAMPOS_SALDO}
+        super().save(*args, **kwargs)
+
+
+def recalcular_saldos_en_lote(queryset, batch_size: int = 500) -> int:
+    """
+    Backfill: recalcula las columnas de saldo de todo `queryset` (Factura o Compra)
+    con una sola consulta agregada y bulk_update solo de las filas que cambiaron.
+    Devuelve cuántas filas se actualizaron.
+    """
+    filas = queryset.order_by().annotate(
+        suma_pagos=Coalesce(Sum("pagos__monto"), Value(Decimal("0")), output_field=DecimalField())
+    ).only("pk", "total", "pagado", *CAMPOS_SALDO)
+
+    cambiadas = []
+    for obj in filas.iterator(chunk_size=batch_size):
+        antes = tuple(getattr(obj, c) for c in CAMPOS_SALDO)
+        obj._asignar_saldos(obj.suma_pagos)
+        if tuple(getattr(obj, c) for c in CAMPOS_SALDO) != antes:
+            cambiadas.append(obj)
+    queryset.model._default_manager.bulk_update(cambiadas, CAMPOS_SALDO, batch_size=batch_size)
+    return len(cambiadas)
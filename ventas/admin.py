@@ -59,9 +59,11 @@ class FacturaAdmin(admin.ModelAdmin):
     ordering = ["-fecha_facturacion", "-id"]
     
     def get_queryset(self, request):
-        """Personaliza el queryset para ordenamiento."""
+        """Saldos (with_saldos) y PNR pendientes anotados en SQL: el listado no consulta por fila."""
         qs = super().get_queryset(request)
-        return qs
+        return qs.with_saldos().annotate(
+            pnr_pendientes=ProductoNoReconocido.pendientes_por_factura(origen="venta"),
+        )
     fieldsets = (
         (None, {
             "fields": (
@@ -131,7 +133,7 @@ class FacturaAdmin(admin.ModelAdmin):
             return format_html('<span style="color: #27ae60;">{}</span>', total_str)
         return format_html('<span style="color: #95a5a6;">$0.00</span>')
     total_pagado_display.short_description = "Pagado"
-    total_pagado_display.admin_order_field = "total"
+    total_pagado_display.admin_order_field = "total_pagado"
     
     def saldo_pendiente_display(self, obj):
         """Muestra saldo pendiente."""
@@ -141,6 +143,7 @@ class FacturaAdmin(admin.ModelAdmin):
             return format_html('<span style="color: #e74c3c;">{}</span>', saldo_str)
         return format_html('<span style="color: #27ae60;">$0.00</span>')
     saldo_pendiente_display.short_description = "Saldo"
+    saldo_pendiente_display.admin_order_field = "saldo_pendiente"
     
     def estado_pago_display(self, obj):
         """Muestra estado de pago sin fondo de color (solo emoji y texto)."""
@@ -256,11 +259,16 @@ class FacturaAdmin(admin.ModelAdmin):
     # ✅ Función para mostrar estado detallado con conteo de PNR
     def estado_detallado(self, obj):
         """Muestra estado resumido con conteo de PNR pendientes."""
-        pnr_pendientes = ProductoNoReconocido.objects.filter(
-            uuid_factura=obj.uuid_factura,
-            procesado=False,
-            origen="venta"
-        ).count() if obj.uuid_factura else 0
+        if not obj.uuid_factura:
+            pnr_pendientes = 0
+        elif hasattr(obj, "pnr_pendientes"):  # anotado en get_queryset
+            pnr_pendientes = obj.pnr_pendientes
+        else:
+            pnr_pendientes = ProductoNoReconocido.objects.filter(
+                uuid_factura=obj.uuid_factura,
+                procesado=False,
+                origen="venta"
+            ).count()
         
         if obj.requiere_revision_manual or pnr_pendientes > 0:
             if obj.estado_revision == "pendiente":
@@ -308,92 +316,20 @@ class FacturaAdmin(admin.ModelAdmin):
     # ✅ Vista custom para procesar facturas de Drive
     def procesar_drive_view(self, request):
         """
-        Vista custom para procesar facturas de ventas desde Google Drive.
+        Encola el procesamiento de facturas pendientes en Google Drive y redirige a
+        la página de progreso. El lote lo ejecuta el worker
+        (`python manage.py procesar_tareas`), fuera del request.
         No requiere selección de items.
         """
-        try:
-            from ventas.utils.drive_processor import DriveVentasProcessor
-            
-            # Mostrar mensaje de inicio
-            self.message_user(
-                request,
-                "🔄 Iniciando procesamiento de facturas de ventas desde Google Drive...",
-                level=messages.INFO
-            )
-            
-            # Crear procesador
-            processor = DriveVentasProcessor()
-            
-            # Procesar todas las facturas
-            resultado = processor.process_all_invoices(move_files=True)
-            
-            # Preparar mensaje de resumen
-            total = resultado["total"]
-            success = resultado["success"]
-            error = resultado["error"]
-            
-            if total == 0:
-                self.message_user(
-                    request,
-                    "⚠️ No se encontraron facturas pendientes en Google Drive.",
-                    level=messages.WARNING
-                )
-            else:
-                # Mensaje principal de éxito
-                if error == 0:
-                    nivel = messages.SUCCESS
-                    icono = "✅"
-                elif success > 0:
-                    nivel = messages.WARNING
-                    icono = "⚠️"
-                else:
-                    nivel = messages.ERROR
-                    icono = "❌"
-                
-                mensaje_principal = (
-                    f"{icono} Procesamiento completado: "
-                    f"{success} registradas, "
-                    f"{error} errores "
-                    f"(de {total} archivos)"
-                )
-                self.message_user(request, mensaje_principal, level=nivel)
-                
-                # Mensajes detallados de errores
-                if error > 0:
-                    detalles_error = [
-                        d for d in resultado["details"] 
-                        if d["status"] == "error"
-                    ]
-                    for detalle in detalles_error[:5]:  # Mostrar max 5 errores
-                        error_msg = f"❌ Error en {detalle['file']}: {detalle['error'][:100]}"
-                        self.message_user(request, error_msg, level=messages.ERROR)
-                    
-                    if error > 5:
-                        self.message_user(
-                            request,
-                            f"⚠️ ... y {error - 5} errores más. Revisa la carpeta 'Facturas Ventas Errores' en Drive.",
-                            level=messages.WARNING
-                        )
-                    
-        except ImportError as e:
-            self.message_user(
-                request,
-                f"❌ Error: No se pudo importar el módulo drive_processor. {str(e)}",
-                level=messages.ERROR
-            )
-        except Exception as e:
-            import traceback
-            error_trace = traceback.format_exc()
-            self.message_user(
-                request,
-                f"❌ Error inesperado al procesar facturas: {str(e)}",
-                level=messages.ERROR
-            )
-            # Log detallado en consola para debugging
-            print(f"\n{'='*80}\nERROR EN PROCESAR_DRIVE_VIEW (VENTAS):\n{error_trace}\n{'='*80}\n")
-        
-        # Redirigir de vuelta a la lista de facturas
-        return HttpResponseRedirect(reverse('admin:ventas_factura_changelist'))
+        from inventario.tareas import encolar_tarea
+
+        tarea = encolar_tarea("drive_ventas", usuario=request.user)
+        self.message_user(
+            request,
+            "🔄 Procesamiento de facturas de ventas desde Google Drive encolado.",
+            level=messages.INFO
+        )
+        return redirect('admin:inventario_tareasegundoplano_progreso', tarea.pk)
     
     # ✅ Widget de resumen de revisión (PNR)
     def resumen_revision(self, obj):
@@ -4,65 +4,9 @@ Filtros personalizados para el admin de Facturas.
 """
 from django.contrib import admin
 from django.utils import timezone
-from django.db.models import Q, Sum
 from datetime import timedelta
 
-
-class EstadoPagoFilter(admin.SimpleListFilter):
-    """Filtro por estado de pago: PAGADA, PARCIAL, PENDIENTE, VENCIDA."""
-    title = 'Estado de Pago'
-    parameter_name = 'estado_pago'
-
-    def lookups(self, request, model_admin):
-        return (
-            ('pagada', 'PAGADA'),
-            ('parcial', 'PARCIAL'),
-            ('pendiente', 'PENDIENTE'),
-            ('vencida', 'VENCIDA'),
-        )
-
-    def queryset(self, request, queryset):
-        hoy = timezone.now().date()
-        
-        if self.value() == 'pagada':
-            # Pagadas: pagado=True O total_pagado >= total
-            return queryset.filter(
-                Q(pagado=True) | 
-                Q(pagos__isnull=False)
-            ).annotate(
-                total_pagos=Sum('pagos__monto')
-            ).filter(
-                total_pagos__gte=models.F('total')
-            ).distinct()
-        
-        elif self.value() == 'parcial':
-            # Parcial: tiene pagos pero no está completamente pagada
-            return queryset.filter(
-                pagado=False,
-                pagos__isnull=False
-            ).annotate(
-                total_pagos=Sum('pagos__monto')
-            ).filter(
-                total_pagos__lt=models.F('total'),
-                total_pagos__gt=0
-            ).distinct()
-        
-        elif self.value() == 'pendiente':
-            # Pendiente: sin pagos y no vencida
-            return queryset.filter(
-                pagado=False,
-                pagos__isnull=True,
-                vencimiento__gte=hoy
-            ).distinct()
-        
-        elif self.value() == 'vencida':
-            # Vencida: sin pagar completamente y vencimiento pasado
-            return queryset.filter(
-                pagado=False,
-                vencimiento__lt=hoy
-            ).distinct()
-        
-        return queryset
+from utils.admin_filters import EstadoPagoFilter  # noqa: F401  (compartido con compras)
 
 
 class VencimientoFilter(admin.SimpleListFilter):
@@ -154,7 +98,3 @@ class MetodoPagoRegistradoFilter(admin.SimpleListFilter):
                 pagos__metodo_pago=self.value()
             ).distinct()
         return queryset
-
-
-# Importar models para usar en los filtros
-from django.db import models
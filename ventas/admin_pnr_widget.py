@@ -7,7 +7,9 @@ from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.middleware.csrf import get_token
 from decimal import Decimal
-from inventario.models import Producto, ProductoNoReconocido
+from inventario.buscador_productos import SCRIPT_BUSCADOR_PRODUCTOS, render_selector_producto
+from inventario.models import ProductoNoReconocido
+from inventario.utils import sugerir_productos
 
 
 def render_widget_pnr_ventas(obj, request):
@@ -51,9 +53,6 @@ def render_widget_pnr_ventas(obj, request):
                         'Solo puedes asignar a productos existentes y opcionalmente crear un alias.'
                         '</p>')
         
-        # Cargar productos para dropdowns (limitado para performance)
-        productos_disponibles = list(Producto.objects.all().order_by("nombre")[:500])
-        
         for idx, pnr in enumerate(pnr_pendientes[:10], 1):
             cantidad = pnr.cantidad or 0
             precio_u = pnr.precio_unitario or 0
@@ -76,15 +75,14 @@ def render_widget_pnr_ventas(obj, request):
             html_parts.append(
                 f'<div style="flex: 1; min-width: 300px;">'
                 f'<label style="display: block; font-size: 0.85em; font-weight: bold; margin-bottom: 4px; color: #555;">Asignar a producto existente:</label>'
-                f'<select id="producto_id_{pnr_id_val}" required style="width: 100%; padding: 6px; font-size: 0.85em; margin-bottom: 6px; border: 1px solid #ccc; border-radius: 3px;">'
-                f'<option value="">-- Selecciona producto --</option>'
             )
             
-            for prod in productos_disponibles:
-                html_parts.append(f'<option value="{prod.id}">{prod.nombre} (Stock: {prod.stock})</option>')
+            # Sugerencias por similitud con el nombre detectado (índice de catálogo);
+            # el resto del catálogo se busca bajo demanda (api_buscar_productos)
+            sugeridos = sugerir_productos(pnr.nombre_detectado, limite=5)
+            html_parts.append(render_selector_producto(pnr, sugeridos, mostrar_stock=True))
             
             html_parts.append(
-                f'</select>'
                 f'<label style="font-size: 0.8em; display: block; margin: 6px 0; color: #666;">'
                 f'<input type="checkbox" id="crear_alias_{pnr_id_val}" checked style="margin-right: 4px;" /> Crear alias automáticamente'
                 f'</label>'
@@ -359,6 +357,7 @@ def render_widget_pnr_ventas(obj, request):
         )
     
     # Agregar JavaScript para manejar el submit de PNR
+    html_parts.append(SCRIPT_BUSCADOR_PRODUCTOS)
     html_parts.append(
         "<script>"
         "function asignarPNRVenta(btn) {"
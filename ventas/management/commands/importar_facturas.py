@@ -5,17 +5,20 @@ from collections import defaultdict
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 from ventas.models import Factura, DetalleFactura
+from ventas.utils.registrar_venta import hash_contenido, sincronizar_detalles
 from inventario.models import Producto
-from inventario.utils import encontrar_producto_unico  # usamos tu buscador seguro
+from inventario.utils import encontrar_productos_unicos  # usamos tu buscador seguro (en lote)
 
 
 class Command(BaseCommand):
     help = (
         "Importa facturas desde CSV de manera idempotente por folio. "
-        "Si el folio ya existe, reemplaza TODOS los detalles dentro de una transacción "
-        "(restaura stock de los detalles anteriores y descuenta el de los nuevos). "
+        "Si el folio ya existe, aplica solo las diferencias por producto dentro de una transacción "
+        "(altas, bajas y cambios de cantidad, con su ajuste de stock); si sus filas no cambiaron "
+        "desde la última importación, la salta. "
         "Formato de columnas (mínimas): "
         "folio_factura,cliente,fecha_facturacion,producto,cantidad,precio_unitario"
     )
@@ -65,16 +68,22 @@ class Command(BaseCommand):
                 resumen["errores"] += 1
                 continue
 
+            huella = hash_contenido([row for _, row in filas])
             try:
                 # Transacción por FACTURA ⇒ (8) si algo falla, no queda a medias (stock incluido)
                 with transaction.atomic():
-                    # Idempotencia ⇒ si existe, reemplazamos detalles (borramos todos y recreamos)
+                    # Idempotencia ⇒ si existe y sus filas no cambiaron, no hay nada que hacer
+                    if Factura.objects.filter(folio_factura=folio, hash_contenido=huella).exists():
+                        resumen["saltadas"] += 1
+                        continue
+
+                    # Si existe, se aplican solo las diferencias de detalles
                     factura, creada = Factura.objects.get_or_create(
                         folio_factura=folio,
                         defaults={
                             "cliente": (filas[0][1].get("cliente") or "").strip(),
-                            # Ajusta parseo de fecha según formato que uses
-                            "fecha_facturacion": (filas[0][1].get("fecha_facturacion") or timezone.now().date()),
+                            # Fecha ISO (AAAA-MM-DD); sin fecha, hoy
+                            "fecha_facturacion": parse_date((filas[0][1].get("fecha_facturacion") or "").strip()) or timezone.now().date(),
                             "total": Decimal("0.00"),
                         },
                     )
@@ -84,19 +93,22 @@ class Command(BaseCommand):
                         # Si traes fecha en CSV, setéala; si no, conserva la actual
                         fecha_csv = (filas[0][1].get("fecha_facturacion") or "").strip()
                         if fecha_csv:
-                            factura.fecha_facturacion = fecha_csv  # parsea si necesitas DateField
+                            factura.fecha_facturacion = parse_date(fecha_csv) or factura.fecha_facturacion
                         factura.save(update_fields=["cliente", "fecha_facturacion"])
 
-                        # Borrar TODOS los detalles actuales → signals restauran stock
-                        DetalleFactura.objects.filter(factura=factura).delete()
+                    # Resolver todos los productos de la factura en lote
+                    resueltos = encontrar_productos_unicos(
+                        (row.get("producto") or "").strip() for _, row in filas
+                    )
 
-                    # Crear los nuevos detalles según CSV → signals descuentan stock y recalculan total
+                    # Detalles según CSV (producto_id -> DetalleFactura sin guardar)
+                    lineas = {}
                     for line_no, row in filas:
                         nombre = (row.get("producto") or "").strip()
                         if not nombre:
                             raise CommandError(f"[{folio}] Fila {line_no}: 'producto' vacío.")
 
-                        prod, err = encontrar_producto_unico(nombre)
+                        prod, err = resueltos[nombre]
                         if err == "not_found":
                             raise CommandError(f"[{folio}] Fila {line_no}: producto '{nombre}' no encontrado.")
                         if err == "ambiguous":
@@ -131,8 +143,12 @@ class Command(BaseCommand):
                             except InvalidOperation:
                                 raise CommandError(f"[{folio}] Fila {line_no}: precio_compra inválido '{raw_pc}'.")
 
+                        if prod.id in lineas:
+                            # Producto repetido en el CSV: se suma la cantidad
+                            lineas[prod.id].cantidad += qty
+                            continue
+
                         kwargs = {
-                            "factura": factura,
                             "producto": prod,
                             "cantidad": qty,
                             "precio_unitario": precio_unitario,
@@ -140,9 +156,14 @@ class Command(BaseCommand):
                         if "precio_compra" in [f.name for f in DetalleFactura._meta.get_fields()]:
                             kwargs["precio_compra"] = precio_compra if precio_compra is not None else getattr(prod, "precio_compra", None)
 
-                        DetalleFactura.objects.create(**kwargs)
+                        lineas[prod.id] = DetalleFactura(**kwargs)
+
+                    # Solo altas, bajas y cambios de cantidad (stock en un UPDATE); total una vez
+                    sincronizar_detalles(factura, lineas)
+                    factura.hash_contenido = huella
+                    factura.save(update_fields=["hash_contenido"])
+                    factura.calcular_total()
 
-                    # Al salir del with, signals ya recalcularon total y ajustaron stock por cada renglón
                     if dry:
                         # Forzar rollback “manual” en dry-run
                         raise transaction.TransactionManagementError("DRY-RUN: rollback intencional")
@@ -168,8 +189,8 @@ class Command(BaseCommand):
         # Reporte final
         self.stdout.write("")
         self.stdout.write(self.style.SUCCESS(f"Facturas creadas: {resumen['creadas']}"))
-        self.stdout.write(self.style.SUCCESS(f"Facturas actualizadas (reemplazadas): {resumen['actualizadas']}"))
-        self.stdout.write(self.style.WARNING(f"Saltadas: {resumen['saltadas']}"))
+        self.stdout.write(self.style.SUCCESS(f"Facturas actualizadas (con diferencias): {resumen['actualizadas']}"))
+        self.stdout.write(self.style.WARNING(f"Saltadas (sin cambios): {resumen['saltadas']}"))
         self.stdout.write(self.style.ERROR(f"Errores: {resumen['errores']}"))
         if problemas:
             self.stdout.write("\nDetalle de problemas:")
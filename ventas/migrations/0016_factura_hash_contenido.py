@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0015_alter_factura_folio_factura'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='hash_contenido',
+            field=models.CharField(blank=True, default='', editable=False, help_text='SHA-256 de los datos importados (para saltar re-importaciones sin cambios)', max_length=64),
+        ),
+    ]
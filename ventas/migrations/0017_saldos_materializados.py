@@ -0,0 +1,67 @@
+# Generated by Django 5.1.2 on 2026-10-18 11:43
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
+
+
+CENTAVO = Decimal("0.01")
+
+
+def _saldos(total, pagado, suma_pagos):
+    # Copia congelada de utils.saldos.calcular_saldos (la migración no debe cambiar con el código)
+    total = Decimal(total or 0)
+    suma = Decimal(suma_pagos or 0).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+    total_pagado = total if (pagado and suma == 0) else suma
+    saldo = max(Decimal("0.00"), total - total_pagado).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+    if pagado or (total_pagado and total_pagado >= total):
+        estado = "pagada"
+    elif total_pagado == 0:
+        estado = "pendiente"
+    else:
+        estado = "parcial"
+    return total_pagado, saldo, estado
+
+
+def llenar_saldos(apps, schema_editor):
+    """Calcula las columnas nuevas desde los pagos existentes (antes de esto todo quedaría 'pendiente')."""
+    Modelo = apps.get_model("ventas", "Factura")
+    campos = ("total_pagado_cache", "saldo_cache", "estado_pago_cache")
+    filas = Modelo.objects.order_by().annotate(
+        suma_pagos=Coalesce(Sum("pagos__monto"), Value(Decimal("0")), output_field=models.DecimalField())
+    ).only("pk", "total", "pagado", *campos)
+    lote = []
+    for obj in filas.iterator(chunk_size=500):
+        obj.total_pagado_cache, obj.saldo_cache, obj.estado_pago_cache = _saldos(obj.total, obj.pagado, obj.suma_pagos)
+        lote.append(obj)
+        if len(lote) >= 500:
+            Modelo.objects.bulk_update(lote, campos)
+            lote = []
+    Modelo.objects.bulk_update(lote, campos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0016_factura_hash_contenido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='estado_pago_cache',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('parcial', 'Parcial'), ('pagada', 'Pagada')], db_index=True, default='pendiente', editable=False, help_text='Estado de pago sin considerar vencimiento (materializado)', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='saldo_cache',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Saldo pendiente (materializado)', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='factura',
+            name='total_pagado_cache',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Total pagado (materializado; ver utils/saldos.py)', max_digits=12),
+        ),
+        migrations.RunPython(llenar_saldos, migrations.RunPython.noop),
+    ]
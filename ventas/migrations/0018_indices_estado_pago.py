@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0017_saldos_materializados'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['pagado', 'vencimiento'], name='factura_pagado_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['estado_pago_cache', 'vencimiento'], name='factura_estado_venc_idx'),
+        ),
+    ]
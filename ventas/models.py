@@ -3,13 +3,57 @@ from decimal import Decimal, ROUND_HALF_UP
 
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models import F, Sum, DecimalField, ExpressionWrapper
+from django.db.models import F, Q, Sum, DecimalField, ExpressionWrapper, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from inventario.models import Producto
+from utils.saldos import SaldosPagoMixin, SaldosQuerySet, propiedad_anotable, suma_relacionada
 
 
-class Factura(models.Model):
+class FacturaQuerySet(SaldosQuerySet):
+    campo_vencimiento = "vencimiento"
+
+    def with_saldos(self):
+        """Además de los saldos, anota costo_total (costo actual del producto + transporte)."""
+        return super().with_saldos().annotate(
+            costo_total=suma_relacionada(
+                self.model, "detalles",
+                ExpressionWrapper(
+                    F("cantidad") * (F("producto__precio_compra") + F("producto__costo_transporte")),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+            )
+        )
+
+    def with_totales_detalle(self):
+        """
+        Anota costo_proveedores (Σ cantidad × precio_compra del detalle), transporte
+        (Σ cantidad × costo_transporte del producto) y unidades_personalizadas /
+        unidades_no_personalizadas, en la misma consulta (agrupada por factura).
+        """
+        dinero = DecimalField(max_digits=14, decimal_places=2)
+        return self.annotate(
+            costo_proveedores=Coalesce(
+                Sum(ExpressionWrapper(F("detalles__cantidad") * F("detalles__precio_compra"), output_field=dinero)),
+                Value(Decimal("0.00")), output_field=dinero,
+            ),
+            transporte=Coalesce(
+                Sum(ExpressionWrapper(
+                    F("detalles__cantidad") * F("detalles__producto__costo_transporte"), output_field=dinero
+                )),
+                Value(Decimal("0.00")), output_field=dinero,
+            ),
+            unidades_personalizadas=Coalesce(
+                Sum("detalles__cantidad", filter=Q(detalles__producto__es_personalizado=True)), Value(0)
+            ),
+            unidades_no_personalizadas=Coalesce(
+                Sum("detalles__cantidad", filter=Q(detalles__producto__es_personalizado=False)), Value(0)
+            ),
+        )
+
+
+class Factura(SaldosPagoMixin, models.Model):
     METODO_PAGO_CHOICES = [
         ('PUE', 'PUE - Pago en una sola exhibición'),
         ('PPD', 'PPD - Pago en parcialidades o diferido'),
@@ -41,12 +85,23 @@ class Factura(models.Model):
         help_text="Estado de revisión de la factura"
     )
     uuid_factura = models.CharField(max_length=100, null=True, blank=True, help_text="UUID del CFDI para vincular con PNR")
+    hash_contenido = models.CharField(max_length=64, blank=True, default="", editable=False, help_text="SHA-256 de los datos importados (para saltar re-importaciones sin cambios)")
     
     # Campos para VPG (Venta Público General)
     es_vpg = models.BooleanField(default=False, help_text="Marca si es una Venta Público General (no tiene folio fiscal)")
     folio_vpg_anio = models.IntegerField(null=True, blank=True, help_text="Año del folio VPG (ej: 2025)")
     folio_vpg_numero = models.IntegerField(null=True, blank=True, help_text="Número consecutivo del VPG en el año (ej: 1, 2, 3...)")
 
+    objects = FacturaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Cobranza/VencimientoFilter: pagado=False con rangos de vencimiento
+            models.Index(fields=["pagado", "vencimiento"], name="factura_pagado_venc_idx"),
+            # EstadoPagoFilter: estado materializado partido por vencimiento
+            models.Index(fields=["estado_pago_cache", "vencimiento"], name="factura_estado_venc_idx"),
+        ]
+
     # --- Validación de consistencia pagado/fecha_pago ---
     def clean(self):
         # Ambos vacíos -> ok (pendiente)
@@ -159,7 +214,7 @@ class Factura(models.Model):
     
     # ========== FASE 1: PROPIEDADES PARA PAGOS PARCIALES ==========
     
-    @property
+    @propiedad_anotable
     def costo_total(self):
         """Suma de costos de todos los productos incluyendo transporte (siempre recalcula)."""
         total = sum(
@@ -185,7 +240,7 @@ class Factura(models.Model):
         """Porcentaje del total que representa la ganancia."""
         return (Decimal("1.00") - self.porcentaje_costo).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
     
-    @property
+    @propiedad_anotable
     def total_pagado(self):
         """Total de pagos recibidos hasta el momento.
         
@@ -199,13 +254,13 @@ class Factura(models.Model):
         
         return Decimal(total).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
     
-    @property
+    @propiedad_anotable
     def saldo_pendiente(self):
         """Saldo que falta por pagar."""
         saldo = self.total - self.total_pagado
         return max(Decimal("0.00"), saldo).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
     
-    @property
+    @propiedad_anotable
     def estado_pago(self):
         """Estado del pago: pendiente, parcial, pagada, vencida.
         
@@ -277,7 +332,8 @@ class DetalleFactura(models.Model):
         transporte = self.producto.costo_transporte or Decimal("0.00")
         return (precio_base + transporte).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
-    def save(self, *args, **kwargs):
+    def calcular_importes(self):
+        """Completa precio_compra y subtotal en memoria (también lo usa el registro en lote)."""
         # Si no viene costo, calcúlalo desde el producto (precio_compra + costo_transporte)
         if self.producto and (self.precio_compra is None or Decimal(self.precio_compra) == 0):
             precio_base = self.producto.precio_compra or Decimal("0.00")
@@ -289,6 +345,8 @@ class DetalleFactura(models.Model):
         pvu = Decimal(self.precio_unitario or 0)
         self.subtotal = (cant * pvu).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
+    def save(self, *args, **kwargs):
+        self.calcular_importes()
         super().save(*args, **kwargs)
         if hasattr(self.factura, "calcular_total"):
             self.factura.calcular_total()
@@ -384,7 +442,8 @@ class PagoFactura(models.Model):
             self.factura.fecha_pago = None
         
         # No llamar full_clean de factura para evitar validación de pagado/fecha_pago
-        # porque estamos en medio de actualizar esos campos
+        # porque estamos en medio de actualizar esos campos (el save también
+        # recalcula las columnas de saldo, ver utils/saldos.py)
         self.factura.save(update_fields=["pagado", "fecha_pago"])
 
     def __str__(self):
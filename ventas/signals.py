@@ -1,4 +1,6 @@
 # ventas/signals.py
+import threading
+from contextlib import contextmanager
 from decimal import Decimal
 from django.db.models.signals import pre_save, post_save, post_delete, pre_delete
 from django.dispatch import receiver
@@ -8,6 +10,28 @@ from django.conf import settings
 
 from ventas.models import DetalleFactura, Factura, PagoFactura
 from inventario.models import Producto
+from inventario.stock import mover_stock
+
+_estado = threading.local()
+
+
+@contextmanager
+def signals_detalle_suspendidas():
+    """
+    Desactiva (en este hilo) los ajustes de stock y total por cada DetalleFactura.
+    Lo usa el registro en lote de ventas, que aplica stock y totales una sola vez.
+    """
+    previo = getattr(_estado, "suspendidas", False)
+    _estado.suspendidas = True
+    try:
+        yield
+    finally:
+        _estado.suspendidas = previo
+
+
+def _suspendidas():
+    return getattr(_estado, "suspendidas", False)
+
 
 def _recalc_factura_total(factura):
     expr = ExpressionWrapper(
@@ -20,6 +44,8 @@ def _recalc_factura_total(factura):
 
 @receiver(pre_save, sender=DetalleFactura)
 def _cache_old_qty(sender, instance, **kwargs):
+    if _suspendidas():
+        return
     # Guarda la cantidad previa para calcular deltas en updates
     if instance.pk:
         old = sender.objects.filter(pk=instance.pk).values_list("cantidad", flat=True).first()
@@ -29,6 +55,8 @@ def _cache_old_qty(sender, instance, **kwargs):
 
 @receiver(post_save, sender=DetalleFactura)
 def _on_detalle_save(sender, instance, created, **kwargs):
+    if _suspendidas():
+        return
     # Ajuste de stock (venta => descuenta)
     producto = getattr(instance, "producto", None)
     if isinstance(producto, Producto):
@@ -36,23 +64,22 @@ def _on_detalle_save(sender, instance, created, **kwargs):
         vieja = getattr(instance, "_old_qty", 0) or 0
         delta = nueva if created else (nueva - vieja)
         if delta:
-            p = producto
-            p.stock = max(0, (p.stock or 0) - delta)
-            p.save(update_fields=["stock"])
+            mover_stock(producto, -delta, "venta",
+                        referencia=f"Factura {instance.factura.folio_factura}", minimo=0)
 
     # Recalcular total de la factura
     _recalc_factura_total(instance.factura)
 
 @receiver(post_delete, sender=DetalleFactura)
 def _on_detalle_delete(sender, instance, **kwargs):
+    if _suspendidas():
+        return
     # Restaurar stock al eliminar el detalle
     producto = getattr(instance, "producto", None)
     if isinstance(producto, Producto):
         qty = instance.cantidad or 0
         if qty:
-            p = producto
-            p.stock = (p.stock or 0) + qty
-            p.save(update_fields=["stock"])
+            mover_stock(producto, qty, "cancelacion_venta", referencia=f"Factura {instance.factura.folio_factura}")
 
     # Recalcular total
     _recalc_factura_total(instance.factura)
@@ -84,6 +111,16 @@ def borrar_pnr_asociados_al_borrar_factura(sender, instance, **kwargs):
         print(f"Error al borrar PNR asociados a Factura {instance.id}: {e}")
 
 
+@receiver(post_delete, sender=PagoFactura)
+def actualizar_saldos_al_borrar_pago(sender, instance, **kwargs):
+    """Al borrar un pago, recalcula las columnas de saldo de su factura (utils/saldos.py)."""
+    try:
+        factura = Factura.objects.get(pk=instance.factura_id)
+    except Factura.DoesNotExist:
+        return  # Se está borrando la factura completa
+    factura.actualizar_saldos()
+
+
 @receiver(post_save, sender=PagoFactura)
 def notificar_pago_ppd_a_contabilidad(sender, instance, created, **kwargs):
     """
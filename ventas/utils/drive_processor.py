@@ -3,16 +3,17 @@ Procesador de facturas de ventas desde Google Drive.
 Similar a compras/utils/drive_processor.py pero para ventas.
 """
 import os
-import tempfile
 import traceback
+from concurrent.futures import Future
+from contextlib import nullcontext
+from itertools import repeat
 from typing import Optional, Dict, List
 from decimal import Decimal
-from pydrive2.auth import GoogleAuth
-from pydrive2.drive import GoogleDrive
-from pydrive2.auth import RefreshError
 from django.utils import timezone
 
-from compras.extractors.pdf_reader import extract_text_from_pdf
+from compras.utils.drive_pipeline import PipelineDrive, descargar_documento, hilos_por_defecto, procesos_por_defecto
+from compras.utils.drive_session import obtener_drive
+from compras.utils.drive_changes import FuenteCambiosDrive, SincronizadorDrive
 from ventas.extractors.novavino import extraer_factura_novavino
 from ventas.utils.registrar_venta import registrar_venta_automatizada
 
@@ -22,12 +23,20 @@ class DriveVentasProcessor:
     Procesa facturas de ventas desde Google Drive.
     """
     
-    def __init__(self):
-        """Inicializa el procesador con las configuraciones de las carpetas."""
+    def __init__(self, hilos: Optional[int] = None, procesos: Optional[int] = None):
+        """
+        Inicializa el procesador con las configuraciones de las carpetas.
+
+        Args:
+            hilos: descargas simultáneas (default DRIVE_HILOS; 1 = secuencial)
+            procesos: procesos para extraer texto (default DRIVE_PROCESOS)
+        """
         self.root_folder_id = os.getenv("VENTAS_ROOT_ID", "")
         self.nuevas_folder_id = os.getenv("VENTAS_NUEVAS_ID", "")
         self.procesadas_folder_id = os.getenv("VENTAS_PROCESADAS_ID", "")
         self.errores_folder_id = os.getenv("VENTAS_ERRORES_ID", "")
+        self.hilos = hilos or hilos_por_defecto()
+        self.procesos = procesos_por_defecto() if procesos is None else procesos
         
         # Verificar configuración
         if not all([self.nuevas_folder_id, self.procesadas_folder_id, self.errores_folder_id]):
@@ -37,34 +46,8 @@ class DriveVentasProcessor:
             )
     
     def get_drive(self):
-        """Obtiene una instancia autenticada de Google Drive."""
-        gauth = GoogleAuth("settings.yaml")
-        
-        try:
-            gauth.LoadCredentialsFile("token.json")
-        except Exception:
-            pass
-        
-        try:
-            if gauth.credentials is None:
-                gauth.LocalWebserverAuth()
-            else:
-                try:
-                    if gauth.access_token_expired:
-                        gauth.Refresh()
-                    else:
-                        gauth.Authorize()
-                except RefreshError:
-                    try:
-                        os.remove("token.json")
-                    except Exception:
-                        pass
-                    gauth.LocalWebserverAuth()
-        except Exception:
-            gauth.CommandLineAuth()
-        
-        gauth.SaveCredentialsFile("token.json")
-        return GoogleDrive(gauth)
+        """Obtiene una instancia autenticada de Google Drive (sesión compartida, ver drive_session)."""
+        return obtener_drive()
     
     def list_pdfs_in_folder(self, folder_id: str) -> List:
         """Lista todos los PDFs en una carpeta de Drive."""
@@ -77,50 +60,75 @@ class DriveVentasProcessor:
         file['parents'] = [{'id': target_folder_id}]
         file.Upload()
     
-    def process_pdf_file(self, archivo, move_files=True) -> Dict:
+    def descargar_pdf(self, archivo):
+        """Descarga el PDF de Drive como DocumentoPDF (en memoria salvo PDFs muy grandes)."""
+        return descargar_documento(archivo)
+
+    def _mover_con_log(self, archivo, folder_id: str, etiqueta: str):
+        """Mueve el archivo sin propagar errores; devuelve True si quedó en `folder_id`."""
+        if not folder_id:
+            print(f"[VENTAS] ✗ Sin carpeta destino {etiqueta}: {archivo['title']} no se mueve")
+            return False
+        try:
+            print(f"[VENTAS] Moviendo {archivo['title']} {etiqueta}...")
+            self.move_file(archivo, folder_id)
+            print(f"[VENTAS] ✓ Movido exitosamente")
+            return True
+        except Exception as e:
+            print(f"[VENTAS] ✗ Error al mover: {e}")
+            traceback.print_exc()
+            return False
+
+    def _crear_pipeline(self, total: int) -> Optional[PipelineDrive]:
+        """Pipeline concurrente, o None para procesar en secuencia (1 hilo o 1 archivo)."""
+        if self.hilos <= 1 or total <= 1:
+            return None
+        return PipelineDrive(self.descargar_pdf, hilos=self.hilos, procesos=self.procesos)
+
+    def process_pdf_file(self, archivo, move_files=True, extraccion=None) -> Dict:
         """
         Procesa un único PDF de factura de venta.
+
+        Args:
+            extraccion: Future con el DocumentoPDF ya descargado y extraído (modo
+                concurrente, ver PipelineDrive). Si es None se descarga aquí.
         
         Returns:
             dict con: status ('success', 'duplicate', 'error'), file, folio, error
         """
         filename = archivo.get('title', 'sin_nombre.pdf')
+        documento = None
         
         try:
-            # Descargar PDF temporal
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                tmp_path = tmp.name
-                archivo.GetContentFile(tmp_path)
+            # 1) Descargar y extraer texto (o tomarlo del pipeline)
+            if extraccion is not None:
+                documento = extraccion.result()
+            else:
+                documento = self.descargar_pdf(archivo)
+            texto = documento.texto
+            
+            # 2) Extraer datos con extractor de Novavino
+            data = extraer_factura_novavino(texto)
             
-            try:
-                # 1) Extraer texto
-                texto = extract_text_from_pdf(tmp_path)
-                
-                # 2) Extraer datos con extractor de Novavino
-                data = extraer_factura_novavino(texto)
-                
-                folio = (data.get("folio") or "").strip()
-                if not folio:
-                    raise ValueError("No se encontró el folio en la factura de venta.")
-                
-                # 3) Registrar venta (con reemplazo si ya existe)
-                resultado = registrar_venta_automatizada(data, replace_if_exists=True)
-                
-                print(f"[VENTAS] ✓ Procesado: {filename} (folio {folio})")
-                
-                return {
-                    "status": "success",
-                    "file": filename,
-                    "folio": folio,
-                    "error": None
-                }
-                
-            finally:
-                # Limpiar archivo temporal
-                try:
-                    os.unlink(tmp_path)
-                except Exception:
-                    pass
+            folio = (data.get("folio") or "").strip()
+            if not folio:
+                raise ValueError("No se encontró el folio en la factura de venta.")
+            
+            # 3) Registrar venta (si ya existe, solo se aplican las diferencias)
+            resultado = registrar_venta_automatizada(data, replace_if_exists=True)
+            
+            if getattr(resultado, "sin_cambios", False):
+                print(f"[VENTAS] = Sin cambios: {filename} (folio {folio})")
+                return {"status": "duplicate", "file": filename, "folio": folio, "error": None}
+            
+            print(f"[VENTAS] ✓ Procesado: {filename} (folio {folio})")
+            
+            return {
+                "status": "success",
+                "file": filename,
+                "folio": folio,
+                "error": None
+            }
         
         except Exception as e:
             error_msg = str(e)
@@ -133,13 +141,25 @@ class DriveVentasProcessor:
                 "folio": None,
                 "error": error_msg
             }
+        finally:
+            if documento is not None:
+                documento.liberar()
     
-    def process_all_invoices(self, move_files=True) -> Dict:
+    def sincronizador(self) -> SincronizadorDrive:
+        """Cambios de Drive desde la última corrida incremental (token "ventas")."""
+        return SincronizadorDrive("ventas", self.nuevas_folder_id, FuenteCambiosDrive(self.get_drive()))
+
+    def process_all_invoices(self, move_files=True, progreso=None, incremental=False) -> Dict:
         """
         Procesa todas las facturas de venta pendientes desde Google Drive.
         
         Args:
             move_files: Si True, mueve archivos a carpetas correspondientes
+            progreso: callback opcional progreso(total, details), llamado al listar y
+                después de cada archivo (lo usa la cola de tareas del admin)
+            incremental: Si True, solo procesa los PDFs que llegaron desde la
+                corrida incremental anterior (API de cambios, ver drive_changes).
+                Requiere move_files; si no, ValueError
         
         Returns:
             dict con totales y detalles del procesamiento
@@ -152,44 +172,71 @@ class DriveVentasProcessor:
         print(f"  - nuevas_folder_id: {self.nuevas_folder_id[:20]}...")
         print(f"  - procesadas_folder_id: {self.procesadas_folder_id[:20]}...")
         
-        # Listar PDFs en carpeta de nuevas
-        archivos = self.list_pdfs_in_folder(self.nuevas_folder_id)
+        # Listar PDFs en carpeta de nuevas (o solo los cambios desde la última corrida)
+        if incremental and not move_files:
+            raise ValueError("El modo incremental requiere move_files")
+        sincronizador = self.sincronizador() if incremental else None
+        if sincronizador:
+            archivos = sincronizador.pendientes()
+        else:
+            archivos = self.list_pdfs_in_folder(self.nuevas_folder_id)
         
         total = len(archivos)
         success_count = 0
+        duplicate_count = 0
         error_count = 0
         details = []
+        movimientos = []  # resultado de cada _mover_con_log (bool o Future)
         
         print(f"[VENTAS] Encontrados {total} archivo(s) para procesar")
+        if progreso:
+            progreso(total, details)
         
-        for archivo in archivos:
-            result = self.process_pdf_file(archivo, move_files=move_files)
-            details.append(result)
-            
-            if result["status"] == "success":
-                success_count += 1
+        pipeline = self._crear_pipeline(total)
+        with pipeline or nullcontext():
+            extracciones = pipeline.extraer_en_orden(archivos) if pipeline else repeat(None)
+
+            for archivo, extraccion in zip(archivos, extracciones):
+                # Único escritor de BD: registra en el orden del listado
+                result = self.process_pdf_file(archivo, move_files=move_files, extraccion=extraccion)
+                details.append(result)
+                if progreso:
+                    progreso(total, details)
+
+                if result["status"] in ("success", "duplicate"):
+                    if result["status"] == "success":
+                        success_count += 1
+                    else:
+                        duplicate_count += 1
+                    destino, etiqueta = self.procesadas_folder_id, "a Procesadas"
+                else:
+                    error_count += 1
+                    destino, etiqueta = self.errores_folder_id, "a Errores"
+
                 if move_files:
-                    try:
-                        print(f"[VENTAS] Moviendo {archivo['title']} a Procesadas...")
-                        self.move_file(archivo, self.procesadas_folder_id)
-                        print(f"[VENTAS] ✓ Movido exitosamente")
-                    except Exception as e:
-                        print(f"[VENTAS] ✗ Error al mover: {e}")
-                        traceback.print_exc()
+                    if pipeline:
+                        movimientos.append(pipeline.en_red(self._mover_con_log, archivo, destino, etiqueta))
+                    else:
+                        movimientos.append(self._mover_con_log(archivo, destino, etiqueta))
+
+        if sincronizador:
+            # Solo se avanza el token si todo el lote salió de "Nuevas"; si no, la
+            # próxima corrida vuelve a ver los mismos cambios
+            if all(m.result() if isinstance(m, Future) else m for m in movimientos):
+                sincronizador.confirmar()
             else:
-                error_count += 1
-                if move_files:
-                    try:
-                        print(f"[VENTAS] Moviendo {archivo['title']} a Errores...")
-                        self.move_file(archivo, self.errores_folder_id)
-                        print(f"[VENTAS] ✓ Movido exitosamente")
-                    except Exception as e:
-                        print(f"[VENTAS] ✗ Error al mover: {e}")
-                        traceback.print_exc()
-        
+                print(f"[VENTAS] ✗ Hubo archivos sin mover: no se avanza el token incremental")
+
         return {
             "total": total,
             "success": success_count,
+            "duplicate": duplicate_count,
             "error": error_count,
             "details": details
         }
+
+
+def ejecutar_tarea_drive(tarea, progreso) -> Dict:
+    """Ejecutor de la tarea en segundo plano "drive_ventas" (ver inventario/tareas.py)."""
+    processor = DriveVentasProcessor()
+    return processor.process_all_invoices(move_files=True, progreso=progreso)
@@ -1,24 +1,86 @@
 # ventas/utils/registrar_venta.py
+import hashlib
+import json
 from decimal import Decimal, InvalidOperation
 from datetime import datetime
+from typing import Dict
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.timezone import now
 from django.db import transaction  # ← FALTA EN TU ARCHIVO
 
 from ventas.models import Factura, DetalleFactura
+from ventas.signals import signals_detalle_suspendidas
 from inventario.models import ProductoNoReconocido
-from inventario.utils import encontrar_producto_unico
+from inventario.utils import encontrar_productos_unicos
+from inventario.stock import registrar_movimientos
+
+
+def hash_contenido(datos) -> str:
+    """SHA-256 estable de los datos extraídos (orden de llaves indiferente)."""
+    crudo = json.dumps(datos, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(crudo.encode("utf-8")).hexdigest()
+
+
+def sincronizar_detalles(factura: Factura, lineas: Dict[int, DetalleFactura]) -> Dict[str, int]:
+    """
+    Deja en `factura` exactamente los detalles de `lineas` (producto_id -> DetalleFactura
+    sin guardar) comparando por (factura, producto): inserta los nuevos, borra los que
+    ya no vienen y actualiza solo los que cambiaron de cantidad o precio (el costo
+    histórico de las líneas que se conservan no se toca). El stock se ajusta con la
+    diferencia de cantidades en un UPDATE con F(). No recalcula los totales.
+    Devuelve cuántos detalles se insertaron, actualizaron y borraron.
+    """
+    existentes = {d.producto_id: d for d in DetalleFactura.objects.filter(factura=factura)} if factura.pk else {}
+    nuevos, cambiados, deltas_stock = [], [], {}
+
+    for producto_id, linea in lineas.items():
+        linea.factura = factura
+        linea.calcular_importes()
+        previo = existentes.pop(producto_id, None)
+        if previo is None:
+            nuevos.append(linea)
+            deltas_stock[producto_id] = -linea.cantidad
+            continue
+        if (previo.cantidad, previo.precio_unitario) != (linea.cantidad, linea.precio_unitario):
+            deltas_stock[producto_id] = previo.cantidad - linea.cantidad
+            previo.cantidad = linea.cantidad
+            previo.precio_unitario = linea.precio_unitario
+            previo.subtotal = linea.subtotal
+            cambiados.append(previo)
+
+    # Lo que quedó en `existentes` ya no viene en los datos: se borra y su stock regresa
+    for producto_id, previo in existentes.items():
+        deltas_stock[producto_id] = previo.cantidad or 0
+
+    with signals_detalle_suspendidas():
+        if existentes:
+            DetalleFactura.objects.filter(pk__in=[d.pk for d in existentes.values()]).delete()
+        if cambiados:
+            DetalleFactura.objects.bulk_update(cambiados, ["cantidad", "precio_unitario", "subtotal"])
+        if nuevos:
+            DetalleFactura.objects.bulk_create(nuevos)
+    # Sin bajar de 0 (igual que las signals por detalle)
+    registrar_movimientos(deltas_stock, "venta", referencia=f"Factura {factura.folio_factura}", minimo=0)
+
+    return {"insertados": len(nuevos), "actualizados": len(cambiados), "borrados": len(existentes)}
 
 
 def registrar_venta_automatizada(datos: dict, replace_if_exists: bool = False) -> Factura:
     """
     Crea/actualiza una Factura y sus DetalleFactura desde datos extraídos del PDF.
     - Idempotencia:
-        * replace_if_exists=True: si existe el folio, borra detalles y recrea (signals ajustan stock).
+        * replace_if_exists=True: si existe el folio, aplica solo las diferencias por producto
+          (sincronizar_detalles). Si los datos extraídos tienen el mismo hash que la vez
+          anterior y la factura no quedó pendiente de PNR, no toca nada (factura.sin_cambios).
         * replace_if_exists=False: si existe el folio, lanza ValueError (u omite fuera).
     - Transaccional: si una línea falla, no queda nada a medias.
-    - Resolución con encontrar_producto_unico (evita ambigüedades).
-    - Total: lo recalculan las signals al crear/borrar detalles; si no hay líneas válidas,
-             se conserva el total extraído del PDF.
+    - Resolución en lote con encontrar_productos_unicos (evita ambigüedades).
+    - Escritura en lote: las signals por detalle quedan suspendidas; los detalles se
+      escriben con bulk_create/bulk_update, el stock (diferencia de cantidades) se aplica
+      en un solo UPDATE con F() y los totales se guardan una vez al final.
+    - Totales: subtotal, descuento y total oficiales son los del CFDI; si el PDF no trae
+      subtotal se usa la suma de los detalles.
     """
     # Fecha
     fecha_raw = datos.get("fecha_emision") or datos.get("fecha")
@@ -68,34 +130,25 @@ def registrar_venta_automatizada(datos: dict, replace_if_exists: bool = False) -
             metodo_pago=metodo_pago,
         )
 
+    huella = hash_contenido(datos)
+
     with transaction.atomic():
         # Idempotencia por folio
-        try:
-            factura = Factura.objects.get(folio_factura=folio)
-            if not replace_if_exists:
-                raise ValueError(f"Ya existe la venta con folio {folio}.")
-            DetalleFactura.objects.filter(factura=factura).delete()  # signals restauran stock
-            factura.cliente = cliente or factura.cliente
-            factura.fecha_facturacion = fecha_fact or factura.fecha_facturacion
-            factura.metodo_pago = metodo_pago or factura.metodo_pago
-            factura.subtotal = Decimal("0.00")  # se recalcula por signals
-            factura.descuento = descuento_decimal  # conservar descuento del PDF
-            factura.total = Decimal("0.00")  # se recalcula por signals
-            factura.save(update_fields=["cliente", "fecha_facturacion", "metodo_pago", "subtotal", "descuento", "total"])
-        except Factura.DoesNotExist:
-            factura = Factura.objects.create(
-                folio_factura=folio,
-                cliente=cliente,
-                fecha_facturacion=fecha_fact,
-                subtotal=Decimal("0.00"),
-                descuento=descuento_decimal,
-                total=Decimal("0.00"),
-                metodo_pago=metodo_pago,
-                uuid_factura=uuid_cfdi,
-            )
+        factura = Factura.objects.filter(folio_factura=folio).first()
+        if factura is not None and not replace_if_exists:
+            raise ValueError(f"Ya existe la venta con folio {folio}.")
+        if factura is not None and factura.hash_contenido == huella and not factura.requiere_revision_manual:
+            # Re-importación idéntica: nada que escribir
+            factura.sin_cambios = True
+            return factura
 
-        detalles_creados = 0
         productos_no_reconocidos = 0
+        lineas = {}  # producto_id -> DetalleFactura sin guardar (cantidades repetidas se suman)
+
+        # Resolver todos los nombres en lote
+        resueltos = encontrar_productos_unicos(
+            str(prod.get("nombre") or prod.get("producto") or "").strip() for prod in items
+        )
 
         for prod in items:
             nombre = str(prod.get("nombre") or prod.get("producto") or "").strip()
@@ -117,25 +170,10 @@ def registrar_venta_automatizada(datos: dict, replace_if_exists: bool = False) -
                     productos_no_reconocidos += 1  # BUG FIX: incrementar contador
                 continue
 
-            # Resolver producto (seguro)
-            producto, err = encontrar_producto_unico(nombre)
-            if err == "not_found":
-                # Guardar info adicional en PNR para poder procesar después
-                ProductoNoReconocido.objects.get_or_create(
-                    nombre_detectado=nombre,
-                    uuid_factura=uuid_cfdi,
-                    defaults={
-                        "fecha_detectado": now(),
-                        "procesado": False,
-                        "origen": "venta",
-                        "cantidad": Decimal(str(cantidad)),
-                        "precio_unitario": Decimal(str(raw_pu)) if str(raw_pu).strip() else None,
-                    },
-                )
-                productos_no_reconocidos += 1
-                continue  # NO lanzar error, solo registrar PNR y continuar
-            if err == "ambiguous":
-                # Producto ambiguo también es un caso para revisión manual
+            # Producto resuelto (seguro)
+            producto, err = resueltos[nombre]
+            if err in ("not_found", "ambiguous"):
+                # No encontrado o ambiguo: guardar info en PNR para revisión manual y continuar
                 ProductoNoReconocido.objects.get_or_create(
                     nombre_detectado=nombre,
                     uuid_factura=uuid_cfdi,
@@ -150,53 +188,50 @@ def registrar_venta_automatizada(datos: dict, replace_if_exists: bool = False) -
                 productos_no_reconocidos += 1
                 continue
 
+            if producto.id in lineas:
+                # Producto repetido en el PDF: SUMAR la cantidad (se conserva el primer precio)
+                lineas[producto.id].cantidad += cantidad
+                continue
+
             # Precio unitario
             try:
                 precio_unitario = Decimal(str(raw_pu)) if str(raw_pu).strip() != "" else (producto.precio_venta or Decimal("0"))
             except InvalidOperation:
                 precio_unitario = producto.precio_venta or Decimal("0")
 
-            # Usar get_or_create para evitar duplicados y sumar cantidades
-            detalle, created = DetalleFactura.objects.get_or_create(
-                factura=factura,
-                producto=producto,
-                defaults={
-                    "cantidad": cantidad,
-                    "precio_unitario": precio_unitario,
-                }
-            )
-            
-            if not created:
-                # Ya existía: SUMAR la cantidad
-                detalle.cantidad += cantidad
-                detalle.save(update_fields=["cantidad"])
-            
-            detalles_creados += 1
+            lineas[producto.id] = DetalleFactura(producto=producto, cantidad=cantidad, precio_unitario=precio_unitario)
+
+        for detalle in lineas.values():
+            detalle.calcular_importes()  # subtotal para el caso sin subtotal en el PDF
 
+        # Montos oficiales del CFDI; sin subtotal en el PDF se usa la suma de los detalles
+        if lineas and subtotal_decimal <= 0:
+            subtotal_final = sum((d.subtotal for d in lineas.values()), Decimal("0.00"))
+        else:
+            subtotal_final = subtotal_decimal
+
+        if factura is None:
+            factura = Factura(
+                folio_factura=folio,
+                cliente=cliente,
+                fecha_facturacion=fecha_fact,
+                metodo_pago=metodo_pago,
+                uuid_factura=uuid_cfdi,
+            )
+        else:
+            factura.cliente = cliente or factura.cliente
+            factura.fecha_facturacion = fecha_fact or factura.fecha_facturacion
+            factura.metodo_pago = metodo_pago or factura.metodo_pago
+        factura.subtotal = subtotal_final
+        factura.descuento = descuento_decimal
+        factura.total = total_decimal
+        factura.hash_contenido = huella
         # Si hay productos no reconocidos, marcar factura para revisión
         if productos_no_reconocidos > 0:
             factura.requiere_revision_manual = True
             factura.estado_revision = "pendiente"
-            factura.save(update_fields=["requiere_revision_manual", "estado_revision"])
-        
-        if detalles_creados == 0:
-            factura.subtotal = subtotal_decimal
-            factura.descuento = descuento_decimal
-            factura.total = total_decimal
-            factura.save(update_fields=["subtotal", "descuento", "total"])
-        else:
-            # IMPORTANTE: Restaurar subtotal, descuento y total del PDF después de que los signals recalcularon
-            # Los signals suman los detalles como subtotal, pero los montos oficiales deben ser los del CFDI
-            # Esto mantiene la integridad fiscal y hace que la caja cuadre correctamente
-            factura.refresh_from_db()  # Obtener valores recalculados por signals
-            
-            # Si el PDF no trae subtotal, usar la suma calculada por signals
-            if subtotal_decimal > 0:
-                factura.subtotal = subtotal_decimal
-            # else: mantener el subtotal calculado por signals
-            
-            factura.descuento = descuento_decimal  # Conservar descuento del PDF
-            factura.total = total_decimal  # Restaurar el total del PDF
-            factura.save(update_fields=["subtotal", "descuento", "total"])
+        factura.save()
 
+        sincronizar_detalles(factura, lineas)
+        factura.sin_cambios = False
         return factura
@@ -1,8 +1,8 @@
 from datetime import datetime
 import csv
 
-from django.db.models import F, Sum
-from django.http import Http404, HttpResponse, JsonResponse
+from django.db.models import Prefetch, Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils.dateparse import parse_date
 from django.views.decorators.http import require_http_methods
@@ -11,7 +11,8 @@ from reportlab.pdfgen import canvas
 
 from inventario.models import Producto
 from .models import Factura, PagoFactura
-from utils.reportes import calcular_agregados_periodo_ventas, generar_dict_reporte_factura
+from reportes.resumen import resumen_periodo
+from utils.reportes import generar_dict_reporte_factura
 
 
 # ----------------------------- utilidades -----------------------------
@@ -33,18 +34,6 @@ def _rangos(request):
     return fi, ff
 
 
-def _totales(qs):
-    # costo = sum(precio_compra * cantidad)
-    costo_total = (
-        qs.aggregate(
-            s=Sum(F("detalles__precio_compra") * F("detalles__cantidad"))
-        )["s"]
-        or 0
-    )
-    total_venta = qs.aggregate(s=Sum("total"))["s"] or 0
-    return total_venta, costo_total, (total_venta - costo_total)
-
-
 # ----------------------------- API pequeña -----------------------------
 
 def get_producto_precio(request, producto_id):
@@ -68,43 +57,59 @@ def api_producto_precios(request, pk: int):
 
 # ----------------------------- Cortes -----------------------------
 
+def _totales_corte(modo: str, fi, ff):
+    """Totales del periodo desde ResumenDiario (una fila por día, ver reportes/resumen.py)."""
+    if not (fi and ff):
+        fi = ff = None  # Sin rango completo: todo el histórico, como el listado
+    resumen = resumen_periodo(modo, fi, ff)
+    return {
+        "total_venta": resumen["venta_total"],
+        "total_costo_proveedores": resumen["costo_total"],
+        "total_transporte": resumen["transporte_total"],
+        "total_ganancia": resumen["ganancia_total"],
+        "porcentaje_ganancia": resumen["porcentaje_ganancia"],
+    }
+
+
+def _facturas_flujo(fi=None, ff=None):
+    """Facturas cobradas en el periodo: con pagos en el rango o pagadas con el sistema antiguo
+    (pagado=True sin pagos) en el rango. `pagos_periodo` trae los pagos del rango.
+    Sin rango completo, todo lo cobrado (las mismas filas que suma el resumen de flujo)."""
+    rango = {"fecha_pago__range": (fi, ff)} if fi and ff else {"fecha_pago__isnull": False}
+    con_pagos = PagoFactura.objects.filter(**rango).values("factura_id")
+    return Factura.objects.filter(
+        Q(id__in=con_pagos) | Q(pagado=True, pagos__isnull=True, **rango)
+    ).distinct().prefetch_related(
+        Prefetch(
+            "pagos",
+            queryset=PagoFactura.objects.filter(**rango).order_by("fecha_pago"),
+            to_attr="pagos_periodo",
+        ),
+        "detalles__producto",
+    )
+
+
 @require_http_methods(["GET"])
 def corte_contable(request):
     """Corte por fecha de FACTURACIÓN."""
     fi, ff = _rangos(request)
     
-    # Usar la nueva función abstraída
-    agregados = calcular_agregados_periodo_ventas(
-        Factura.objects.filter(fecha_facturacion__isnull=False),  # Query defensivo
-        fi, ff,
-        campo_fecha='fecha_facturacion',
-        solo_pagadas=False
-    )
-    
-    qs = agregados['queryset']
+    qs = Factura.objects.filter(fecha_facturacion__isnull=False)  # Query defensivo
+    if fi and ff:
+        qs = qs.filter(fecha_facturacion__range=(fi, ff))
+    qs = qs.prefetch_related("detalles__producto")
     
     # Armar reporte usando función abstraída
     reporte = []
     for f in qs:
         reporte.append(generar_dict_reporte_factura(f))
 
-    # Calcular porcentaje de ganancia total
-    porcentaje_ganancia_total = 0
-    if agregados['total_venta'] > 0:
-        porcentaje_ganancia_total = (agregados['ganancia_total'] / agregados['total_venta']) * 100
-    
     return render(request, "ventas/corte.html", {
         "modo": "contable",
         "facturas": qs,
         "reporte": reporte,
         "fi": fi, "ff": ff,
-        "totales": {
-            "total_venta": agregados['total_venta'],
-            "total_costo_proveedores": agregados['costo_total'],
-            "total_transporte": agregados['transporte_total'],
-            "total_ganancia": agregados['ganancia_total'],
-            "porcentaje_ganancia": porcentaje_ganancia_total,
-        },
+        "totales": _totales_corte("contable", fi, ff),
     })
 
 
@@ -113,28 +118,15 @@ def corte_flujo(request):
     """Corte por fecha de PAGO (incluye pagos parciales)."""
     fi, ff = _rangos(request)
     
-    # Usar la nueva función abstraída que ahora considera pagos parciales
-    agregados = calcular_agregados_periodo_ventas(
-        Factura.objects.all(),  # Sin filtro previo, se filtra en calcular_agregados
-        fi, ff,
-        campo_fecha='fecha_pago',
-        solo_pagadas=False  # Ahora considera pagos parciales
-    )
-    
-    qs = agregados['queryset']
+    qs = _facturas_flujo(fi, ff)
     
     # Armar reporte usando función abstraída y agregar info de pagos
     reporte = []
     for f in qs:
         reporte_dict = generar_dict_reporte_factura(f)
         
-        # Obtener pagos en el periodo para esta factura
-        pagos_periodo = []
-        if fi and ff:
-            pagos_periodo = PagoFactura.objects.filter(
-                factura=f,
-                fecha_pago__range=(fi, ff)
-            ).order_by('fecha_pago')
+        # Pagos en el periodo para esta factura (precargados)
+        pagos_periodo = getattr(f, "pagos_periodo", [])
         
         # Sumar pagos en el periodo
         total_pagos_periodo = sum(p.monto for p in pagos_periodo)
@@ -157,35 +149,54 @@ def corte_flujo(request):
         
         reporte.append(reporte_dict)
 
-    # Calcular porcentaje de ganancia total
-    porcentaje_ganancia_total = 0
-    if agregados['total_venta'] > 0:
-        porcentaje_ganancia_total = (agregados['ganancia_total'] / agregados['total_venta']) * 100
-    
     return render(request, "ventas/corte.html", {
         "modo": "flujo",
         "facturas": qs,
         "reporte": reporte,
         "fi": fi, "ff": ff,
-        "totales": {
-            "total_venta": agregados['total_venta'],
-            "total_costo_proveedores": agregados['costo_total'],
-            "total_transporte": agregados['transporte_total'],
-            "total_ganancia": agregados['ganancia_total'],
-            "porcentaje_ganancia": porcentaje_ganancia_total,
-        },
+        "totales": _totales_corte("flujo", fi, ff),
     })
 
 
 # ----------------------------- Exportaciones -----------------------------
 
 def _facturas_para_export(fecha_inicio, fecha_fin, modo: str):
+    """Facturas del corte con costo, transporte y unidades anotados (sin detalles por factura)."""
     if modo == "flujo":
         qs = Factura.objects.filter(pagado=True)
-        qs = qs.filter(fecha_pago__range=(fecha_inicio, fecha_fin))
+        qs = qs.filter(fecha_pago__range=(fecha_inicio, fecha_fin)).order_by("fecha_pago", "id")
     else:
-        qs = Factura.objects.filter(fecha_facturacion__range=(fecha_inicio, fecha_fin))
-    return qs.prefetch_related("detalles__producto")
+        qs = Factura.objects.filter(fecha_facturacion__range=(fecha_inicio, fecha_fin)).order_by("fecha_facturacion", "id")
+    return qs.with_totales_detalle()
+
+
+def _ganancia(f):
+    gan = (f.total or 0) - f.costo_proveedores
+    porcentaje_ganancia = 0
+    if f.total and f.total > 0:
+        porcentaje_ganancia = (gan / f.total) * 100
+    return gan, porcentaje_ganancia
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+FACTURAS_POR_LOTE_CSV = 500
+
+
+def _lineas_csv(qs, modo: str):
+    w = csv.writer(_Eco())
+    yield w.writerow(["Folio", "Cliente", "Fecha", "Total Venta", "Costo Proveedores", "Transporte",
+                      "Ganancia", "Porcentaje Ganancia", "Productos Personalizados", "Productos No Personalizados"])
+    for f in qs.iterator(chunk_size=FACTURAS_POR_LOTE_CSV):
+        gan, porcentaje_ganancia = _ganancia(f)
+        fecha = (f.fecha_pago if modo == "flujo" else f.fecha_facturacion).strftime("%d-%b-%Y")
+        yield w.writerow([f.folio_factura, f.cliente, fecha, f.total, f.costo_proveedores, f.transporte, gan,
+                          porcentaje_ganancia, f.unidades_personalizadas, f.unidades_no_personalizadas])
 
 
 def exportar_csv(request):
@@ -195,29 +206,10 @@ def exportar_csv(request):
     if not (fi and ff):
         return HttpResponse("Rango de fechas inválido", status=400)
 
+    # Se envía mientras se lee la BD por lotes: memoria constante aunque sea un año
     qs = _facturas_para_export(fi, ff, modo)
-
-    response = HttpResponse(content_type="text/csv")
+    response = StreamingHttpResponse(_lineas_csv(qs, modo), content_type="text/csv")
     response["Content-Disposition"] = f'attachment; filename="corte_{modo}.csv"'
-    w = csv.writer(response)
-    w.writerow(["Folio", "Cliente", "Fecha", "Total Venta", "Costo Proveedores", "Transporte",
-                "Ganancia", "Porcentaje Ganancia", "Productos Personalizados", "Productos No Personalizados"])
-
-    for f in qs:
-        costo = sum(d.cantidad * d.precio_compra for d in f.detalles.all())
-        transporte = sum(
-            d.cantidad * (getattr(d.producto, 'costo_transporte', 0) or 0)
-            for d in f.detalles.all()
-        )
-        gan = (f.total or 0) - costo
-        porcentaje_ganancia = 0
-        if f.total and f.total > 0:
-            porcentaje_ganancia = (gan / f.total) * 100
-        pers = sum(d.cantidad for d in f.detalles.all() if getattr(d.producto, "es_personalizado", False))
-        no_pers = sum(d.cantidad for d in f.detalles.all() if not getattr(d.producto, "es_personalizado", False))
-        fecha = (f.fecha_pago if modo == "flujo" else f.fecha_facturacion).strftime("%d-%b-%Y")
-        w.writerow([f.folio_factura, f.cliente, fecha, f.total, costo, transporte, gan, porcentaje_ganancia, pers, no_pers])
-
     return response
 
 
@@ -238,15 +230,8 @@ def exportar_pdf(request):
 
     y = 730
     for f in qs:
-        costo = sum(d.cantidad * d.precio_compra for d in f.detalles.all())
-        transporte = sum(
-            d.cantidad * (getattr(d.producto, 'costo_transporte', 0) or 0)
-            for d in f.detalles.all()
-        )
-        gan = (f.total or 0) - costo
-        porcentaje_ganancia = 0
-        if f.total and f.total > 0:
-            porcentaje_ganancia = (gan / f.total) * 100
+        costo, transporte = f.costo_proveedores, f.transporte
+        gan, porcentaje_ganancia = _ganancia(f)
         fecha = (f.fecha_pago if modo == "flujo" else f.fecha_facturacion).strftime("%d-%b-%Y")
 
         p.drawString(80, y, f"Factura {f.folio_factura} - Cliente: {f.cliente}")
@@ -296,36 +281,18 @@ def corte_semanal(request):
         })
 
     if modo == "flujo":
-        # Combinar ambos sistemas:
-        # 1. Facturas con pagos parciales (modelo PagoFactura)
-        facturas_con_pagos_parciales = PagoFactura.objects.filter(
-            fecha_pago__range=(fi, ff)
-        ).values_list('factura_id', flat=True).distinct()
-        
-        # 2. Facturas con pago único (campo fecha_pago)
-        facturas_con_pago_unico = Factura.objects.filter(
-            fecha_pago__range=(fi, ff)
-        ).values_list('id', flat=True)
-        
-        # Unir ambos conjuntos
-        from django.db.models import Q
-        qs = Factura.objects.filter(
-            Q(id__in=facturas_con_pagos_parciales) | Q(id__in=facturas_con_pago_unico)
-        ).distinct()
+        # Pagos parciales (PagoFactura) + pago único del sistema antiguo
+        qs = _facturas_flujo(fi, ff)
     else:
-        qs = Factura.objects.filter(fecha_facturacion__range=(fi, ff))
-
-    qs = qs.prefetch_related("detalles__producto")
+        qs = Factura.objects.filter(fecha_facturacion__range=(fi, ff)).prefetch_related("detalles__producto")
 
     reporte = []
-    total_transporte_global = 0
     for f in qs:
         costo = sum((d.cantidad or 0) * (d.precio_compra or 0) for d in f.detalles.all())
         transporte = sum(
             (d.cantidad or 0) * (getattr(d.producto, 'costo_transporte', 0) or 0)
             for d in f.detalles.all()
         )
-        total_transporte_global += transporte
         ganancia = (f.total or 0) - costo
         porcentaje_ganancia = 0
         if f.total and f.total > 0:
@@ -342,15 +309,12 @@ def corte_semanal(request):
         
         # Obtener fecha y monto correcto en modo flujo
         if modo == "flujo":
-            # Obtener todos los pagos en el periodo para esta factura
-            pagos_periodo_list = PagoFactura.objects.filter(
-                factura=f,
-                fecha_pago__range=(fi, ff)
-            ).order_by('fecha_pago')
+            # Pagos en el periodo para esta factura (precargados)
+            pagos_periodo_list = f.pagos_periodo
             
-            if pagos_periodo_list.exists():
+            if pagos_periodo_list:
                 # Usar fecha del primer pago y sumar montos del periodo
-                fecha_txt = pagos_periodo_list.first().fecha_pago.strftime("%d-%b-%Y")
+                fecha_txt = pagos_periodo_list[0].fecha_pago.strftime("%d-%b-%Y")
                 total_pagado_periodo = sum(p.monto for p in pagos_periodo_list)
                 proporcion = total_pagado_periodo / f.total if f.total > 0 else 0
             else:
@@ -378,23 +342,14 @@ def corte_semanal(request):
             "productos_no_personalizados": no_pers or "Ninguno",
         })
 
-    tot_vta, tot_costo, tot_gan = _totales(qs)
-    
-    # Calcular porcentaje de ganancia total
-    porcentaje_ganancia_total = 0
-    if tot_vta > 0:
-        porcentaje_ganancia_total = (tot_gan / tot_vta) * 100
+    totales = _totales_corte(modo, fi, ff)
 
     return JsonResponse({
         "modo": modo,
         "reporte": reporte,
         "totales": {
-            "total_venta": float(tot_vta),
-            "total_costo_proveedores": float(tot_costo),
-            "total_transporte": float(total_transporte_global),
-            "total_ganancia": float(tot_gan),
-            "porcentaje_ganancia": float(porcentaje_ganancia_total),
+            **{clave: float(valor) for clave, valor in totales.items()},
             "productos_personalizados": "Ninguno",
             "productos_no_personalizados": "Ninguno",
         },
-    })
\ No newline at end of file
+    })
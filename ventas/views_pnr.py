@@ -52,25 +52,15 @@ def asignar_pnr_venta_view(request, object_id):
             )
             print(f"→ DetalleFactura {'creado' if created else 'ya existía'} (ID: {detalle_factura.id})")
             
-            # Actualizar stock (descontar en venta)
+            # El stock lo descuentan las signals de DetalleFactura (movimiento "venta"
+            # en la bitácora); aquí no se toca para no descontarlo dos veces.
             cantidad_pnr = int(pnr.cantidad or 0)
-            if created:
-                # Nuevo DetalleFactura: descontar stock
-                stock_anterior = producto.stock or 0
-                producto.stock = stock_anterior - cantidad_pnr
-                producto.save(update_fields=["stock"])
-                print(f"→ Stock actualizado: {stock_anterior} - {cantidad_pnr} = {producto.stock}")
-            else:
-                # DetalleFactura ya existía: SUMAR cantidades y descontar del stock
+            if not created:
+                # DetalleFactura ya existía: SUMAR cantidades (la signal descuenta la diferencia)
                 cantidad_anterior = detalle_factura.cantidad
                 detalle_factura.cantidad += cantidad_pnr
                 detalle_factura.save(update_fields=["cantidad"])
-                
-                stock_anterior = producto.stock or 0
-                producto.stock = stock_anterior - cantidad_pnr
-                producto.save(update_fields=["stock"])
                 print(f"→ DetalleFactura actualizado: cantidad {cantidad_anterior} + {cantidad_pnr} = {detalle_factura.cantidad}")
-                print(f"→ Stock actualizado: {stock_anterior} - {cantidad_pnr} = {producto.stock}")
         
         print("✓ Transacción atómica completada exitosamente\n")
         